@@ -0,0 +1,115 @@
+"""In-memory cache of generated answers for repeated questions.
+
+Answers are keyed by ``(endpoint, user, index version, normalized question,
+provider, model, history hash)``. The index version is the fingerprint of the
+published snapshot (or collection slice), so once ingestion changes the index
+every worker stops matching the old entries; the ingesting worker also drops
+them right away. Entries expire after ``ttl_seconds`` and the least recently
+used are evicted beyond ``max_entries``.
+
+Each entry remembers how long the provider call took, so the cache can report
+the provider latency its hits saved.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from api.rerank_cache import normalize_query
+
+
+def history_hash(chat_history, summary=""):
+    """Digest of the conversation turns (and summary) sent along with the question."""
+    if not chat_history and not summary:
+        return ""
+    payload = {"summary": summary, "turns": chat_history} if summary else chat_history
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def answer_cache_key(endpoint, user_id, index_version, question, provider, model, chat_history=None, history_summary=""):
+    return (
+        endpoint, user_id, index_version, normalize_query(question), provider, model,
+        history_hash(chat_history, history_summary),
+    )
+
+
+class AnswerCache:
+    """Thread-safe LRU of answers with a per-entry TTL."""
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, clock=time.monotonic):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, generation_seconds, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def put(self, key, value, generation_seconds=0.0):
+        with self._lock:
+            self._entries[key] = (value, float(generation_seconds), self._clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """Drop every answer cached for ``user_id``."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_provider_seconds": round(self.saved_seconds, 3),
+            }
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """Process-wide answer cache, or None when disabled by settings."""
+    global _answer_cache
+    if _answer_cache is None:
+        from django.conf import settings
+
+        max_entries = getattr(settings, "RAG_ANSWER_CACHE_MAX_ENTRIES", 10000)
+        ttl_seconds = getattr(settings, "RAG_ANSWER_CACHE_TTL", 3600)
+        if max_entries <= 0 or ttl_seconds <= 0:
+            return None
+        _answer_cache = AnswerCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+    return _answer_cache
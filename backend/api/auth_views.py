@@ -0,0 +1,272 @@
+"""
+Authentication and account endpoints.
+
+Kept apart from api/views.py so signing in, refreshing tokens and managing an
+account never import the retrieval and generation stack. Only account
+deletion touches documents and indexes, and it imports those on demand.
+"""
+
+import os
+import shutil
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.serializers import SignUpSerializer
+
+
+# ---------------------------------------------------------------------------
+# Refresh-token cookie helpers
+# ---------------------------------------------------------------------------
+_REFRESH_COOKIE_NAME = "refresh_token"
+_REFRESH_COOKIE_MAX_AGE = 60 * 60 * 24  # 1 day, matches SIMPLE_JWT REFRESH_TOKEN_LIFETIME
+
+
+def _set_refresh_cookie(response, refresh_token_str):
+    """Set the refresh token as an HttpOnly Secure cookie on the response."""
+    is_prod = not settings.DEBUG
+    response.set_cookie(
+        key=_REFRESH_COOKIE_NAME,
+        value=refresh_token_str,
+        max_age=_REFRESH_COOKIE_MAX_AGE,
+        httponly=True,
+        secure=is_prod,
+        samesite="None" if is_prod else "Lax",
+        path="/",
+    )
+
+
+def _clear_refresh_cookie(response):
+    """Delete the refresh token cookie."""
+    is_prod = not settings.DEBUG
+    response.delete_cookie(
+        key=_REFRESH_COOKIE_NAME,
+        path="/",
+        samesite="None" if is_prod else "Lax",
+    )
+
+
+class CookieTokenRefreshView(APIView):
+    """Custom token refresh that reads the refresh token from the HttpOnly cookie
+    instead of requiring it in the request body.
+    Falls back to the body 'refresh' field for backwards compatibility.
+    """
+    throttle_classes = []
+
+    def post(self, request):
+        refresh_token = request.COOKIES.get(_REFRESH_COOKIE_NAME) or request.data.get('refresh')
+        if not refresh_token:
+            return Response(
+                {'error': 'No refresh token provided.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            token = RefreshToken(refresh_token)
+            new_access = str(token.access_token)
+            return Response(
+                {'access': new_access},
+                status=status.HTTP_200_OK
+            )
+        except Exception:
+            response = Response(
+                {'error': 'Invalid or expired refresh token.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+            _clear_refresh_cookie(response)
+            return response
+
+
+
+""" SIGN-UP VIEW """
+class SignUpView(APIView):
+    def post(self, request):
+        serializer = SignUpSerializer(data=request.data)
+        if serializer.is_valid():
+            user = serializer.save()
+            refresh = RefreshToken.for_user(user)
+            response = Response({
+                'message': 'Signed Up Successfully.',
+                'tokens': {
+                    'access': str(refresh.access_token)
+                }
+            }, status=status.HTTP_201_CREATED)
+            _set_refresh_cookie(response, str(refresh))
+            return response
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+""" SIGN-IN VIEW """
+class SignInView(APIView):
+    def post(self, request):
+        username = request.data.get('username')
+        password = request.data.get('password')
+        if not username or not password:
+            return Response(
+                {'error':'Please provide both username and password.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user = authenticate(username=username, password=password)
+        if user is None:
+            return Response(
+                {'error':'Invalid credentials.'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        refresh = RefreshToken.for_user(user)
+        response = Response(
+            {'message':'Signed In Successfully.',
+                'tokens': {
+                    'access': str(refresh.access_token)
+                }
+            },
+            status=status.HTTP_200_OK
+        )
+        _set_refresh_cookie(response, str(refresh))
+        return response
+
+""" LOG-OUT VIEW """
+class LogOutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Read refresh token from HttpOnly cookie first, fall back to body.
+        refresh_token = request.COOKIES.get('refresh_token') or request.data.get('refresh')
+        if not refresh_token:
+            return Response(
+                {'error':'Please provide the refresh token'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            token = RefreshToken(refresh_token)
+            token.blacklist()
+            response = Response(
+                {'message': 'Logged out successfully.'},
+                status=status.HTTP_200_OK
+            )
+            _clear_refresh_cookie(response)
+            return response
+        except Exception:
+            response = Response(
+                {'error': 'Invalid or expired token.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            _clear_refresh_cookie(response)
+            return response
+
+""" DELETE ACCOUNT VIEW"""
+class DeleteAccountView(APIView):
+    permission_classes = [IsAuthenticated]
+    
+    def delete(self, request):
+        password = request.data.get('password')
+        if not password:
+            return Response(
+                {'error': 'Please provide your password to confirm account deletion.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user = authenticate(username=request.user.username, password=password)
+        if user is None:
+            return Response(
+                {'error': 'Incorrect Password!'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        from api.answer_cache import get_answer_cache
+        from api.semantic_cache import get_semantic_cache
+        from api.index_registry import registry as index_registry
+        from api.retriever import get_rerank_cache
+        from api.views import _user_doc_dir
+
+        # RTBF: Delete user's document directory and all files.
+        user_dir = _user_doc_dir(user)
+        if os.path.isdir(user_dir):
+            shutil.rmtree(user_dir, ignore_errors=True)
+        # Drop any in-memory indexes, rerank scores and answers held for this user.
+        index_registry.invalidate_user(user.id)
+        for user_cache in (get_rerank_cache(), get_answer_cache(), get_semantic_cache()):
+            if user_cache is not None:
+                user_cache.invalidate_user(user.id)
+        user.delete()
+        response = Response(
+            {'message': 'Account deleted successfully.'},
+            status=status.HTTP_200_OK
+        )
+        _clear_refresh_cookie(response)
+        return response
+
+""" ACCOUNT VIEW """
+class AccountView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({
+            'username': request.user.username,
+            'email': request.user.email,
+        }, status=status.HTTP_200_OK)
+
+""" FORGOT PASSWORD VIEW """
+class ForgotPasswordView(APIView):
+    def post(self, request):
+        email = request.data.get('email')
+        if not email:
+            return Response(
+                {'error': 'Please provide your email.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            user = User.objects.get(email=email)
+        except User.DoesNotExist:
+            return Response(
+                {'message': 'If an account with this email exits, a reset link has been sent.'},
+                status=status.HTTP_200_OK
+            )
+        # Reset token artifacts should be delivered out-of-band (e.g., email),
+        # not returned in API responses.
+        default_token_generator.make_token(user)
+        urlsafe_base64_encode(force_bytes(user.pk))
+        return Response({
+            'message': 'If an account with this email exits, a reset link has been sent.',
+            }, status=status.HTTP_200_OK
+        )
+
+""" RESET PASSWORD VIEW """
+class ResetPasswordView(APIView):
+    def post(self, request):
+        uid = request.data.get('uid')
+        token = request.data.get('token')
+        new_password = request.data.get('new_password')
+        if not uid or not token or not new_password:
+            return Response(
+                {'error': 'uid, token, and new_password are required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(new_password) < 8:
+            return Response(
+                {'error': 'Password must be at least 8 characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            user_id = force_str(urlsafe_base64_decode(uid))
+            user = User.objects.get(pk=user_id)
+        except (User.DoesNotExist, ValueError):
+            return Response(
+                {'error': 'Invalid reset link.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not default_token_generator.check_token(user, token):
+            return Response(
+                {'error': 'Invalid or expired token.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user.set_password(new_password)
+        user.save()
+        return Response(
+            {'message': 'Password reset successfully'},
+            status=status.HTTP_200_OK
+        )
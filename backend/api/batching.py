@@ -0,0 +1,161 @@
+"""Micro-batching of model calls made from concurrent request threads.
+
+Under concurrent load every request thread encodes its own one-sentence query
+and reranks its own handful of pairs, so the CPU runs many tiny forward
+passes. ``MicroBatcher`` queues those calls, waits up to ``max_wait_ms`` for
+more to arrive (or until ``max_batch_size`` items are queued), runs them as a
+single model call on a background thread and hands each caller its slice of
+the result. Calls that are already large (ingestion batches) run directly in
+the caller's thread.
+
+Batching only helps when one process serves several requests at once, e.g.
+gunicorn with ``--threads``.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Keyword arguments that do not change the model output, so calls that only
+# differ in them can share a batch.
+_BATCH_SAFE_KWARGS = {"show_progress_bar", "batch_size"}
+
+
+class MicroBatcher:
+    """Run ``run_batch(items)`` over items submitted by many threads.
+
+    ``run_batch`` takes a list of items and returns one result per item
+    (anything sliceable along the first axis, such as a NumPy array).
+    """
+
+    def __init__(self, run_batch, max_batch_size=64, max_wait_ms=2.0, name="micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.calls = 0
+        self.batches = 0
+        self.batched_items = 0
+
+    def submit(self, items):
+        """Return the results for ``items``, blocking until their batch has run."""
+        items = list(items)
+        if not items:
+            return self.run_batch(items)
+        if len(items) >= self.max_batch_size:
+            return self.run_batch(items)
+        future = Future()
+        self._ensure_worker().put((items, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        with self._lock:
+            # Threads do not survive fork(); a forked worker starts its own.
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._worker, args=(self._queue,), name=self.name, daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def _worker(self, requests):
+        while True:
+            batch = [requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._run(batch)
+
+    def _run(self, batch):
+        items = [item for request_items, _ in batch for item in request_items]
+        try:
+            results = self.run_batch(items)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        with self._lock:
+            self.calls += len(batch)
+            self.batches += 1
+            self.batched_items += len(items)
+        offset = 0
+        for request_items, future in batch:
+            future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "calls": self.calls,
+                "batches": self.batches,
+                "mean_batch_items": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+                "mean_calls_per_batch": round(self.calls / self.batches, 2) if self.batches else 0.0,
+            }
+
+
+class BatchedEmbeddingModel:
+    """Wrap a sentence encoder so small ``encode`` calls are micro-batched.
+
+    Calls with output-changing keyword arguments bypass the batcher. Any other
+    attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait_ms=2.0):
+        self.model = model
+        self.batcher = MicroBatcher(self._encode_batch, max_batch_size, max_wait_ms, name="embedding-batcher")
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _encode_batch(self, texts):
+        encoded = np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
+        return encoded.reshape(len(texts), -1)
+
+    def encode(self, sentences, **kwargs):
+        if isinstance(sentences, str):
+            if set(kwargs) - _BATCH_SAFE_KWARGS:
+                return self.model.encode(sentences, **kwargs)
+            return self.batcher.submit([sentences])[0]
+        sentences = list(sentences)
+        if set(kwargs) - _BATCH_SAFE_KWARGS or len(sentences) >= self.batcher.max_batch_size:
+            return self.model.encode(sentences, **kwargs)
+        return self.batcher.submit(sentences)
+
+
+class BatchedReranker:
+    """Wrap a cross-encoder so small ``predict`` calls are micro-batched."""
+
+    def __init__(self, reranker, max_batch_size=64, max_wait_ms=2.0):
+        self.reranker = reranker
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait_ms, name="rerank-batcher")
+
+    def __getattr__(self, name):
+        return getattr(self.reranker, name)
+
+    def _predict_batch(self, pairs):
+        return np.asarray(self.reranker.predict(pairs, show_progress_bar=False), dtype=np.float32).reshape(-1)
+
+    def predict(self, pairs, **kwargs):
+        pairs = [list(pair) for pair in pairs]
+        if set(kwargs) - _BATCH_SAFE_KWARGS or len(pairs) >= self.batcher.max_batch_size:
+            return self.reranker.predict(pairs, **kwargs)
+        return self.batcher.submit(pairs)
@@ -0,0 +1,263 @@
+"""Inverted-index BM25 (Okapi) with NumPy postings.
+
+Scores match ``rank_bm25.BM25Okapi`` (same k1, b, epsilon and IDF floor), but
+queries only touch the postings of the query terms and the top k is taken
+with a partial selection, so lexical search cost depends on how common the
+query terms are rather than on corpus size.
+
+Postings are kept in CSR segments: for term id ``t`` the documents of a
+segment containing it are ``doc_ids[offsets[t]:offsets[t + 1]]`` with term
+frequencies ``tfs`` at the same positions. ``add_documents`` builds a segment
+for the new documents only and merges segments lazily, binary-counter style,
+so an incremental ingest costs its own postings plus O(documents + terms) for
+the global statistics rather than a re-sort of every posting. Removing or
+subsetting documents renumbers positions in every posting list, so those
+merge the segments and rebuild in O(total postings).
+
+Instances are treated as immutable; ``add_documents``, ``remove_documents``
+and ``subset`` return new indexes, so a published index can be read while an
+updated one is being built.
+"""
+
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+
+def _segment_counts(segment, n_terms):
+    """Per-term posting counts of ``segment``, padded to ``n_terms``."""
+    counts = np.zeros(n_terms, dtype=np.int64)
+    seg_counts = np.diff(segment[0])
+    counts[:len(seg_counts)] = seg_counts
+    return counts
+
+
+class BM25Index:
+    def __init__(self, terms, segments, doc_len, k1=1.5, b=0.75, epsilon=0.25, df=None):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        # Each segment is an (offsets, doc_ids, tfs) CSR over the term ids
+        # known when it was built; later terms have no postings in it.
+        self.segments = segments
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        if df is None:
+            df = np.zeros(len(terms), dtype=np.int64)
+            for segment in segments:
+                df += _segment_counts(segment, len(terms))
+        self.df = df
+        self._compute_statistics()
+
+    @classmethod
+    def build(cls, tokenized_docs, **params):
+        return cls._empty(**params).add_documents(tokenized_docs)
+
+    @classmethod
+    def _empty(cls, **params):
+        return cls(terms=[], segments=[], doc_len=np.zeros(0, dtype=np.int32), **params)
+
+    @property
+    def corpus_size(self):
+        return len(self.doc_len)
+
+    def _params(self):
+        return {"k1": self.k1, "b": self.b, "epsilon": self.epsilon}
+
+    def _compute_statistics(self):
+        n_docs = self.corpus_size
+        self.avgdl = float(self.doc_len.mean()) if n_docs else 0.0
+        df = self.df.astype(np.float64)
+        present = df > 0
+        idf = np.zeros(len(df), dtype=np.float64)
+        idf[present] = np.log(n_docs - df[present] + 0.5) - np.log(df[present] + 0.5)
+        # Same floor as BM25Okapi: terms in more than half the corpus get
+        # epsilon * average idf instead of a negative weight.
+        self.average_idf = float(idf[present].mean()) if present.any() else 0.0
+        idf[present & (idf < 0)] = self.epsilon * self.average_idf
+        self.idf = idf
+        if n_docs:
+            self._length_norm = (self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)).astype(np.float32)
+        else:
+            self._length_norm = np.zeros(0, dtype=np.float32)
+
+    def _postings(self, query_tokens):
+        """Concatenated (doc_ids, contributions) for every query token."""
+        doc_parts = []
+        score_parts = []
+        for token in query_tokens:
+            term_id = self.term_ids.get(token)
+            if term_id is None:
+                continue
+            for offsets, doc_ids, tfs in self.segments:
+                if term_id + 1 >= len(offsets):
+                    continue
+                start, stop = offsets[term_id], offsets[term_id + 1]
+                if start == stop:
+                    continue
+                docs = doc_ids[start:stop]
+                tf = tfs[start:stop]
+                doc_parts.append(docs)
+                score_parts.append(self.idf[term_id] * (tf * (self.k1 + 1) / (tf + self._length_norm[docs])))
+        return doc_parts, score_parts
+
+    def top_k(self, query_tokens, k):
+        """Return ``(doc_positions, scores)`` of the best ``k`` matching documents.
+
+        Only documents containing at least one query term are candidates.
+        """
+        doc_parts, score_parts = self._postings(query_tokens)
+        if not doc_parts or k <= 0:
+            return [], []
+        docs = np.concatenate(doc_parts)
+        contributions = np.concatenate(score_parts)
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions, minlength=len(candidates))
+        if len(candidates) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(candidates))
+        # Highest score first; ties broken by document position.
+        best = best[np.lexsort((candidates[best], -scores[best]))]
+        return candidates[best].tolist(), scores[best].tolist()
+
+    def get_scores(self, query_tokens):
+        """Dense score array over all documents (BM25Okapi-compatible)."""
+        scores = np.zeros(self.corpus_size, dtype=np.float64)
+        for docs, contributions in zip(*self._postings(query_tokens)):
+            np.add.at(scores, docs, contributions)
+        return scores
+
+    @staticmethod
+    def _merge_segments(segments, n_terms):
+        """One segment holding the postings of ``segments`` (in document order)."""
+        if len(segments) == 1 and len(segments[0][0]) == n_terms + 1:
+            return segments[0]
+        counts = [_segment_counts(segment, n_terms) for segment in segments]
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(sum(counts), out=offsets[1:])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        # Segments hold increasing document ranges, so writing each one after
+        # the previous ones' postings of the same term keeps every list sorted
+        # without a global sort.
+        cursor = offsets[:-1].copy()
+        for (seg_offsets, seg_docs, seg_tfs), seg_counts in zip(segments, counts):
+            term_of = np.repeat(np.arange(n_terms, dtype=np.int64), seg_counts)
+            rank = np.arange(len(seg_docs), dtype=np.int64) - seg_offsets[term_of]
+            dest = cursor[term_of] + rank
+            doc_ids[dest] = seg_docs
+            tfs[dest] = seg_tfs
+            cursor += seg_counts
+        return offsets, doc_ids, tfs
+
+    def _triples(self):
+        offsets, doc_ids, tfs = self._merge_segments(self.segments, len(self.terms)) if self.segments else (
+            np.zeros(len(self.terms) + 1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        )
+        term_ids = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(offsets))
+        return term_ids, doc_ids, tfs
+
+    @staticmethod
+    def _segment_from_triples(n_terms, term_ids, doc_ids, tfs):
+        order = np.argsort(term_ids, kind="stable")
+        offsets = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=n_terms), out=offsets[1:])
+        return (
+            offsets,
+            np.ascontiguousarray(doc_ids[order], dtype=np.int32),
+            np.ascontiguousarray(tfs[order], dtype=np.float32),
+        )
+
+    def add_documents(self, tokenized_docs):
+        """Index with ``tokenized_docs`` appended after the existing documents.
+
+        The new postings become their own segment. While the previous segment
+        is no larger than the one after it the two are merged, which keeps the
+        segment count logarithmic in the number of postings and merges each
+        posting O(log n) times overall.
+        """
+        terms = list(self.terms)
+        term_ids = dict(self.term_ids)
+        new_terms, new_docs, new_tfs, new_len = [], [], [], []
+        first_doc = self.corpus_size
+        for offset, tokens in enumerate(tokenized_docs):
+            new_len.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                term_id = term_ids.get(token)
+                if term_id is None:
+                    term_id = term_ids[token] = len(terms)
+                    terms.append(token)
+                new_terms.append(term_id)
+                new_docs.append(first_doc + offset)
+                new_tfs.append(count)
+        segments = list(self.segments)
+        df = np.zeros(len(terms), dtype=np.int64)
+        df[:len(self.df)] = self.df
+        if new_terms:
+            segment = self._segment_from_triples(
+                len(terms),
+                np.asarray(new_terms, dtype=np.int64),
+                np.asarray(new_docs, dtype=np.int32),
+                np.asarray(new_tfs, dtype=np.float32),
+            )
+            df += np.diff(segment[0])
+            segments.append(segment)
+            while len(segments) > 1 and len(segments[-2][1]) <= len(segments[-1][1]):
+                merged = self._merge_segments(segments[-2:], len(terms))
+                segments[-2:] = [merged]
+        return BM25Index(
+            terms,
+            segments,
+            np.concatenate([self.doc_len, np.asarray(new_len, dtype=np.int32)]),
+            df=df,
+            **self._params(),
+        )
+
+    def _remap(self, new_positions, doc_len):
+        """Rebuild with document ``i`` renumbered to ``new_positions[i]`` (-1 drops it)."""
+        term_ids, doc_ids, tfs = self._triples()
+        mapped = new_positions[doc_ids] if len(doc_ids) else doc_ids
+        keep = mapped >= 0
+        terms = list(self.terms)
+        segment = self._segment_from_triples(len(terms), term_ids[keep], mapped[keep], tfs[keep])
+        return BM25Index(terms, [segment], np.ascontiguousarray(doc_len, dtype=np.int32), **self._params())
+
+    def remove_documents(self, positions):
+        """Index without the documents at ``positions``; later ones shift down."""
+        removed = np.zeros(self.corpus_size, dtype=bool)
+        removed[np.asarray(list(positions), dtype=np.int64)] = True
+        new_positions = np.cumsum(~removed) - 1
+        new_positions[removed] = -1
+        return self._remap(new_positions, self.doc_len[~removed])
+
+    def subset(self, positions):
+        """Index over the documents at ``positions``, renumbered in that order."""
+        positions = np.asarray(list(positions), dtype=np.int64)
+        new_positions = np.full(self.corpus_size, -1, dtype=np.int64)
+        new_positions[positions] = np.arange(len(positions))
+        return self._remap(new_positions, self.doc_len[positions])
+
+    def save(self, directory, prefix="bm25"):
+        arrays = {"doc_len": self.doc_len, "df": self.df}
+        for i, (offsets, doc_ids, tfs) in enumerate(self.segments):
+            arrays[f"offsets_{i}"] = offsets
+            arrays[f"doc_ids_{i}"] = doc_ids
+            arrays[f"tfs_{i}"] = tfs
+        np.savez(os.path.join(directory, f"{prefix}.npz"), **arrays)
+        with open(os.path.join(directory, f"{prefix}_terms.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.terms, "segments": len(self.segments), "params": self._params()}, f)
+
+    @classmethod
+    def load(cls, directory, prefix="bm25"):
+        with open(os.path.join(directory, f"{prefix}_terms.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(directory, f"{prefix}.npz")) as arrays:
+            segments = [
+                (arrays[f"offsets_{i}"], arrays[f"doc_ids_{i}"], arrays[f"tfs_{i}"])
+                for i in range(meta["segments"])
+            ]
+            return cls(meta["terms"], segments, arrays["doc_len"], df=arrays["df"], **meta["params"])
@@ -15,6 +15,10 @@ _SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
 # Common abbreviations that shouldn't trigger sentence splits.
 _ABBREVS = {"Mr.", "Mrs.", "Ms.", "Dr.", "Prof.", "Sr.", "Jr.", "vs.", "etc.", "e.g.", "i.e."}
 
+# Sentences encoded per batch. Large enough to keep the encoder busy, small
+# enough that book-length documents don't hold every vector in memory.
+ENCODE_WINDOW_SIZE = 1024
+
 
 def _split_sentences(text):
     """Split text into sentences, keeping non-empty results."""
@@ -32,14 +36,32 @@ def _split_sentences(text):
     return merged
 
 
-def _cosine_similarity(a, b):
-    """Cosine similarity between two 1-D vectors."""
-    dot = np.dot(a, b)
-    norm = np.linalg.norm(a) * np.linalg.norm(b)
-    return float(dot / norm) if norm > 0 else 0.0
+def normalize_rows(matrix):
+    """L2-normalize each row; zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
 
+def _iter_normalized_windows(sentences, model, window_size):
+    """Yield normalized sentence embeddings ``window_size`` sentences at a time.
 
-def semantic_chunk(text, model, max_chunk_chars=1500, similarity_threshold=0.45):
+    Only one window of vectors is alive at once, so memory stays flat however
+    long the document is.
+    """
+    for start in range(0, len(sentences), window_size):
+        window = sentences[start:start + window_size]
+        embeddings = np.array(model.encode(window, show_progress_bar=False), dtype=np.float32)
+        yield normalize_rows(embeddings.reshape(len(window), -1))
+
+
+def semantic_chunk(
+    text,
+    model,
+    max_chunk_chars=1500,
+    similarity_threshold=0.45,
+    return_embeddings=False,
+    window_size=ENCODE_WINDOW_SIZE,
+):
     """Split text into semantically coherent chunks.
 
     Args:
@@ -48,48 +70,91 @@ def semantic_chunk(text, model, max_chunk_chars=1500, similarity_threshold=0.45)
         max_chunk_chars: Soft character limit per chunk.
         similarity_threshold: Minimum cosine similarity between consecutive
             sentences to keep them in the same chunk.
+        return_embeddings: Also return the (normalized) sentence embeddings
+            of each chunk so they can be stored for query-time compression.
+        window_size: Number of sentences encoded per ``model.encode`` call.
 
     Returns:
-        A list of chunk strings.
+        A list of chunk strings, or ``(chunks, sentence_embeddings)`` when
+        ``return_embeddings`` is set, where ``sentence_embeddings[i]`` is a
+        (sentences, dim) array for ``chunks[i]`` or None if not encoded.
     """
     if not text or not text.strip():
-        return []
+        return ([], []) if return_embeddings else []
 
     sentences = _split_sentences(text)
 
     # If very few sentences, return as a single chunk.
     if len(sentences) <= 2:
         joined = " ".join(sentences)
-        return [joined] if joined.strip() else []
-
-    # Encode all sentences at once for efficiency.
-    embeddings = model.encode(sentences, show_progress_bar=False)
-    embeddings = np.array(embeddings, dtype=np.float32)
-
-    # Group sentences into chunks based on similarity boundaries.
+        chunks = [joined] if joined.strip() else []
+        return (chunks, [None] * len(chunks)) if return_embeddings else chunks
+
+    windows = _iter_normalized_windows(sentences, model, max(1, int(window_size)))
+    return chunk_sentences(
+        sentences,
+        windows,
+        max_chunk_chars=max_chunk_chars,
+        similarity_threshold=similarity_threshold,
+        return_embeddings=return_embeddings,
+    )
+
+
+def chunk_sentences(sentences, windows, max_chunk_chars=1500, similarity_threshold=0.45, return_embeddings=False):
+    """Group already-encoded sentences into chunks.
+
+    ``windows`` yields L2-normalized embedding matrices that together cover
+    ``sentences`` in order (one matrix is fine). This is the boundary
+    detection half of ``semantic_chunk``, shared with the batched ingestion
+    pipeline, which encodes sentences from many documents together.
+    """
     chunks = []
-    current_sentences = [sentences[0]]
-    current_len = len(sentences[0])
-
-    for i in range(1, len(sentences)):
-        sim = _cosine_similarity(embeddings[i - 1], embeddings[i])
-        sentence_len = len(sentences[i])
-
-        # Start a new chunk if similarity drops or we hit the size limit.
-        if sim < similarity_threshold or (current_len + sentence_len > max_chunk_chars):
-            chunk_text = " ".join(current_sentences).strip()
-            if chunk_text:
-                chunks.append(chunk_text)
-            current_sentences = [sentences[i]]
-            current_len = sentence_len
-        else:
-            current_sentences.append(sentences[i])
+    chunk_embeddings = []
+    current_sentences = []
+    current_vectors = []
+    current_len = 0
+    previous = None
+    position = 0
+
+    def flush():
+        chunk_text = " ".join(current_sentences).strip()
+        if chunk_text:
+            chunks.append(chunk_text)
+            if return_embeddings:
+                chunk_embeddings.append(np.concatenate(current_vectors).astype(np.float16))
+
+    for window in windows:
+        # Cosine similarity of every sentence with the one before it, in one
+        # vectorized pass (the first compares against the previous window).
+        similarities = np.empty(len(window), dtype=np.float32)
+        similarities[0] = float(previous @ window[0]) if previous is not None else 1.0
+        similarities[1:] = np.einsum("ij,ij->i", window[:-1], window[1:])
+        breaks = (similarities < similarity_threshold).tolist()
+
+        window_start = 0
+        for offset, is_break in enumerate(breaks):
+            sentence = sentences[position + offset]
+            sentence_len = len(sentence)
+            # Start a new chunk if similarity drops or we hit the size limit.
+            if current_sentences and (is_break or current_len + sentence_len > max_chunk_chars):
+                if return_embeddings:
+                    current_vectors.append(window[window_start:offset])
+                flush()
+                current_sentences = []
+                current_vectors = []
+                current_len = 0
+                window_start = offset
+            current_sentences.append(sentence)
             current_len += sentence_len
+        if return_embeddings:
+            current_vectors.append(window[window_start:])
+        previous = window[-1]
+        position += len(window)
 
     # Don't forget the last chunk.
     if current_sentences:
-        chunk_text = " ".join(current_sentences).strip()
-        if chunk_text:
-            chunks.append(chunk_text)
+        flush()
 
+    if return_embeddings:
+        return chunks, chunk_embeddings
     return chunks
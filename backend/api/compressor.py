@@ -8,6 +8,8 @@ sentences from each chunk, reducing prompt token waste.
 import re
 import numpy as np
 
+from api.chunker import normalize_rows
+
 
 _SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
 
@@ -29,14 +31,7 @@ def _split_sentences(text):
     return merged
 
 
-def _cosine_similarity(a, b):
-    """Cosine similarity between two 1-D vectors."""
-    dot = np.dot(a, b)
-    norm = np.linalg.norm(a) * np.linalg.norm(b)
-    return float(dot / norm) if norm > 0 else 0.0
-
-
-def compress_chunks(query, chunks, model, min_similarity=0.3):
+def compress_chunks(query, chunks, model, min_similarity=0.3, sentence_embeddings=None, query_vector=None):
     """Compress chunks by keeping only query-relevant sentences.
 
     Args:
@@ -44,6 +39,13 @@ def compress_chunks(query, chunks, model, min_similarity=0.3):
         chunks: List of chunk strings (post-retrieval / post-rerank).
         model: A SentenceTransformer model (or anything with .encode()).
         min_similarity: Minimum cosine similarity for a sentence to be kept.
+        sentence_embeddings: Optional list aligned with ``chunks`` holding the
+            sentence embeddings stored at ingest time (or None per chunk).
+            Chunks with stored vectors are scored without an encoder call.
+        query_vector: Optional embedding of ``query`` (e.g. the one dense
+            retrieval already computed). With it and stored vectors for every
+            chunk, compression is a matrix-vector product per chunk and the
+            encoder is not called at all.
 
     Returns:
         A list of compressed chunk strings. Chunks that compress to empty
@@ -52,39 +54,51 @@ def compress_chunks(query, chunks, model, min_similarity=0.3):
     if not chunks:
         return []
 
-    # Encode query once.
-    query_emb = model.encode([query], show_progress_bar=False)
-    query_vec = np.array(query_emb, dtype=np.float32).flatten()
+    split_chunks = [_split_sentences(chunk) for chunk in chunks]
 
-    compressed = []
-    for chunk in chunks:
-        sentences = _split_sentences(chunk)
-
-        # If the chunk is very short (1-2 sentences), keep it as-is
-        # since there's nothing meaningful to compress.
+    # Collect every sentence that needs encoding so they (and the query, when
+    # no query_vector is given) go through the encoder in a single batched call.
+    to_encode = []
+    spans = []
+    for i, sentences in enumerate(split_chunks):
+        # Very short chunks (1-2 sentences) are kept as-is; nothing to compress.
         if len(sentences) <= 2:
-            compressed.append(chunk)
+            spans.append(None)
             continue
+        stored = sentence_embeddings[i] if sentence_embeddings is not None else None
+        if stored is not None and len(stored) == len(sentences):
+            spans.append(np.asarray(stored, dtype=np.float32))
+        else:
+            spans.append((len(to_encode), len(to_encode) + len(sentences)))
+            to_encode.extend(sentences)
+
+    if all(span is None for span in spans):
+        return list(chunks)
+
+    texts = to_encode if query_vector is not None else [query] + to_encode
+    encoded = np.zeros((0, 0), dtype=np.float32)
+    if texts:
+        encoded = np.array(model.encode(texts, show_progress_bar=False), dtype=np.float32).reshape(len(texts), -1)
+    if query_vector is not None:
+        query_vec = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+    else:
+        query_vec, encoded = normalize_rows(encoded[:1])[0], encoded[1:]
+    encoded_sims = normalize_rows(encoded) @ query_vec if to_encode else None
 
-        # Encode all sentences in the chunk.
-        sent_embs = model.encode(sentences, show_progress_bar=False)
-        sent_embs = np.array(sent_embs, dtype=np.float32)
-
-        # Keep sentences above the similarity threshold.
-        kept = []
-        for j, sent in enumerate(sentences):
-            sim = _cosine_similarity(query_vec, sent_embs[j])
-            if sim >= min_similarity:
-                kept.append(sent)
+    compressed = []
+    for chunk, sentences, span in zip(chunks, split_chunks, spans):
+        if span is None:
+            compressed.append(chunk)
+            continue
+        if isinstance(span, tuple):
+            sims = encoded_sims[span[0]:span[1]]
+        else:
+            sims = normalize_rows(span) @ query_vec
 
+        kept = [sent for sent, sim in zip(sentences, sims) if sim >= min_similarity]
         # If compression removed everything, keep the top sentence by score.
         if not kept:
-            scores = [
-                _cosine_similarity(query_vec, sent_embs[j])
-                for j in range(len(sentences))
-            ]
-            best_idx = int(np.argmax(scores))
-            kept = [sentences[best_idx]]
+            kept = [sentences[int(np.argmax(sims))]]
 
         result = " ".join(kept).strip()
         if result:
@@ -0,0 +1,112 @@
+"""Rolling conversation history kept on the ``Conversation`` row.
+
+Chat views used to reload every message of a conversation for each question.
+Instead, each conversation keeps its last ``RAG_PROMPT_HISTORY_MAX_TURNS``
+turns verbatim in ``recent_turns`` and a running ``summary`` of everything
+older, so building the history is a single row read and its size stays
+bounded however long the conversation gets.
+
+``record_turn`` runs in the request: it appends the new turn to
+``recent_turns`` and, once a turn drops out of that window, schedules
+``update_summary`` in the background. The job folds every message after
+``summarized_through`` that is no longer in the window into the summary, using
+the user's LLM when one is configured and an extractive summary otherwise. It
+reads the messages table rather than ``recent_turns``, so jobs that run late,
+twice or out of order still fold each message exactly once.
+"""
+
+import logging
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from api.models import ChatMessage, Conversation, UserProfile
+from api.prompt_budget import estimate_tokens, truncate_to_tokens
+from api.tasks import run_in_background
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def _max_turns():
+    return max(0, getattr(settings, "RAG_PROMPT_HISTORY_MAX_TURNS", 6))
+
+
+def _summary_tokens():
+    return getattr(settings, "RAG_CONVERSATION_SUMMARY_TOKENS", 300)
+
+
+def record_turn(conversation, message):
+    """Add ``message`` to the verbatim window of ``conversation``.
+
+    The window is appended to the row as it is now, re-read under a row lock,
+    not to the copy loaded at the start of the request: a concurrent answer
+    in the same conversation (another tab, another thread) may have saved its
+    turn while this request was waiting on the LLM.
+    """
+    max_turns = _max_turns()
+    with transaction.atomic():
+        current = Conversation.objects.select_for_update().get(id=conversation.id)
+        turns = list(current.recent_turns or []) + [{"question": message.question, "answer": message.answer}]
+        overflow = len(turns) > max_turns
+        current.recent_turns = turns[-max_turns:] if max_turns else []
+        current.save(update_fields=["recent_turns", "updated_at"])
+    conversation.recent_turns = current.recent_turns
+    conversation.updated_at = current.updated_at
+    if overflow:
+        run_in_background(update_summary, conversation.id)
+
+
+def extractive_summary(summary, turns, max_tokens):
+    """Append one line per turn (question and the answer's first sentence), dropping the oldest lines past ``max_tokens``."""
+    lines = [line for line in summary.splitlines() if line.strip()]
+    for turn in turns:
+        question = " ".join(turn["question"].split())
+        answer = _SENTENCE_END_RE.split(" ".join(turn["answer"].split()), maxsplit=1)[0]
+        lines.append(f"- {question} -> {answer}")
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_to_tokens("\n".join(lines), max_tokens)
+
+
+def _summarize(conversation, turns):
+    from api.encryption import decrypt_value
+    from api.generator import summarize_conversation
+
+    max_tokens = _summary_tokens()
+    profile = UserProfile.objects.filter(user_id=conversation.user_id).first()
+    if profile is not None and profile.llm_api_key and profile.llm_model:
+        try:
+            summary = summarize_conversation(
+                conversation.summary, turns, profile.llm_provider, profile.llm_model,
+                decrypt_value(profile.llm_api_key), max_tokens=max_tokens,
+            )
+            if summary:
+                return truncate_to_tokens(summary, max_tokens)
+        except Exception:
+            logger.warning("Summarizing conversation %s with %s failed; using an extractive summary",
+                           conversation.id, profile.llm_provider, exc_info=True)
+    return extractive_summary(conversation.summary, turns, max_tokens)
+
+
+def update_summary(conversation_id):
+    """Fold the messages that left the verbatim window into the conversation summary."""
+    conversation = Conversation.objects.filter(id=conversation_id).first()
+    if conversation is None:
+        return
+    max_turns = _max_turns()
+    pending = list(
+        ChatMessage.objects.filter(conversation_id=conversation_id, id__gt=conversation.summarized_through)
+        .order_by("id")
+        .values("id", "question", "answer")
+    )
+    to_fold = pending[:len(pending) - max_turns] if max_turns else pending
+    if not to_fold:
+        return
+    summary = _summarize(conversation, to_fold)
+    # Only apply the summary if no other job advanced it in the meantime.
+    Conversation.objects.filter(id=conversation_id, summarized_through=conversation.summarized_through).update(
+        summary=summary, summarized_through=to_fold[-1]["id"],
+    )
@@ -0,0 +1,248 @@
+"""Content-addressed embedding cache.
+
+Sentence and chunk embeddings are keyed by ``(model name, sha256(text))`` and
+stored in a small SQLite database, so re-ingesting unchanged documents,
+re-chunking the same sentences and compressing frequently retrieved chunks
+hit the cache instead of the encoder. SQLite is used because it is safe to
+share between gunicorn and Celery processes on the same host. Entries carry a
+last-used timestamp and the least recently used rows are evicted once the
+table grows past ``max_entries``.
+
+Only texts that recur are worth caching: request-time query encodes go
+through ``retriever.get_query_embedding_model()``, which bypasses this cache.
+Writers keep a running estimate of the row count instead of counting the table
+inside every insert transaction. The table is only counted again every
+``count_interval`` seconds, or when the estimate passes ``max_entries``. Rows
+that other processes insert are therefore noticed by up to ``count_interval``
+late.
+
+Reads do not write: recency updates are collected in memory and written in
+one transaction every ``touch_interval`` seconds (or ``touch_batch`` keys),
+or together with the next insert, so lookups never wait for SQLite's write
+lock. Eviction is therefore approximate by up to ``touch_interval``.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# encode() keyword arguments that do not change the resulting vectors.
+_CACHE_SAFE_KWARGS = {"show_progress_bar", "batch_size", "convert_to_numpy"}
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU store of float32 vectors for one or more models."""
+
+    def __init__(self, path, max_entries=200000, touch_interval=60.0, touch_batch=1000, count_interval=60.0):
+        self.path = str(path)
+        self.max_entries = max(1, int(max_entries))
+        self.touch_interval = float(touch_interval)
+        self.touch_batch = max(1, int(touch_batch))
+        self.count_interval = float(count_interval)
+        self._count_lock = threading.Lock()
+        self._row_estimate = None
+        self._last_count = 0.0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # (model, key) -> last read time, not yet written to last_used.
+        self._touches = {}
+        self._touch_lock = threading.Lock()
+        self._last_touch_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model_name, keys):
+        """Return ``{key: vector}`` for the keys present in the cache."""
+        found = {}
+        if not keys:
+            return found
+        conn = self._connect()
+        unique = list(dict.fromkeys(keys))
+        # Stay well below SQLite's bound-parameter limit.
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, dim, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                [model_name, *batch],
+            ).fetchall()
+            for key, dim, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32, count=dim)
+        if found:
+            now = time.time()
+            with self._touch_lock:
+                for key in found:
+                    self._touches[(model_name, key)] = now
+                due = (
+                    len(self._touches) >= self.touch_batch
+                    or time.monotonic() - self._last_touch_flush >= self.touch_interval
+                )
+            if due:
+                with conn:
+                    self._write_touches(conn)
+        return found
+
+    def _write_touches(self, conn):
+        with self._touch_lock:
+            touches, self._touches = self._touches, {}
+            self._last_touch_flush = time.monotonic()
+        if touches:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                [(used, model, key) for (model, key), used in touches.items()],
+            )
+
+    def put_many(self, model_name, items):
+        """Store ``(key, vector)`` pairs and evict the oldest rows if over budget."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            vector = np.ascontiguousarray(vector, dtype=np.float32).ravel()
+            rows.append((model_name, key, vector.shape[0], vector.tobytes(), now))
+        conn = self._connect()
+        with conn:
+            # Pending recency updates go in first so eviction sees them.
+            self._write_touches(conn)
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._evict(conn, len(rows))
+
+    def _evict(self, conn, inserted):
+        now = time.monotonic()
+        with self._count_lock:
+            if self._row_estimate is not None and now - self._last_count < self.count_interval:
+                # Replaced rows are counted too, so this only errs high.
+                self._row_estimate += inserted
+                if self._row_estimate <= self.max_entries:
+                    return
+        (count,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            # Trim to 90% so eviction does not run on every insert once full.
+            excess = count - int(self.max_entries * 0.9)
+            conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC, rowid ASC LIMIT ?)",
+                (excess,),
+            )
+            count -= excess
+        with self._count_lock:
+            self._row_estimate = count
+            self._last_count = now
+
+    def record(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM embeddings")
+        with self._touch_lock:
+            self._touches.clear()
+        with self._count_lock:
+            self._row_estimate = None
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        try:
+            (entries,) = self._connect().execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        except sqlite3.Error:
+            entries = None
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbeddingModel:
+    """Wrap a SentenceTransformer so ``encode`` consults an ``EmbeddingCache``.
+
+    Only texts missing from the cache are sent to the model, in a single
+    ``encode`` call. Any other attribute is delegated to the wrapped model.
+    """
+
+    def __init__(self, model, cache, model_name):
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def encode(self, sentences, **kwargs):
+        if set(kwargs) - _CACHE_SAFE_KWARGS:
+            return self.model.encode(sentences, **kwargs)
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return self.model.encode(sentences, **kwargs)
+
+        keys = [text_key(text) for text in texts]
+        try:
+            cached = self.cache.get_many(self.model_name, keys)
+        except sqlite3.Error:
+            logger.warning("Embedding cache read failed; encoding without cache", exc_info=True)
+            return self.model.encode(sentences, **kwargs)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            encoded = np.asarray(self.model.encode(list(missing.values()), **kwargs), dtype=np.float32)
+            encoded = encoded.reshape(len(missing), -1)
+            fresh = dict(zip(missing.keys(), encoded))
+            cached.update(fresh)
+            try:
+                self.cache.put_many(self.model_name, list(fresh.items()))
+            except sqlite3.Error:
+                logger.warning("Embedding cache write failed", exc_info=True)
+        self.cache.record(hits=len(texts) - len(missing), misses=len(missing))
+
+        result = np.stack([cached[key] for key in keys])
+        return result[0] if single else result
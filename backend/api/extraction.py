@@ -0,0 +1,343 @@
+"""Plain-text extraction from uploaded documents.
+
+Parsing PDFs and DOCX files is CPU-bound, so ingestion fans it out over a
+bounded process pool: one task per file, and one task per page range for
+large PDFs. Results are yielded in input order as soon as each file is
+complete, so chunking can start before the whole upload has been parsed.
+
+Extracted text is cached on disk per user, keyed by the file's content hash
+and ``EXTRACTOR_VERSION``, so reindexing unchanged files and document
+previews are a small file read instead of a full parse.
+
+This module deliberately does not import Django: worker processes are
+started with the ``spawn`` method and only need to import this file.
+
+Celery's prefork pool runs tasks in daemonic child processes, which
+``multiprocessing`` refuses to give children. There the pool is a billiard
+(Celery's fork of ``multiprocessing``) pool instead, which has no such
+restriction, so reindex tasks get the same parallelism as the web process.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Files whose parsing is worth shipping to another process.
+_POOLED_EXTENSIONS = (".pdf", ".docx")
+
+# Bump whenever extract_text_from_file output changes so cached text is redone.
+EXTRACTOR_VERSION = 1
+
+
+def file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TextCache:
+    """Extracted text stored as ``<cache_dir>/<sha256>.v<EXTRACTOR_VERSION>.txt``."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _path(self, sha256):
+        return os.path.join(self.cache_dir, f"{sha256}.v{EXTRACTOR_VERSION}.txt")
+
+    def has(self, sha256):
+        return os.path.exists(self._path(sha256))
+
+    def get(self, sha256):
+        try:
+            with open(self._path(sha256), "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, sha256, text):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = os.path.join(self.cache_dir, f".{sha256}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(sha256))
+        except OSError:
+            logger.warning("Failed to cache extracted text in %s", self.cache_dir, exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def prune(self, keep, tmp_grace_seconds=3600):
+        """Delete entries whose hash is not in ``keep`` or that use an old extractor version.
+
+        Temporary files of in-flight ``put`` calls are left alone unless they
+        are older than ``tmp_grace_seconds`` (left behind by a crashed writer).
+        """
+        keep_names = {os.path.basename(self._path(sha256)) for sha256 in keep}
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            if name in keep_names:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith(".tmp") and now - os.path.getmtime(path) < tmp_grace_seconds:
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _is_cacheable(filename):
+    # Plain text reads are as cheap as a cache read; only cache parsed formats.
+    return os.path.splitext(filename)[1].lower() in _POOLED_EXTENSIONS
+
+
+def extract_text_cached(filepath, filename, text_cache, sha256=None):
+    """``extract_text_from_file`` through ``text_cache``; parse errors propagate."""
+    if not _is_cacheable(filename):
+        return extract_text_from_file(filepath, filename)
+    if sha256 is None:
+        sha256 = file_sha256(filepath)
+    text = text_cache.get(sha256)
+    if text is None:
+        text = extract_text_from_file(filepath, filename)
+        text_cache.put(sha256, text)
+    return text
+
+
+def extract_text_from_file(filepath, filename):
+    """Extract plain text from a file based on its extension. Returns a single string."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".txt", ".md"):
+        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    if ext == ".pdf":
+        from pypdf import PdfReader
+        reader = PdfReader(filepath)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    if ext == ".docx":
+        from docx import Document
+        doc = Document(filepath)
+        return "\n".join(p.text for p in doc.paragraphs)
+    return ""
+
+
+def _extract_pdf_pages(filepath, start, stop):
+    from pypdf import PdfReader
+    reader = PdfReader(filepath)
+    return "\n".join(reader.pages[i].extract_text() or "" for i in range(start, stop))
+
+
+def _pdf_page_count(filepath):
+    from pypdf import PdfReader
+    return len(PdfReader(filepath).pages)
+
+
+def _extract_or_empty(filepath, filename):
+    try:
+        return extract_text_from_file(filepath, filename)
+    except Exception:
+        logger.warning("Failed to extract text from %s", filename, exc_info=True)
+        return ""
+
+
+def _submit_file(pool, filepath, filename, pdf_pages_per_task):
+    """Return the parts of one file: finished strings or futures, in page order."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _POOLED_EXTENSIONS:
+        return [_extract_or_empty(filepath, filename)]
+    if ext == ".pdf":
+        try:
+            pages = _pdf_page_count(filepath)
+        except Exception:
+            logger.warning("Failed to read %s", filename, exc_info=True)
+            return [""]
+        if pages > pdf_pages_per_task:
+            return [
+                pool.submit(_extract_pdf_pages, filepath, start, min(start + pdf_pages_per_task, pages))
+                for start in range(0, pages, pdf_pages_per_task)
+            ]
+    return [pool.submit(extract_text_from_file, filepath, filename)]
+
+
+class _BilliardFuture:
+    def __init__(self, async_result):
+        self._async_result = async_result
+
+    def result(self, timeout=None):
+        from billiard.exceptions import TimeoutError as BilliardTimeoutError
+
+        try:
+            return self._async_result.get(timeout=timeout)
+        except BilliardTimeoutError:
+            raise FutureTimeoutError() from None
+
+
+class _BilliardPool:
+    """The part of the ``ProcessPoolExecutor`` API used here, over a billiard pool."""
+
+    def __init__(self, max_workers):
+        import billiard
+
+        self._pool = billiard.get_context("spawn").Pool(max_workers)
+
+    def submit(self, fn, *args):
+        return _BilliardFuture(self._pool.apply_async(fn, args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if wait:
+            self._pool.close()
+        else:
+            # Queued tasks cannot be dropped one by one; nobody waits for
+            # their results, so stop the workers instead.
+            self._pool.terminate()
+        self._pool.join()
+
+
+def _start_pool(max_workers):
+    if multiprocessing.current_process().daemon:
+        return _BilliardPool(max_workers)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _iter_serial(files, is_cancelled):
+    for filepath, filename in files:
+        if is_cancelled and is_cancelled():
+            return
+        yield filename, _extract_or_empty(filepath, filename)
+
+
+def iter_extracted_texts(files, max_workers=None, pdf_pages_per_task=50, is_cancelled=None, text_cache=None):
+    """Yield ``(filename, text)`` for each entry of ``files``.
+
+    Entries are ``(filepath, filename)`` or ``(filepath, filename, sha256)``.
+    With a ``text_cache`` and a known hash, cached text is used directly and
+    newly extracted text is stored. Otherwise see ``_iter_extracted_texts``.
+    """
+    files = [tuple(entry) + (None,) * (3 - len(entry)) for entry in files]
+    if text_cache is None:
+        yield from _iter_extracted_texts(
+            [(filepath, filename) for filepath, filename, _ in files],
+            max_workers, pdf_pages_per_task, is_cancelled,
+        )
+        return
+
+    hits = {
+        filename for _, filename, sha256 in files
+        if sha256 and _is_cacheable(filename) and text_cache.has(sha256)
+    }
+    hashes = {filename: sha256 for _, filename, sha256 in files}
+    extracted = _iter_extracted_texts(
+        [(filepath, filename) for filepath, filename, _ in files if filename not in hits],
+        max_workers, pdf_pages_per_task, is_cancelled,
+    )
+    try:
+        for filepath, filename, sha256 in files:
+            if is_cancelled and is_cancelled():
+                return
+            if filename in hits:
+                text = text_cache.get(sha256)
+                if text is None:  # Removed since the check above.
+                    text = _extract_or_empty(filepath, filename)
+                yield filename, text
+                continue
+            extracted_name, text = next(extracted, (None, None))
+            if extracted_name is None:
+                return
+            # Empty text may be a parse failure; don't pin it in the cache.
+            if text and hashes.get(extracted_name) and _is_cacheable(extracted_name):
+                text_cache.put(hashes[extracted_name], text)
+            yield extracted_name, text
+    finally:
+        extracted.close()
+
+
+def _iter_extracted_texts(files, max_workers=None, pdf_pages_per_task=50, is_cancelled=None):
+    """Yield ``(filename, text)`` for each ``(filepath, filename)`` in ``files``.
+
+    Heavy formats are parsed in a pool of ``max_workers`` processes (default:
+    CPU count, capped at 8) with at most two tasks per worker in flight, so
+    memory stays bounded however many files are queued. Extraction is serial
+    when one worker is configured, when nothing needs the pool, or when the
+    pool cannot be started.
+
+    Iteration stops early once ``is_cancelled()`` returns True; queued work is
+    cancelled and running workers are not waited for. Files that fail to
+    parse, including PDFs with a failed page range, yield an empty string so
+    that ingestion reports them as failed instead of indexing partial text.
+    """
+    files = list(files)
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, 8)
+    max_workers = max(1, int(max_workers))
+    pdf_pages_per_task = max(1, int(pdf_pages_per_task))
+    pooled = sum(1 for _, filename in files if os.path.splitext(filename)[1].lower() in _POOLED_EXTENSIONS)
+    if max_workers == 1 or pooled == 0:
+        yield from _iter_serial(files, is_cancelled)
+        return
+
+    try:
+        pool = _start_pool(max_workers)
+    except (OSError, ValueError, ImportError):
+        logger.warning("Could not start extraction pool; extracting serially", exc_info=True)
+        yield from _iter_serial(files, is_cancelled)
+        return
+
+    in_flight_limit = max_workers * 2
+    queue = deque()
+    remaining = iter(files)
+    exhausted = False
+    cancelled = False
+    try:
+        while True:
+            while not exhausted and sum(len(parts) for _, parts in queue) < in_flight_limit:
+                try:
+                    filepath, filename = next(remaining)
+                except StopIteration:
+                    exhausted = True
+                    break
+                queue.append((filename, _submit_file(pool, filepath, filename, pdf_pages_per_task)))
+            if not queue:
+                return
+
+            filename, parts = queue.popleft()
+            texts = []
+            for part in parts:
+                while not isinstance(part, str):
+                    if is_cancelled and is_cancelled():
+                        cancelled = True
+                        return
+                    try:
+                        part = part.result(timeout=0.5)
+                    except FutureTimeoutError:
+                        continue
+                    except Exception:
+                        logger.warning("Failed to extract text from %s", filename, exc_info=True)
+                        break
+                if not isinstance(part, str):
+                    # One failed page range fails the whole file.
+                    texts = []
+                    break
+                texts.append(part)
+            yield filename, "\n".join(texts)
+            if is_cancelled and is_cancelled():
+                cancelled = True
+                return
+    finally:
+        # On cancellation (or if the consumer stops early) drop queued tasks
+        # and let running ones finish in the background.
+        pool.shutdown(wait=not cancelled and exhausted and not queue, cancel_futures=True)
@@ -1,14 +1,76 @@
+import logging
 import os
 import requests
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from api.prompt_budget import (
+    estimate_tokens, fit_chunks, fit_history, format_summary, format_turn, history_share, model_token_budget, truncate_to_tokens,
+)
 
 load_dotenv()
 
-try:
-    from google import genai as google_genai
-except ImportError:
-    google_genai = None
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_VERSION = "2023-06-01"
+
+_client_pool = None
+
+
+def _google_genai():
+    # The provider SDKs are imported on first use so Django startup (and every
+    # process that never calls an LLM) does not pay for them.
+    try:
+        from google import genai as google_genai
+    except ImportError:
+        return None
+    return google_genai
+
+
+def get_client_pool():
+    """Process-wide pool of provider clients, or None when disabled by settings."""
+    global _client_pool
+    if _client_pool is None:
+        from django.conf import settings
+        from api.llm_clients import ClientPool
+
+        max_clients = getattr(settings, "RAG_LLM_CLIENT_POOL_SIZE", 32)
+        if max_clients <= 0:
+            return None
+        _client_pool = ClientPool(
+            max_clients=max_clients,
+            idle_seconds=getattr(settings, "RAG_LLM_CLIENT_IDLE_SECONDS", 300),
+        )
+    return _client_pool
+
+
+def _pooled_client(provider, base_url, api_key, factory):
+    pool = get_client_pool()
+    if pool is None:
+        return factory()
+    return pool.get(provider, base_url, api_key, factory)
+
+
+def _openai_client(api_key, base_url):
+    from openai import OpenAI
+
+    return _pooled_client("openai-compatible", base_url, api_key, lambda: OpenAI(api_key=api_key, base_url=base_url))
+
+
+def _gemini_client(google_genai, api_key):
+    return _pooled_client("google-gemini", None, api_key, lambda: google_genai.Client(api_key=api_key))
+
+
+def _anthropic_session(api_key, url):
+    def build():
+        session = requests.Session()
+        session.headers.update({
+            "x-api-key": api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json",
+        })
+        return session
+
+    return _pooled_client("anthropic", url, api_key, build)
 
 
 class ProviderAPIError(Exception):
@@ -17,12 +79,7 @@ class ProviderAPIError(Exception):
         self.status_code = status_code
 
 
-def _build_prompt(query, context_chunks, chat_history=None):
-    context = "\n\n".join([f"[{i+1}] {chunk}" for i, chunk in enumerate(context_chunks)])
-    history_text = ""
-    if chat_history:
-        for msg in chat_history:
-            history_text += f"User: {msg['question']}\nAssistant: {msg['answer']}\n\n"
+def _render_prompt(query, context, history_text):
     return f""" Use only the context below to answer the question. The context contains the answer; extract and cite it. Cite sources as [1], [2], etc. If the context clearly contains the answer, you must provide it.
 
 Context:
@@ -35,8 +92,45 @@ Question: {query}
 Answer:"""
 
 
+def _build_prompt(query, context_chunks, chat_history=None, token_budget=None, history_summary=""):
+    """Assemble the prompt, fitting context and history into ``token_budget`` tokens.
+
+    The history (the conversation summary, then the recent turns) may take up to ``RAG_PROMPT_HISTORY_SHARE`` of the budget left
+    after the instructions and question; context chunks keep their rank order
+    and fill the rest, and any context budget left over goes back to the
+    history. Without a budget everything is included. Returns
+    ``(prompt, stats)``.
+    """
+    all_chunks = list(context_chunks)
+    chunks = all_chunks
+    turns = list(chat_history or [])
+    if token_budget is None:
+        history_text = format_summary(history_summary) + "".join(format_turn(t) for t in turns)
+        verbatim_turns, summarized_turns = len(turns), 0
+    else:
+        available = max(0, token_budget - estimate_tokens(_render_prompt(query, "", "")))
+        history_needed = estimate_tokens(format_summary(history_summary) + "".join(format_turn(t) for t in turns))
+        chunks = fit_chunks(chunks, available - min(history_needed, int(available * history_share())))
+        context_tokens = estimate_tokens("\n\n".join(f"[{i+1}] {chunk}" for i, chunk in enumerate(chunks)))
+        history_room = available - context_tokens - estimate_tokens("Conversation History:")
+        history_text, verbatim_turns, summarized_turns = fit_history(turns, history_room, summary=history_summary)
+    context = "\n\n".join([f"[{i+1}] {chunk}" for i, chunk in enumerate(chunks)])
+    prompt = _render_prompt(query, context, history_text)
+    return prompt, {
+        "token_budget": token_budget,
+        "prompt_tokens": estimate_tokens(prompt),
+        "context_tokens": estimate_tokens(context),
+        "history_tokens": estimate_tokens(history_text),
+        "context_chunks": len(chunks),
+        "context_chunks_dropped": len(all_chunks) - len(chunks),
+        "history_turns": verbatim_turns,
+        "history_turns_summarized": summarized_turns,
+        "history_turns_dropped": len(turns) - verbatim_turns - summarized_turns,
+    }
+
+
 def _generate_with_openai_compatible(prompt, api_key, model, base_url, max_tokens=1200):
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    client = _openai_client(api_key, base_url)
     response = client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
@@ -50,7 +144,7 @@ def _generate_with_openai_compatible(prompt, api_key, model, base_url, max_token
 
 
 def _stream_openai_compatible(prompt, api_key, model, base_url, max_tokens=1200):
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    client = _openai_client(api_key, base_url)
     response = client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
@@ -65,9 +159,10 @@ def _stream_openai_compatible(prompt, api_key, model, base_url, max_tokens=1200)
 
 
 def _generate_with_gemini(prompt, api_key, model):
+    google_genai = _google_genai()
     if google_genai is not None:
         try:
-            client = google_genai.Client(api_key=api_key)
+            client = _gemini_client(google_genai, api_key)
             response = client.models.generate_content(
                 model=model,
                 contents=prompt,
@@ -94,9 +189,10 @@ def _generate_with_gemini(prompt, api_key, model):
 
 
 def _stream_gemini(prompt, api_key, model):
+    google_genai = _google_genai()
     if google_genai is not None:
         try:
-            client = google_genai.Client(api_key=api_key)
+            client = _gemini_client(google_genai, api_key)
             response = client.models.generate_content_stream(
                 model=model,
                 contents=prompt,
@@ -125,13 +221,8 @@ def _stream_gemini(prompt, api_key, model):
 def _generate_with_anthropic(prompt, api_key, model, max_tokens=1200):
     url = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1/messages")
     try:
-        response = requests.post(
+        response = _anthropic_session(api_key, url).post(
             url,
-            headers={
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json",
-            },
             json={
                 "model": model,
                 "max_tokens": max_tokens,
@@ -162,13 +253,10 @@ def _generate_with_anthropic(prompt, api_key, model, max_tokens=1200):
 def _stream_anthropic(prompt, api_key, model, max_tokens=1200):
     url = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1/messages")
     try:
-        response = requests.post(
+        # Closing the response hands the connection back to the pooled session
+        # even when the stream stops early.
+        with _anthropic_session(api_key, url).post(
             url,
-            headers={
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json",
-            },
             json={
                 "model": model,
                 "max_tokens": max_tokens,
@@ -177,30 +265,30 @@ def _stream_anthropic(prompt, api_key, model, max_tokens=1200):
             },
             timeout=60,
             stream=True,
-        )
-        if response.status_code >= 400:
-            try:
-                payload = response.json()
-                message = payload.get("error", {}).get("message") or str(payload)
-            except Exception:
-                message = response.text
-            raise ProviderAPIError(f"Anthropic error: {message}", status_code=response.status_code)
-        for line in response.iter_lines(decode_unicode=True):
-            if not line or not line.startswith("data: "):
-                continue
-            data = line[6:]
-            if data == "[DONE]":
-                break
-            try:
-                import json
-                event = json.loads(data)
-                if event.get("type") == "content_block_delta":
-                    delta = event.get("delta", {})
-                    text = delta.get("text", "")
-                    if text:
-                        yield text
-            except json.JSONDecodeError:
-                continue
+        ) as response:
+            if response.status_code >= 400:
+                try:
+                    payload = response.json()
+                    message = payload.get("error", {}).get("message") or str(payload)
+                except Exception:
+                    message = response.text
+                raise ProviderAPIError(f"Anthropic error: {message}", status_code=response.status_code)
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                data = line[6:]
+                if data == "[DONE]":
+                    break
+                try:
+                    import json
+                    event = json.loads(data)
+                    if event.get("type") == "content_block_delta":
+                        delta = event.get("delta", {})
+                        text = delta.get("text", "")
+                        if text:
+                            yield text
+                except json.JSONDecodeError:
+                    continue
     except ProviderAPIError:
         raise
     except Exception as e:
@@ -276,17 +364,60 @@ def _generate_with_provider(provider, model, key, prompt, max_tokens=1200):
         raise ProviderAPIError(f"{provider} error: {e}", status_code=400)
 
 
-def generate_answer(query, context_chunks, provider, model, api_key, chat_history=None):
+def _prompt_for(query, context_chunks, model, chat_history, history_summary, prompt_stats):
+    """Budgeted prompt for ``model``; its token stats go into ``prompt_stats`` if given."""
+    prompt, stats = _build_prompt(
+        query, context_chunks, chat_history=chat_history, token_budget=model_token_budget(model), history_summary=history_summary,
+    )
+    logger.info(
+        "Prompt for %s: %d tokens (context %d in %d chunks, history %d in %d turns, budget %d)",
+        model, stats["prompt_tokens"], stats["context_tokens"], stats["context_chunks"],
+        stats["history_tokens"], stats["history_turns"], stats["token_budget"],
+    )
+    if prompt_stats is not None:
+        prompt_stats.update(stats)
+    return prompt
+
+
+def generate_answer(query, context_chunks, provider, model, api_key, chat_history=None, prompt_stats=None, history_summary=""):
     key = (api_key or "").strip()
     if not key:
         raise ValueError("No API key is configured. Please add your provider, model, and API key in Settings.")
     if not model:
         raise ValueError("No model is configured. Please select a model in Settings.")
 
-    prompt = _build_prompt(query, context_chunks, chat_history=chat_history)
+    prompt = _prompt_for(query, context_chunks, model, chat_history, history_summary, prompt_stats)
     return _generate_with_provider(provider, model, key, prompt, max_tokens=1200)
 
 
+def summarize_conversation(summary, turns, provider, model, api_key, max_tokens=300):
+    """Fold ``turns`` into the running ``summary`` of a conversation.
+
+    Each answer is cut to ``max_tokens`` and the transcript to the model's
+    prompt budget, so the call stays bounded however many turns are folded.
+    """
+    key = (api_key or "").strip()
+    if not key:
+        raise ValueError("No API key is configured. Please add your provider, model, and API key in Settings.")
+    if not model:
+        raise ValueError("No model is configured. Please select a model in Settings.")
+
+    transcript = "".join(
+        format_turn({"question": turn["question"], "answer": truncate_to_tokens(turn["answer"], max_tokens)})
+        for turn in turns
+    )
+    transcript = truncate_to_tokens(transcript, max(0, model_token_budget(model) - 2 * max_tokens - 100))
+    prompt = f"""Update the running summary of a conversation between a user and a document assistant. Keep the topics, facts, names and numbers the user may refer back to, and drop pleasantries. Reply with the updated summary only, in at most {max_tokens * 3 // 4} words.
+
+Current summary:
+{summary or "(none)"}
+
+New turns:
+{transcript}
+Updated summary:"""
+    return _generate_with_provider(provider, model, key, prompt, max_tokens=max_tokens).strip()
+
+
 def _stream_with_provider(provider, model, key, prompt, max_tokens=1200):
     try:
         if provider == "google-gemini":
@@ -342,14 +473,14 @@ def _stream_with_provider(provider, model, key, prompt, max_tokens=1200):
         raise ProviderAPIError(f"{provider} error: {e}", status_code=400)
 
 
-def generate_answer_stream(query, context_chunks, provider, model, api_key, chat_history=None):
+def generate_answer_stream(query, context_chunks, provider, model, api_key, chat_history=None, prompt_stats=None, history_summary=""):
     key = (api_key or "").strip()
     if not key:
         raise ValueError("No API key is configured. Please add your provider, model, and API key in Settings.")
     if not model:
         raise ValueError("No model is configured. Please select a model in Settings.")
 
-    prompt = _build_prompt(query, context_chunks, chat_history=chat_history)
+    prompt = _prompt_for(query, context_chunks, model, chat_history, history_summary, prompt_stats)
     return _stream_with_provider(provider, model, key, prompt, max_tokens=1200)
 
 
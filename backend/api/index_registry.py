@@ -0,0 +1,324 @@
+"""Per-user retrieval index registry.
+
+Every (user, collection) pair gets its own in-memory index so that requests
+from different tenants on the same worker no longer throw each other's corpus
+away. Entries are kept in LRU order and evicted once the registry exceeds its
+entry or total-chunk budget.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+class UserIndex:
+    """Chunks, sources and search structures for one user/collection."""
+
+    def __init__(
+        self,
+        docs=None,
+        chunk_sources=None,
+        index=None,
+        embeddings=None,
+        bm25_index=None,
+        fingerprint=None,
+        files=None,
+        sentence_embeddings=None,
+    ):
+        self.docs = docs if docs is not None else []
+        self.chunk_sources = chunk_sources if chunk_sources is not None else []
+        self.index = index
+        self.embeddings = embeddings
+        self.bm25_index = bm25_index
+        self.fingerprint = fingerprint
+        # Per-file manifest ({filename: {"sha256", "size", "mtime_ns"}}) used
+        # to decide which files need re-chunking on the next ingest.
+        self.files = files if files is not None else {}
+        # Per-chunk (sentences, dim) float16 arrays computed by semantic_chunk,
+        # or None, so compression can score sentences without the encoder.
+        self.sentence_embeddings = (
+            sentence_embeddings if sentence_embeddings is not None else [None] * len(self.docs)
+        )
+        self._chunk_positions = None
+        # Throughput figures of the ingest run that produced this object (not persisted).
+        self.ingest_stats = None
+
+    @property
+    def total_chunks(self):
+        return len(self.docs)
+
+    @property
+    def is_empty(self):
+        return self.index is None or self.index.ntotal == 0
+
+    @property
+    def documents(self):
+        """Source filenames in first-seen order."""
+        return list(dict.fromkeys(self.chunk_sources))
+
+    def sentence_embeddings_for(self, chunks):
+        """Stored sentence embeddings for each chunk text (None where unknown)."""
+        if self._chunk_positions is None:
+            self._chunk_positions = {}
+            for i, doc in enumerate(self.docs):
+                self._chunk_positions.setdefault(doc, i)
+        result = []
+        for chunk in chunks:
+            position = self._chunk_positions.get(chunk)
+            result.append(self.sentence_embeddings[position] if position is not None else None)
+        return result
+
+    def subset(self, filenames, fingerprint=None):
+        """Index restricted to chunks from ``filenames``, built from stored vectors.
+
+        Used for collection indexes so they never re-embed anything.
+        """
+        from api.retriever import build_index_from_embeddings
+
+        filenames = set(filenames)
+        positions = [i for i, source in enumerate(self.chunk_sources) if source in filenames]
+        embeddings = None
+        if self.embeddings is not None and positions:
+            embeddings = np.asarray(self.embeddings[positions], dtype=np.float32)
+        return UserIndex(
+            docs=[self.docs[i] for i in positions],
+            chunk_sources=[self.chunk_sources[i] for i in positions],
+            index=build_index_from_embeddings(embeddings),
+            embeddings=embeddings,
+            bm25_index=self.bm25_index.subset(positions) if self.bm25_index is not None and positions else None,
+            fingerprint=fingerprint,
+            files={name: info for name, info in self.files.items() if name in filenames},
+            sentence_embeddings=[self.sentence_embeddings[i] for i in positions],
+        )
+
+    def copy(self):
+        """Independent copy that can be updated while readers keep using this one."""
+        from api.retriever import clone_index
+
+        return UserIndex(
+            docs=list(self.docs),
+            chunk_sources=list(self.chunk_sources),
+            index=clone_index(self.index) if self.index is not None else None,
+            embeddings=np.array(self.embeddings, dtype=np.float32) if self.embeddings is not None else None,
+            # BM25 indexes are immutable; updates return a new object.
+            bm25_index=self.bm25_index,
+            fingerprint=self.fingerprint,
+            files=dict(self.files),
+            # Arrays are never mutated in place, so sharing them is safe.
+            sentence_embeddings=list(self.sentence_embeddings),
+        )
+
+    def remove_files(self, filenames):
+        """Drop all chunks, vectors and BM25 statistics belonging to ``filenames``."""
+        from api.retriever import index_after_remove
+
+        filenames = set(filenames)
+        for filename in filenames:
+            self.files.pop(filename, None)
+        positions = [i for i, source in enumerate(self.chunk_sources) if source in filenames]
+        if not positions:
+            return
+        removed = set(positions)
+        keep = [i for i in range(len(self.docs)) if i not in removed]
+        self.docs = [self.docs[i] for i in keep]
+        self.chunk_sources = [self.chunk_sources[i] for i in keep]
+        self.sentence_embeddings = [self.sentence_embeddings[i] for i in keep]
+        self._chunk_positions = None
+        if self.embeddings is not None:
+            self.embeddings = np.delete(self.embeddings, positions, axis=0)
+        # Row i of the index must keep matching docs[i].
+        self.index = index_after_remove(self.index, positions, self.embeddings)
+        if self.bm25_index is not None:
+            self.bm25_index = self.bm25_index.remove_documents(positions) if self.docs else None
+
+    def add_file(self, filename, chunks, embeddings, file_info, sentence_embeddings=None):
+        """Append one file's chunks and their precomputed embeddings."""
+        self.add_files([(filename, chunks, embeddings, file_info, sentence_embeddings)])
+
+    def add_files(self, entries):
+        """Append several files at once.
+
+        ``entries`` holds ``(filename, chunks, embeddings, file_info,
+        sentence_embeddings)`` tuples. Vectors are stacked and added to FAISS
+        in one call so batched ingestion doesn't re-copy the matrix per file.
+        """
+        from api.bm25 import BM25Index
+        from api.retriever import bm25_tokenize, index_after_add
+
+        new_docs = []
+        new_sources = []
+        new_embeddings = []
+        new_sentence_embeddings = []
+        for filename, chunks, embeddings, file_info, sentence_embeddings in entries:
+            self.files[filename] = file_info
+            if not chunks:
+                continue
+            new_docs.extend(chunks)
+            new_sources.extend([filename] * len(chunks))
+            new_embeddings.append(np.asarray(embeddings, dtype=np.float32))
+            if sentence_embeddings is None:
+                sentence_embeddings = [None] * len(chunks)
+            new_sentence_embeddings.extend(
+                np.asarray(vectors, dtype=np.float16) if vectors is not None else None
+                for vectors in sentence_embeddings
+            )
+        if not new_docs:
+            return
+
+        embeddings = np.ascontiguousarray(np.vstack(new_embeddings), dtype=np.float32)
+        tokenized = [bm25_tokenize(chunk) for chunk in new_docs]
+        self.embeddings = embeddings if self.embeddings is None else np.vstack([self.embeddings, embeddings])
+        self.index = index_after_add(self.index, self.embeddings)
+        if self.bm25_index is None:
+            self.bm25_index = BM25Index.build(tokenized)
+        else:
+            self.bm25_index = self.bm25_index.add_documents(tokenized)
+        self.docs.extend(new_docs)
+        self.chunk_sources.extend(new_sources)
+        self.sentence_embeddings.extend(new_sentence_embeddings)
+        self._chunk_positions = None
+
+
+class IndexRegistry:
+    """Thread-safe LRU of ``UserIndex`` objects keyed by (user_id, collection_id).
+
+    Limits default to the ``RAG_INDEX_REGISTRY_MAX_ENTRIES`` and
+    ``RAG_INDEX_REGISTRY_MAX_CHUNKS`` settings and are read on every insert so
+    they can be tuned without restarting.
+    """
+
+    def __init__(self, max_entries=None, max_chunks=None):
+        self._max_entries = max_entries
+        self._max_chunks = max_chunks
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Build locks exist only for keys that are cached or being loaded.
+        self._key_locks = {}
+        # Chunk count of each entry when it was stored, and their running sum.
+        self._entry_chunks = {}
+        self._total_chunks = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "RAG_INDEX_REGISTRY_MAX_ENTRIES", 16)
+
+    @property
+    def max_chunks(self):
+        if self._max_chunks is not None:
+            return self._max_chunks
+        return getattr(settings, "RAG_INDEX_REGISTRY_MAX_CHUNKS", 250000)
+
+    def get(self, key, fingerprint=None):
+        """Return the cached index for ``key`` or None.
+
+        When ``fingerprint`` is given and differs from the cached entry's, the
+        entry is treated as stale, dropped and counted as a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and fingerprint is not None and entry.fingerprint != fingerprint:
+                self._remove_locked(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, user_index):
+        with self._lock:
+            self._total_chunks -= self._entry_chunks.get(key, 0)
+            self._entries[key] = user_index
+            self._entries.move_to_end(key)
+            self._entry_chunks[key] = user_index.total_chunks
+            self._total_chunks += self._entry_chunks[key]
+            self._evict_locked()
+
+    def get_or_load(self, key, loader, fingerprint=None):
+        """Return the cached index for ``key``, building it with ``loader()`` on a miss.
+
+        Concurrent callers for the same key wait for a single build instead of
+        loading the corpus once per thread.
+        """
+        entry = self.get(key, fingerprint=fingerprint)
+        if entry is not None:
+            return entry
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and (fingerprint is None or entry.fingerprint == fingerprint):
+                    self._entries.move_to_end(key)
+                    return entry
+            try:
+                entry = loader()
+            except Exception:
+                with self._lock:
+                    if key not in self._entries and self._key_locks.get(key) is key_lock:
+                        del self._key_locks[key]
+                raise
+            self.put(key, entry)
+            return entry
+
+    def invalidate(self, key):
+        with self._lock:
+            self._remove_locked(key)
+
+    def invalidate_user(self, user_id):
+        """Drop every entry (all collections) belonging to ``user_id``."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id]:
+                self._remove_locked(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._entry_chunks.clear()
+            self._total_chunks = 0
+            self._key_locks = {k: lock for k, lock in self._key_locks.items() if lock.locked()}
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _remove_locked(self, key):
+        if self._entries.pop(key, None) is None:
+            return
+        self._total_chunks -= self._entry_chunks.pop(key, 0)
+        key_lock = self._key_locks.get(key)
+        # A held lock belongs to a build in progress, which will store a new entry.
+        if key_lock is not None and not key_lock.locked():
+            del self._key_locks[key]
+
+    def _evict_locked(self):
+        max_entries = max(1, int(self.max_entries))
+        max_chunks = max(1, int(self.max_chunks))
+        # Always keep the most recently used entry, even if it alone is over budget.
+        while len(self._entries) > 1 and (len(self._entries) > max_entries or self._total_chunks > max_chunks):
+            self._remove_locked(next(iter(self._entries)))
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "total_chunks": self._total_chunks,
+                "max_chunks": self.max_chunks,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+registry = IndexRegistry()
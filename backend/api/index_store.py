@@ -0,0 +1,237 @@
+"""Durable on-disk snapshots of a user's retrieval index.
+
+A snapshot holds everything needed to serve queries without re-chunking or
+re-embedding: the FAISS index, the chunk embeddings, chunk texts and sources,
+and BM25 statistics. Snapshots are written into versioned directories and
+published by atomically replacing a ``CURRENT`` pointer file, so readers in
+other processes never observe a half-written index.
+
+Layout::
+
+    <user_doc_dir>/.index/
+        CURRENT                 # name of the published snapshot directory
+        v3-1a2b3c4d/
+            meta.json
+            chunks.json
+            bm25.npz                # BM25 postings (see api/bm25.py)
+            bm25_terms.json
+            embeddings.npy
+            index.faiss
+            index_rows.npy          # graph row of each chunk, if rows are tombstoned
+            sentence_embeddings.npy # float16 sentence vectors of all chunks, concatenated
+            sentence_counts.npy     # sentences per chunk (-1 = not stored)
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from api.bm25 import BM25Index
+from api.index_registry import UserIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 6
+_POINTER_FILE = "CURRENT"
+_LOCK_FILE = ".lock"
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def ingest_lock(base_dir):
+    """Serialize index updates for one user across threads and processes.
+
+    Incremental ingestion reads the published snapshot, applies a delta and
+    publishes a new one; without this lock two concurrent uploads could each
+    start from the same snapshot and one file would be lost.
+    """
+    os.makedirs(base_dir, exist_ok=True)
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(os.path.abspath(base_dir), threading.Lock())
+    with thread_lock:
+        with open(os.path.join(base_dir, _LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def current_snapshot_id(base_dir):
+    """Return the published snapshot name, or None if nothing has been saved."""
+    try:
+        with open(os.path.join(base_dir, _POINTER_FILE), "r", encoding="utf-8") as f:
+            snapshot_id = f.read().strip()
+    except OSError:
+        return None
+    if not snapshot_id or not os.path.isdir(os.path.join(base_dir, snapshot_id)):
+        return None
+    return snapshot_id
+
+
+def _snapshot_version(snapshot_id):
+    try:
+        return int(snapshot_id.split("-", 1)[0].lstrip("v"))
+    except (AttributeError, ValueError):
+        return 0
+
+
+def save_snapshot(base_dir, user_index):
+    """Persist ``user_index`` and publish it. Returns the new snapshot id."""
+    os.makedirs(base_dir, exist_ok=True)
+    previous = current_snapshot_id(base_dir)
+    version = _snapshot_version(previous) + 1
+    snapshot_id = f"v{version}-{uuid.uuid4().hex[:8]}"
+    snapshot_dir = os.path.join(base_dir, snapshot_id)
+    os.makedirs(snapshot_dir)
+
+    try:
+        with open(os.path.join(snapshot_dir, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump({"docs": user_index.docs, "chunk_sources": user_index.chunk_sources}, f)
+        if user_index.bm25_index is not None:
+            user_index.bm25_index.save(snapshot_dir)
+        if user_index.embeddings is not None:
+            np.save(os.path.join(snapshot_dir, "embeddings.npy"), np.asarray(user_index.embeddings, dtype=np.float32))
+        if user_index.index is not None:
+            import faiss
+            from api.retriever import TombstonedIndex
+
+            index = user_index.index
+            if isinstance(index, TombstonedIndex):
+                np.save(os.path.join(snapshot_dir, "index_rows.npy"), index.live_rows)
+                index = index.index
+            faiss.write_index(index, os.path.join(snapshot_dir, "index.faiss"))
+        _save_sentence_embeddings(snapshot_dir, user_index.sentence_embeddings)
+        with open(os.path.join(snapshot_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "format": SNAPSHOT_FORMAT,
+                "version": version,
+                "total_chunks": user_index.total_chunks,
+                "files": user_index.files,
+            }, f)
+
+        pointer_tmp = os.path.join(base_dir, f".{_POINTER_FILE}.{uuid.uuid4().hex[:8]}")
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(snapshot_id)
+        os.replace(pointer_tmp, os.path.join(base_dir, _POINTER_FILE))
+    except Exception:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        raise
+
+    # Keep the previous snapshot around for readers that resolved it just before the swap.
+    _remove_stale_snapshots(base_dir, keep={snapshot_id, previous})
+    user_index.fingerprint = snapshot_id
+    return snapshot_id
+
+
+def load_snapshot(base_dir):
+    """Load the published snapshot as a ``UserIndex``, or None if unavailable."""
+    snapshot_id = current_snapshot_id(base_dir)
+    if snapshot_id is None:
+        return None
+    snapshot_dir = os.path.join(base_dir, snapshot_id)
+    try:
+        with open(os.path.join(snapshot_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            return None
+        with open(os.path.join(snapshot_dir, "chunks.json"), "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        bm25_index = BM25Index.load(snapshot_dir) if os.path.exists(os.path.join(snapshot_dir, "bm25.npz")) else None
+        embeddings_path = os.path.join(snapshot_dir, "embeddings.npy")
+        embeddings = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+        index_path = os.path.join(snapshot_dir, "index.faiss")
+        index = None
+        if os.path.exists(index_path):
+            import faiss
+            from api.retriever import TombstonedIndex
+
+            index = faiss.read_index(index_path)
+            rows_path = os.path.join(snapshot_dir, "index_rows.npy")
+            if os.path.exists(rows_path):
+                index = TombstonedIndex(index, np.load(rows_path))
+        sentence_embeddings = _load_sentence_embeddings(snapshot_dir, len(chunks["docs"]))
+    except (OSError, ValueError, KeyError, RuntimeError):
+        # A concurrent writer may have just removed this snapshot; callers rebuild.
+        logger.warning("Failed to load index snapshot %s", snapshot_dir, exc_info=True)
+        return None
+
+    return UserIndex(
+        docs=chunks["docs"],
+        chunk_sources=chunks["chunk_sources"],
+        index=index,
+        embeddings=embeddings,
+        bm25_index=bm25_index,
+        fingerprint=snapshot_id,
+        files=meta.get("files") or {},
+        sentence_embeddings=sentence_embeddings,
+    )
+
+
+def load_manifest(base_dir):
+    """Per-file manifest of the published snapshot (``{}`` if none), reading only meta.json."""
+    snapshot_id = current_snapshot_id(base_dir)
+    if snapshot_id is None:
+        return {}
+    try:
+        with open(os.path.join(base_dir, snapshot_id, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        return {}
+    return meta.get("files") or {}
+
+
+def _save_sentence_embeddings(snapshot_dir, sentence_embeddings):
+    counts = np.array(
+        [len(vectors) if vectors is not None else -1 for vectors in sentence_embeddings], dtype=np.int32
+    )
+    stored = [vectors for vectors in sentence_embeddings if vectors is not None and len(vectors)]
+    if not stored:
+        return
+    np.save(os.path.join(snapshot_dir, "sentence_counts.npy"), counts)
+    np.save(
+        os.path.join(snapshot_dir, "sentence_embeddings.npy"),
+        np.concatenate([np.asarray(vectors, dtype=np.float16) for vectors in stored]),
+    )
+
+
+def _load_sentence_embeddings(snapshot_dir, total_chunks):
+    counts_path = os.path.join(snapshot_dir, "sentence_counts.npy")
+    if not os.path.exists(counts_path):
+        return [None] * total_chunks
+    counts = np.load(counts_path)
+    vectors = np.load(os.path.join(snapshot_dir, "sentence_embeddings.npy"), mmap_mode="r")
+    if len(counts) != total_chunks:
+        raise ValueError("sentence_counts does not match the number of chunks")
+    result = []
+    offset = 0
+    for count in counts.tolist():
+        if count < 0:
+            result.append(None)
+            continue
+        result.append(vectors[offset:offset + count])
+        offset += count
+    return result
+
+
+def _remove_stale_snapshots(base_dir, keep):
+    for name in os.listdir(base_dir):
+        path = os.path.join(base_dir, name)
+        if name not in keep and name.startswith("v") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
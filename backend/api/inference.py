@@ -0,0 +1,156 @@
+"""Shared model-serving process for embeddings and reranking.
+
+Every gunicorn and Celery process otherwise loads its own SentenceTransformer
+and CrossEncoder. ``serve_models`` (``python manage.py serve_models``) hosts
+both once behind a small localhost HTTP server, micro-batching concurrent
+requests, and when ``RAG_INFERENCE_URL`` points at it ``get_embedding_model``
+and ``get_reranker`` return the clients below instead of loading the models.
+
+Endpoints (JSON bodies)::
+
+    GET  /health   -> {"status": "ok"}
+    POST /encode   {"texts": [...]}          -> {"dim": d, "embeddings": <base64 float32>}
+    POST /predict  {"pairs": [[q, c], ...]}  -> {"scores": [...]}
+
+This module does not import Django or sentence-transformers, so web workers
+that only use the clients stay at their baseline memory.
+"""
+
+import base64
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServiceError(RuntimeError):
+    """The inference server could not be reached or returned an error."""
+
+
+class _RemoteClient:
+    def __init__(self, base_url, timeout=30, fallback=None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # Loads an in-process model if the server is unavailable; None re-raises.
+        self._fallback = fallback
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, path, payload):
+        import requests
+
+        try:
+            response = self._session().post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise InferenceServiceError(f"Inference server request to {path} failed: {exc}") from exc
+
+    def _local_model(self):
+        with self._fallback_lock:
+            if self._fallback_model is None:
+                logger.warning("Inference server at %s unavailable; loading the model in-process", self.base_url)
+                self._fallback_model = self._fallback()
+            return self._fallback_model
+
+
+class RemoteEmbeddingModel(_RemoteClient):
+    """``SentenceTransformer.encode`` served by the inference server."""
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        try:
+            body = self._post("/encode", {"texts": texts})
+        except InferenceServiceError:
+            if self._fallback is None:
+                raise
+            return self._local_model().encode(sentences, **kwargs)
+        vectors = np.frombuffer(base64.b64decode(body["embeddings"]), dtype=np.float32)
+        vectors = vectors.reshape(len(texts), int(body["dim"])) if texts else vectors.reshape(0, int(body["dim"]))
+        return vectors[0] if single else vectors
+
+
+class RemoteReranker(_RemoteClient):
+    """``CrossEncoder.predict`` served by the inference server."""
+
+    def predict(self, pairs, **kwargs):
+        pairs = [[query, chunk] for query, chunk in pairs]
+        try:
+            body = self._post("/predict", {"pairs": pairs})
+        except InferenceServiceError:
+            if self._fallback is None:
+                raise
+            return self._local_model().predict(pairs, **kwargs)
+        return np.asarray(body["scores"], dtype=np.float32)
+
+
+class _InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, OSError):
+            self._send_json(400, {"error": "Invalid JSON body."})
+            return
+        try:
+            if self.path == "/encode":
+                texts = [str(text) for text in payload.get("texts") or []]
+                vectors = np.asarray(self.server.embedding_model.encode(texts), dtype=np.float32)
+                vectors = vectors.reshape(len(texts), -1)
+                self._send_json(200, {
+                    "dim": int(vectors.shape[1]) if texts else 0,
+                    "embeddings": base64.b64encode(np.ascontiguousarray(vectors).tobytes()).decode("ascii"),
+                })
+            elif self.path == "/predict":
+                pairs = [[str(query), str(chunk)] for query, chunk in payload.get("pairs") or []]
+                scores = self.server.reranker.predict(pairs) if pairs else []
+                self._send_json(200, {"scores": np.asarray(scores, dtype=np.float32).reshape(-1).tolist()})
+            else:
+                self._send_json(404, {"error": "Not found."})
+        except (TypeError, ValueError) as exc:
+            self._send_json(400, {"error": str(exc)})
+        except Exception:
+            logger.exception("Inference request to %s failed", self.path)
+            self._send_json(500, {"error": "Inference failed."})
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(host, port, embedding_model, reranker):
+    """HTTP server serving ``embedding_model`` and ``reranker``; call ``serve_forever()``."""
+    server = ThreadingHTTPServer((host, port), _InferenceHandler)
+    server.daemon_threads = True
+    server.embedding_model = embedding_model
+    server.reranker = reranker
+    return server
@@ -0,0 +1,242 @@
+"""Batched ingestion pipeline.
+
+Files are fed in one at a time, but encoding is not done per file: sentences
+from many small files are pooled into fixed-size encoder batches, and the
+resulting chunks are embedded and appended to the index in bounded batches.
+This keeps the encoder busy on corpora of many small files while capping how
+many sentences, chunks and vectors are held in memory at once. Very large
+documents are chunked on their own with windowed encoding, and their chunks
+are still embedded at most ``chunk_batch_size`` at a time.
+
+Files whose text could not be extracted (empty text) or whose chunks failed
+to embed are left out of the index manifest, so the next incremental run
+retries them, and are listed in ``failed_files``.
+"""
+
+import logging
+import sys
+import time
+
+import numpy as np
+
+from api.chunker import _iter_normalized_windows, _split_sentences, chunk_sentences, normalize_rows
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux.
+    if sys.platform == "darwin":
+        return round(usage / (1024 * 1024), 1)
+    return round(usage / 1024, 1)
+
+
+class IngestStats:
+    """Throughput and memory figures for one ingestion run."""
+
+    def __init__(self):
+        self.files = 0
+        self.sentences = 0
+        self.chunks = 0
+        self.failed_files = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "files": self.files,
+            "sentences": self.sentences,
+            "chunks": self.chunks,
+            "failed_files": list(self.failed_files),
+            "seconds": round(self.seconds, 3),
+            "chunks_per_sec": round(self.chunks / self.seconds, 1) if self.seconds > 0 else 0.0,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def _paragraph_chunks(text):
+    chunks = [p.strip() for p in text.split("\n\n") if p.strip()]
+    return chunks or [text.strip()]
+
+
+class IngestionPipeline:
+    """Chunk, embed and append files to ``user_index`` in cross-file batches.
+
+    Call ``add()`` for each file and ``finish()`` once at the end; files are
+    appended to the index in the order they were added.
+
+    Args:
+        user_index: The ``UserIndex`` being updated.
+        model: Sentence encoder used for semantic chunking.
+        embed_texts: Callable returning a (len(texts), dim) float32 matrix of
+            chunk embeddings.
+        sentence_batch_size: Sentences per encoder batch.
+        max_pending_sentences: Sentences buffered across files before they
+            are encoded and chunked. Larger files are processed alone.
+        chunk_batch_size: Chunks buffered before they are embedded and added
+            to the index in one call.
+        keep_sentence_embeddings: Store per-chunk sentence embeddings for
+            precomputed context compression.
+    """
+
+    def __init__(
+        self,
+        user_index,
+        model,
+        embed_texts,
+        sentence_batch_size=256,
+        max_pending_sentences=8192,
+        chunk_batch_size=512,
+        keep_sentence_embeddings=True,
+    ):
+        self.user_index = user_index
+        self.model = model
+        self.embed_texts = embed_texts
+        self.sentence_batch_size = max(1, int(sentence_batch_size))
+        self.max_pending_sentences = max(1, int(max_pending_sentences))
+        self.chunk_batch_size = max(1, int(chunk_batch_size))
+        self.keep_sentence_embeddings = keep_sentence_embeddings
+        self.stats = IngestStats()
+        # Files waiting for sentence encoding: (filename, file_info, text, sentences).
+        self._pending_files = []
+        self._pending_sentences = 0
+        # Chunked files waiting for chunk embedding: (filename, file_info, chunks, sentence_embeddings).
+        self._pending_chunks = []
+        self._pending_chunk_count = 0
+        # Files with chunks already in the index, and files that failed.
+        self._added = set()
+        self._failed = set()
+
+    def add(self, filename, file_info, text):
+        self.stats.files += 1
+        if not text or not text.strip():
+            # Extraction failures come back as empty text.
+            self._fail([filename])
+            return
+        sentences = _split_sentences(text)
+        self.stats.sentences += len(sentences)
+        if len(sentences) > self.max_pending_sentences:
+            self._flush_sentences()
+            self._chunk_large_file(filename, file_info, text, sentences)
+            return
+        self._pending_files.append((filename, file_info, text, sentences))
+        self._pending_sentences += len(sentences)
+        if self._pending_sentences >= self.max_pending_sentences:
+            self._flush_sentences()
+
+    def finish(self):
+        """Flush all buffers and return the run's ``IngestStats``."""
+        self._flush_sentences()
+        self._flush_chunks()
+        # Drop the parts of large files that were added before a later part failed.
+        partial = self._added & self._failed
+        if partial:
+            self.user_index.remove_files(partial)
+        self.stats.seconds = time.perf_counter() - self.stats.started
+        return self.stats
+
+    def _flush_sentences(self):
+        pending, self._pending_files, self._pending_sentences = self._pending_files, [], 0
+        if not pending:
+            return
+        # Documents with one or two sentences become a single chunk without encoding.
+        to_encode = [sentence for _, _, _, sentences in pending if len(sentences) > 2 for sentence in sentences]
+        vectors = None
+        if to_encode:
+            try:
+                encoded = np.array(
+                    self.model.encode(to_encode, batch_size=self.sentence_batch_size, show_progress_bar=False),
+                    dtype=np.float32,
+                )
+                vectors = normalize_rows(encoded.reshape(len(to_encode), -1))
+            except Exception:
+                logger.exception("Sentence encoding failed; falling back to paragraph chunks")
+
+        offset = 0
+        for filename, file_info, text, sentences in pending:
+            if len(sentences) <= 2:
+                joined = " ".join(sentences).strip()
+                self._queue_chunks(filename, file_info, [joined] if joined else [text.strip()], None)
+                continue
+            if vectors is None:
+                self._queue_chunks(filename, file_info, _paragraph_chunks(text), None)
+                continue
+            window = vectors[offset:offset + len(sentences)]
+            offset += len(sentences)
+            chunks, sentence_embeddings = self._chunk(sentences, [window])
+            self._queue_chunks(filename, file_info, chunks or [text.strip()], sentence_embeddings or None)
+
+    def _chunk(self, sentences, windows):
+        """``(chunks, sentence_embeddings)``; the latter is None unless kept for compression."""
+        if self.keep_sentence_embeddings:
+            return chunk_sentences(sentences, windows, return_embeddings=True)
+        return chunk_sentences(sentences, windows), None
+
+    def _chunk_large_file(self, filename, file_info, text, sentences):
+        try:
+            windows = _iter_normalized_windows(sentences, self.model, self.sentence_batch_size)
+            chunks, sentence_embeddings = self._chunk(sentences, windows)
+        except Exception:
+            logger.exception("Sentence encoding failed for %s; falling back to paragraph chunks", filename)
+            chunks, sentence_embeddings = _paragraph_chunks(text), None
+        self._queue_chunks(filename, file_info, chunks, sentence_embeddings)
+
+    def _queue_chunks(self, filename, file_info, chunks, sentence_embeddings):
+        if not chunks:
+            self._pending_chunks.append((filename, file_info, [], None))
+            return
+        # Large files are split so no flush embeds more than chunk_batch_size chunks.
+        start = 0
+        while start < len(chunks):
+            end = start + self.chunk_batch_size - self._pending_chunk_count
+            self._pending_chunks.append((
+                filename, file_info, chunks[start:end], sentence_embeddings[start:end] if sentence_embeddings else None,
+            ))
+            self._pending_chunk_count += len(chunks[start:end])
+            start = end
+            if self._pending_chunk_count >= self.chunk_batch_size:
+                self._flush_chunks()
+
+    def _fail(self, filenames):
+        for filename in filenames:
+            if filename not in self._failed:
+                self._failed.add(filename)
+                self.stats.failed_files.append(filename)
+
+    def _flush_chunks(self):
+        pending, self._pending_chunks, self._pending_chunk_count = self._pending_chunks, [], 0
+        if not pending:
+            return
+        texts = [chunk for _, _, chunks, _ in pending for chunk in chunks]
+        embeddings = None
+        if texts:
+            try:
+                embeddings = self.embed_texts(texts)
+            except Exception:
+                failed = list(dict.fromkeys(filename for filename, _, chunks, _ in pending if chunks))
+                logger.exception("Chunk embedding failed for %d files; they will be retried on the next ingest", len(failed))
+                # Leave them out of the manifest so the next incremental run picks them up.
+                self._fail(failed)
+
+        entries = []
+        offset = 0
+        for filename, file_info, chunks, sentence_embeddings in pending:
+            if filename in self._failed:
+                offset += len(chunks) if embeddings is not None else 0
+                continue
+            if not chunks:
+                entries.append((filename, [], None, file_info, None))
+                continue
+            self._added.add(filename)
+            entries.append((
+                filename, chunks, embeddings[offset:offset + len(chunks)], file_info, sentence_embeddings,
+            ))
+            offset += len(chunks)
+            self.stats.chunks += len(chunks)
+        self.user_index.add_files(entries)
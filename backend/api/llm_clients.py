@@ -0,0 +1,93 @@
+"""Reusable HTTP clients for the LLM providers.
+
+Creating an ``OpenAI`` or ``google.genai`` client (or a bare ``requests.post``)
+per call opens a new TCP + TLS connection to the provider on every chat
+request. ``ClientPool`` keeps one client per ``(provider, base_url, key
+fingerprint)`` so keep-alive connections are reused across requests. The pool
+is bounded (least recently used clients are dropped first) and clients idle
+for longer than ``idle_seconds`` are dropped as well.
+
+Dropped clients are not closed explicitly, since a response may still be
+streaming through them; their connections close once they are
+garbage-collected.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def key_fingerprint(api_key):
+    """Short digest identifying an API key without keeping it in the pool key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class ClientPool:
+    """Thread-safe, bounded LRU of provider clients with idle expiry."""
+
+    def __init__(self, max_clients=32, idle_seconds=300, clock=time.monotonic):
+        self.max_clients = max(1, int(max_clients))
+        self.idle_seconds = float(idle_seconds)
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (client, last_used)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, provider, base_url, api_key, factory):
+        """Return the pooled client for this provider/endpoint/key, creating it with ``factory()``."""
+        key = (provider, base_url, key_fingerprint(api_key))
+        now = self._clock()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        # Build outside the lock; if two threads race, the first stored client wins.
+        client = factory()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            self._entries[key] = (client, now)
+            while len(self._entries) > self.max_clients:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def _expire(self, now):
+        if self.idle_seconds <= 0:
+            return
+        # Entries are in last-used order, so the idle ones are at the front.
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used <= self.idle_seconds:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "clients": len(self._entries),
+                "max_clients": self.max_clients,
+                "idle_seconds": self.idle_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
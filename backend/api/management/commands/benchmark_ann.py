@@ -0,0 +1,98 @@
+"""Recall-vs-latency report for the approximate dense index tiers.
+
+Compares HNSW (over a range of efSearch values) and IVF-PQ (over a range of
+nprobe values) with exact flat search, on a user's stored chunk embeddings
+or on synthetic vectors.
+
+Usage::
+
+    python manage.py benchmark_ann --user alice
+    python manage.py benchmark_ann --synthetic 200000 --dim 384
+"""
+
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.retriever import build_index_from_embeddings, index_type_of
+from api.views import ensure_documents_loaded
+
+
+class Command(BaseCommand):
+    help = "Report recall@k and query latency of HNSW / IVF-PQ against exact flat search."
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument("--user", help="Username whose stored embeddings to use.")
+        source.add_argument("--synthetic", type=int, help="Number of random vectors to generate.")
+        parser.add_argument("--dim", type=int, default=384, help="Dimension of synthetic vectors.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--ef-search", default="16,32,64,128", help="Comma-separated HNSW efSearch values.")
+        parser.add_argument("--nprobe", default="4,8,16,32,64", help="Comma-separated IVF nprobe values.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.RandomState(options["seed"])
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            embeddings = ensure_documents_loaded(user).embeddings
+            if embeddings is None or len(embeddings) == 0:
+                raise CommandError("The user has no stored embeddings. Run ingestion first.")
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        else:
+            embeddings = rng.standard_normal((options["synthetic"], options["dim"])).astype(np.float32)
+
+        top_k = min(options["top_k"], len(embeddings))
+        # Queries are stored vectors plus noise, so they resemble real questions
+        # about indexed text without matching a chunk exactly.
+        rows = rng.choice(len(embeddings), min(options["queries"], len(embeddings)), replace=False)
+        queries = embeddings[rows] + rng.standard_normal((len(rows), embeddings.shape[1])).astype(np.float32) * 0.05
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+        self.stdout.write(f"{len(embeddings)} vectors, dim {embeddings.shape[1]}, {len(queries)} queries, k={top_k}")
+        flat = build_index_from_embeddings(embeddings, index_type="flat")
+        truth, flat_ms = self._run(flat, queries, top_k)
+        self._report("flat", "-", 1.0, flat_ms, 0.0)
+
+        for index_type, param, values in (
+            ("hnsw", "efSearch", options["ef_search"]),
+            ("ivfpq", "nprobe", options["nprobe"]),
+        ):
+            started = time.perf_counter()
+            index = build_index_from_embeddings(embeddings, index_type=index_type)
+            build_s = time.perf_counter() - started
+            if index_type_of(index) != index_type:
+                self.stdout.write(f"{index_type:>6}: corpus too small for this tier, skipped")
+                continue
+            for value in [int(v) for v in values.split(",") if v.strip()]:
+                if index_type == "hnsw":
+                    index.hnsw.efSearch = value
+                else:
+                    index.nprobe = value
+                found, latency_ms = self._run(index, queries, top_k)
+                recall = np.mean([len(set(f) & set(t)) / top_k for f, t in zip(found, truth)])
+                self._report(index_type, f"{param}={value}", recall, latency_ms, build_s)
+
+    def _run(self, index, queries, top_k):
+        timings = []
+        results = []
+        for query in queries:
+            started = time.perf_counter()
+            _, indices = index.search(query.reshape(1, -1), top_k)
+            timings.append((time.perf_counter() - started) * 1000)
+            results.append(indices[0].tolist())
+        return results, timings
+
+    def _report(self, index_type, param, recall, timings, build_s):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"{index_type:>6} {param:>14}: recall@k {recall:.3f}  "
+            f"mean {np.mean(timings):7.3f} ms  p95 {p95:7.3f} ms  build {build_s:6.1f} s"
+        )
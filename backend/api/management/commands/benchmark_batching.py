@@ -0,0 +1,76 @@
+"""Compare concurrent query encoding and reranking with and without micro-batching.
+
+Usage::
+
+    python manage.py benchmark_batching --concurrency 24 --requests 480
+"""
+
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.batching import BatchedEmbeddingModel, BatchedReranker
+
+
+def _unwrap(model, wrapper, attr):
+    return getattr(model, attr) if isinstance(model, wrapper) else model
+
+
+class Command(BaseCommand):
+    help = "Benchmark query encode + rerank throughput under concurrent threads, batched vs unbatched."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=24)
+        parser.add_argument("--requests", type=int, default=240)
+        parser.add_argument("--pairs", type=int, default=10, help="Rerank pairs per request.")
+        parser.add_argument("--wait-ms", type=float, default=2.0)
+        parser.add_argument("--max-batch-size", type=int, default=64)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        from api.retriever import get_embedding_model, get_reranker
+
+        model = _unwrap(get_embedding_model(), BatchedEmbeddingModel, "model")
+        reranker = _unwrap(get_reranker(), BatchedReranker, "reranker")
+        rng = random.Random(options["seed"])
+        words = "retrieval index chunk answer model vector query document sentence context".split()
+        workload = [
+            (
+                " ".join(rng.choices(words, k=8)),
+                [" ".join(rng.choices(words, k=60)) for _ in range(options["pairs"])],
+            )
+            for _ in range(options["requests"])
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requests, {options['concurrency']} threads, {options['pairs']} pairs each"
+        )
+        self._run("unbatched", model, reranker, workload, options["concurrency"])
+        batched_model = BatchedEmbeddingModel(model, options["max_batch_size"], options["wait_ms"])
+        batched_reranker = BatchedReranker(reranker, options["max_batch_size"], options["wait_ms"])
+        self._run("batched", batched_model, batched_reranker, workload, options["concurrency"])
+        self.stdout.write(f"encode batches: {batched_model.batcher.stats()}")
+        self.stdout.write(f"rerank batches: {batched_reranker.batcher.stats()}")
+
+    def _run(self, label, model, reranker, workload, concurrency):
+        def one(item):
+            query, chunks = item
+            started = time.perf_counter()
+            model.encode([query])
+            reranker.predict([[query, chunk] for chunk in chunks])
+            return (time.perf_counter() - started) * 1000
+
+        # Warm up so model loading is not measured.
+        one(workload[0])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = sorted(pool.map(one, workload))
+        elapsed = time.perf_counter() - started
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label:>10}: {len(workload) / elapsed:7.1f} req/s  "
+            f"p50 {statistics.median(latencies):7.1f} ms  p95 {p95:7.1f} ms"
+        )
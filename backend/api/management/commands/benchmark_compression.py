@@ -0,0 +1,90 @@
+"""Compare context-compression latency with and without stored sentence vectors.
+
+Usage::
+
+    python manage.py benchmark_compression --user alice --queries 50
+"""
+
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.batching import BatchedEmbeddingModel
+from api.compressor import compress_chunks
+from api.embedding_cache import CachedEmbeddingModel
+from api.retriever import get_embedding_model
+from api.views import ensure_documents_loaded
+
+
+class _CountingModel:
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        return self.model.encode(texts, **kwargs)
+
+
+class Command(BaseCommand):
+    help = "Benchmark compress_chunks in 'encode' vs 'precomputed' mode on a user's index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username whose index to benchmark.")
+        parser.add_argument("--queries", type=int, default=20)
+        parser.add_argument("--top-k", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--use-cache",
+            action="store_true",
+            help="Go through the embedding cache for the 'encode' path (default: raw encoder).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+        user_index = ensure_documents_loaded(user)
+        if user_index.total_chunks == 0:
+            raise CommandError("The user has no indexed chunks. Run ingestion first.")
+
+        model = get_embedding_model()
+        if isinstance(model, BatchedEmbeddingModel):
+            model = model.model
+        if isinstance(model, CachedEmbeddingModel) and not options["use_cache"]:
+            model = model.model
+        rng = random.Random(options["seed"])
+        top_k = min(options["top_k"], user_index.total_chunks)
+        workload = []
+        for _ in range(options["queries"]):
+            chunks = rng.sample(user_index.docs, top_k)
+            workload.append((chunks[0].split(". ")[0], chunks))
+        # Requests reuse the query vector dense retrieval computed, so encode
+        # the queries up front, outside the timed section.
+        query_vectors = model.encode([query for query, _ in workload], show_progress_bar=False)
+
+        stored = sum(1 for vectors in user_index.sentence_embeddings if vectors is not None)
+        self.stdout.write(
+            f"{user_index.total_chunks} chunks, {stored} with stored sentence vectors; "
+            f"{len(workload)} queries x top_k={top_k}"
+        )
+        for mode in ("encode", "precomputed"):
+            counting = _CountingModel(model)
+            timings = []
+            for (query, chunks), query_vector in zip(workload, query_vectors):
+                sentence_embeddings = user_index.sentence_embeddings_for(chunks) if mode == "precomputed" else None
+                started = time.perf_counter()
+                compress_chunks(
+                    query, chunks, counting, sentence_embeddings=sentence_embeddings, query_vector=query_vector,
+                )
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{mode:>12}: mean {statistics.mean(timings):8.2f} ms  "
+                f"p95 {p95:8.2f} ms  encoder calls/query {counting.calls / len(workload):.2f}"
+            )
@@ -0,0 +1,103 @@
+"""Measure the import cost of the API modules with ``python -X importtime``.
+
+Usage::
+
+    python manage.py benchmark_imports
+    python manage.py benchmark_imports --modules api.auth_views --top 20
+    python manage.py benchmark_imports --check   # fail if a heavy stack is imported
+
+Each module is imported in a fresh interpreter after ``django.setup()``, so
+the numbers are what a cold worker (or ``manage.py migrate``, whose system
+checks load the URLconf) pays on top of Django itself.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Libraries that must only be imported by the code paths that use them.
+HEAVY_MODULES = (
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "faiss",
+    "openai",
+    "google.genai",
+    "google.generativeai",
+    "bs4",
+)
+
+_MARKER = "-- benchmark_imports: django ready --"
+
+_SCRIPT = """
+import json, sys
+import django
+django.setup()
+print({marker!r}, file=sys.stderr, flush=True)
+import {module}
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)))
+"""
+
+
+def parse_importtime(stderr):
+    """``[(name, self_us, cumulative_us, depth)]`` for the imports after the marker."""
+    rows = []
+    lines = stderr.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    for line in lines:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module):
+    """Import ``module`` in a fresh interpreter; return ``(rows, heavy_modules_loaded)``."""
+    script = _SCRIPT.format(marker=_MARKER, module=module, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return parse_importtime(result.stderr), heavy
+
+
+class Command(BaseCommand):
+    help = "Report the import time of the API modules and whether they pull in heavy ML/LLM libraries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", nargs="+", default=["api.auth_views", "api.views", "api.urls"])
+        parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per module.")
+        parser.add_argument("--check", action="store_true", help="Exit with an error if a heavy library is imported.")
+
+    def handle(self, *args, **options):
+        offenders = {}
+        for module in options["modules"]:
+            rows, heavy = measure(module)
+            # Top-level rows are the imports triggered directly by this module;
+            # their cumulative times add up to its total cost.
+            total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+            self.stdout.write(f"{module}: {total_ms:.1f} ms beyond django.setup(), {len(rows)} modules")
+            for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: -row[2])[:options["top"]]:
+                self.stdout.write(f"  {cumulative_us / 1000:9.1f} ms cumulative  {self_us / 1000:8.1f} ms self  {name}")
+            self.stdout.write(f"  heavy libraries loaded: {', '.join(heavy) if heavy else 'none'}")
+            if heavy:
+                offenders[module] = heavy
+
+        if options["check"] and offenders:
+            details = "; ".join(f"{module} imports {', '.join(heavy)}" for module, heavy in offenders.items())
+            raise CommandError(f"Heavy libraries imported at module load: {details}")
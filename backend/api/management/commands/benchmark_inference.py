@@ -0,0 +1,128 @@
+"""Compare inference backends (PyTorch, ONNX, ONNX int8) on latency, throughput and quality.
+
+Usage::
+
+    python manage.py benchmark_inference --backends torch,onnx,onnx-int8 --user alice
+
+Quality is measured against the first backend listed: mean cosine between
+chunk embeddings, recall@k of dense search and overlap of the reranked top k.
+"""
+
+import random
+import statistics
+import time
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.chunker import normalize_rows
+from api.retriever import load_embedding_model, load_reranker
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark encoder and reranker backends selectable with RAG_INFERENCE_BACKEND."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+        parser.add_argument("--user", help="Use this user's chunks as the corpus (default: synthetic text).")
+        parser.add_argument("--corpus-size", type=int, default=500)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        corpus = self._corpus(options, rng)
+        queries = [" ".join(rng.choice(corpus).split()[:8]) for _ in range(options["queries"])]
+        top_k = min(options["top_k"], len(corpus))
+        backends = [b.strip() for b in options["backends"].split(",") if b.strip()]
+        self.stdout.write(f"{len(corpus)} chunks, {len(queries)} queries, k={top_k}")
+
+        reference = None
+        for backend in backends:
+            try:
+                started = time.perf_counter()
+                model = load_embedding_model(backend)
+                reranker = load_reranker(backend)
+                load_s = time.perf_counter() - started
+            except ImportError as exc:
+                self.stdout.write(f"{backend:>10}: skipped ({exc})")
+                continue
+            result = self._measure(model, reranker, corpus, queries, top_k, options["batch_size"])
+            quality = self._quality(reference, result, top_k) if reference else "reference"
+            if reference is None:
+                reference = result
+            self.stdout.write(
+                f"{backend:>10}: load {load_s:5.1f} s  "
+                f"query p50 {statistics.median(result['query_ms']):6.2f} ms p95 {_percentile(result['query_ms'], 0.95):6.2f} ms  "
+                f"encode {result['chunks_per_sec']:7.1f} chunks/s  "
+                f"rerank p50 {statistics.median(result['rerank_ms']):6.2f} ms  {quality}"
+            )
+
+    def _corpus(self, options, rng):
+        if options["user"]:
+            from api.views import ensure_documents_loaded
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            docs = ensure_documents_loaded(user).docs
+            if not docs:
+                raise CommandError("The user has no indexed chunks. Run ingestion first.")
+            return rng.sample(docs, min(options["corpus_size"], len(docs)))
+        words = (
+            "retrieval index chunk answer model vector query document sentence context "
+            "search rank score embedding latency memory cache batch token paragraph"
+        ).split()
+        return [" ".join(rng.choices(words, k=rng.randint(20, 80))) for _ in range(options["corpus_size"])]
+
+    def _measure(self, model, reranker, corpus, queries, top_k, batch_size):
+        model.encode(queries[:1])
+        reranker.predict([[queries[0], corpus[0]]])
+
+        started = time.perf_counter()
+        chunk_vectors = normalize_rows(np.asarray(
+            model.encode(corpus, batch_size=batch_size, show_progress_bar=False), dtype=np.float32,
+        ))
+        chunks_per_sec = len(corpus) / (time.perf_counter() - started)
+
+        query_ms, rerank_ms, neighbors, reranked = [], [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            query_vec = normalize_rows(np.asarray(model.encode([query]), dtype=np.float32))[0]
+            query_ms.append((time.perf_counter() - started) * 1000)
+            hits = np.argsort(-(chunk_vectors @ query_vec))[:top_k]
+            neighbors.append(hits.tolist())
+
+            started = time.perf_counter()
+            scores = np.asarray(reranker.predict([[query, corpus[i]] for i in hits]), dtype=np.float32)
+            rerank_ms.append((time.perf_counter() - started) * 1000)
+            reranked.append(hits[np.argsort(-scores)].tolist())
+        return {
+            "chunk_vectors": chunk_vectors,
+            "chunks_per_sec": chunks_per_sec,
+            "query_ms": query_ms,
+            "rerank_ms": rerank_ms,
+            "neighbors": neighbors,
+            "reranked": reranked,
+        }
+
+    def _quality(self, reference, result, top_k):
+        cosine = float(np.mean(np.sum(reference["chunk_vectors"] * result["chunk_vectors"], axis=1)))
+        recall = np.mean([
+            len(set(found) & set(truth)) / top_k
+            for found, truth in zip(result["neighbors"], reference["neighbors"])
+        ])
+        # End to end: overlap of the final top 3 after dense search and rerank.
+        rerank_overlap = np.mean([
+            len(set(found[:3]) & set(truth[:3])) / min(3, top_k)
+            for found, truth in zip(result["reranked"], reference["reranked"])
+        ])
+        return f"cosine {cosine:.4f}  recall@k {recall:.3f}  rerank top-3 overlap {rerank_overlap:.3f}"
@@ -0,0 +1,41 @@
+"""Serve the embedding and rerank models to other processes on this host.
+
+Usage::
+
+    python manage.py serve_models --host 127.0.0.1 --port 8765
+
+Point workers at it with ``RAG_INFERENCE_URL=http://127.0.0.1:8765``.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.batching import BatchedEmbeddingModel, BatchedReranker
+from api.inference import make_server
+from api.retriever import load_embedding_model, load_reranker
+
+
+class Command(BaseCommand):
+    help = "Host the sentence encoder and cross-encoder behind a local HTTP inference server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        max_batch_size = settings.RAG_INFERENCE_MAX_BATCH_SIZE
+        wait_ms = settings.RAG_INFERENCE_BATCH_WAIT_MS
+        embedding_model = load_embedding_model()
+        reranker = load_reranker()
+        if wait_ms > 0:
+            embedding_model = BatchedEmbeddingModel(embedding_model, max_batch_size, wait_ms)
+            reranker = BatchedReranker(reranker, max_batch_size, wait_ms)
+
+        server = make_server(options["host"], options["port"], embedding_model, reranker)
+        self.stdout.write(f"Serving models on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
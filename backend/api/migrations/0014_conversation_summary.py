@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_recent_turns(apps, schema_editor):
+    # Existing conversations start with their last turns verbatim; older
+    # messages are folded into the summary after their next answer.
+    Conversation = apps.get_model('api', 'Conversation')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+    max_turns = getattr(settings, 'RAG_PROMPT_HISTORY_MAX_TURNS', 6)
+    if max_turns <= 0:
+        return
+    for conversation in Conversation.objects.iterator():
+        recent = ChatMessage.objects.filter(conversation=conversation).order_by('-id')[:max_turns]
+        turns = [{'question': m.question, 'answer': m.answer} for m in reversed(recent)]
+        if turns:
+            Conversation.objects.filter(id=conversation.id).update(recent_turns=turns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_conversation_pinned'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='recent_turns',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='summarized_through',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(seed_recent_turns, migrations.RunPython.noop),
+    ]
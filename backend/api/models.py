@@ -7,6 +7,11 @@ class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=255, default='New Conversation')
     pinned = models.BooleanField(default=False)
+    # Rolling history for prompts: the last few turns verbatim plus a summary
+    # of every message up to and including ``summarized_through``.
+    summary = models.TextField(blank=True, default='')
+    recent_turns = models.JSONField(default=list, blank=True)
+    summarized_through = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,74 @@
+"""ONNX Runtime backend for the sentence encoder and cross-encoder.
+
+With ``RAG_INFERENCE_BACKEND`` set to ``onnx`` or ``onnx-int8`` the models are
+exported once to ONNX (optionally with dynamic int8 quantization for the
+CPU's instruction set) under ``RAG_ONNX_MODEL_DIR`` and then loaded through
+sentence-transformers' ``backend="onnx"``, which runs them under onnxruntime
+instead of PyTorch. Requires ``pip install "sentence-transformers[onnx]"``.
+"""
+
+import logging
+import os
+import shutil
+import uuid
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def onnx_file_name(quantize, quantization_config):
+    """Path of the ONNX graph inside an exported model directory."""
+    if quantize:
+        return f"onnx/model_qint8_{quantization_config}.onnx"
+    return "onnx/model.onnx"
+
+
+def export_dir_for(export_root, model_name):
+    return os.path.join(export_root, model_name.replace("/", "--"))
+
+
+def _export(model_class, model_name, target_dir, quantize, quantization_config):
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    # Export into a scratch directory and rename it into place, so concurrent
+    # workers never load a half-written model; the first rename wins.
+    tmp_dir = f"{target_dir}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        model = model_class(model_name, backend="onnx")
+        model.save_pretrained(tmp_dir)
+        if quantize:
+            export_dynamic_quantized_onnx_model(model, quantization_config, tmp_dir)
+        if os.path.exists(target_dir):
+            # An earlier export lacks this variant (or another process just
+            # finished one): add the missing ONNX graphs next to it.
+            os.makedirs(os.path.join(target_dir, "onnx"), exist_ok=True)
+            for file_name in os.listdir(os.path.join(tmp_dir, "onnx")):
+                destination = os.path.join(target_dir, "onnx", file_name)
+                if not os.path.exists(destination):
+                    os.replace(os.path.join(tmp_dir, "onnx", file_name), destination)
+        else:
+            os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+            try:
+                os.rename(tmp_dir, target_dir)
+            except OSError:
+                if not os.path.exists(target_dir):
+                    raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_onnx_model(model_class, model_name, backend, export_root, quantization_config="avx2"):
+    """Load ``model_name`` as a ``model_class`` (SentenceTransformer or CrossEncoder) on onnxruntime.
+
+    The model is exported (and quantized for ``onnx-int8``) on first use.
+    """
+    if backend not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown ONNX backend {backend!r}; expected one of {BACKENDS}.")
+    quantize = backend == "onnx-int8"
+    file_name = onnx_file_name(quantize, quantization_config)
+    target_dir = export_dir_for(export_root, model_name)
+    if not os.path.exists(os.path.join(target_dir, file_name)):
+        logger.info("Exporting %s to ONNX (%s) in %s", model_name, backend, target_dir)
+        _export(model_class, model_name, target_dir, quantize, quantization_config)
+    return model_class(target_dir, backend="onnx", model_kwargs={"file_name": file_name})
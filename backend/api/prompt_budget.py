@@ -0,0 +1,130 @@
+"""Token estimates and budgets for prompt assembly.
+
+Provider tokenizers differ and most are not available offline, so prompts are
+measured with a local estimate that tracks BPE tokenizers closely enough for
+budgeting: one token per punctuation mark and one per (up to) four characters
+of each word. ``_build_prompt`` in api/generator.py uses these helpers to keep
+the retrieved context and the conversation history within a per-model budget.
+"""
+
+import re
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _piece_tokens(piece):
+    if piece[0].isalnum() or piece[0] == "_":
+        return (len(piece) + 3) // 4
+    return 1
+
+
+def estimate_tokens(text):
+    """Approximate number of tokens in ``text``."""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens, marker=" ..."):
+    """Cut ``text`` after roughly ``max_tokens`` tokens, appending ``marker`` if shortened."""
+    if max_tokens <= 0:
+        return ""
+    max_tokens -= estimate_tokens(marker)
+    used = 0
+    end = 0
+    for match in _PIECE_RE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens:
+            return text[:end].rstrip() + marker
+        end = match.end()
+    return text
+
+
+def model_token_budget(model):
+    """Prompt token budget for ``model``: its override in settings, else the default."""
+    from django.conf import settings
+
+    overrides = getattr(settings, "RAG_PROMPT_MODEL_TOKEN_BUDGETS", {})
+    if model in overrides:
+        return overrides[model]
+    return getattr(settings, "RAG_PROMPT_TOKEN_BUDGET", 6000)
+
+
+def history_share():
+    """Largest share of the prompt budget the conversation history may claim."""
+    from django.conf import settings
+
+    return getattr(settings, "RAG_PROMPT_HISTORY_SHARE", 0.25)
+
+
+def format_turn(turn):
+    return f"User: {turn['question']}\nAssistant: {turn['answer']}\n\n"
+
+
+def fit_chunks(chunks, max_tokens, min_partial_tokens=32):
+    """Leading ``chunks`` (as cited ``[n] chunk``) that fit in ``max_tokens``.
+
+    The first chunk that does not fit is truncated when at least
+    ``min_partial_tokens`` remain; later chunks are dropped.
+    """
+    kept = []
+    used = 0
+    for position, chunk in enumerate(chunks, start=1):
+        overhead = estimate_tokens(f"[{position}] ") + 1
+        cost = overhead + estimate_tokens(chunk)
+        if used + cost <= max_tokens:
+            kept.append(chunk)
+            used += cost
+            continue
+        room = max_tokens - used - overhead
+        if room >= min_partial_tokens:
+            kept.append(truncate_to_tokens(chunk, room))
+        break
+    return kept
+
+
+def format_summary(summary):
+    return f"Summary of earlier conversation: {summary}\n\n" if summary else ""
+
+
+def fit_history(turns, max_tokens, question_tokens=24, summary=""):
+    """Render the conversation ``summary`` and the most recent ``turns`` that fit in ``max_tokens``.
+
+    The summary comes first and may take up to half of ``max_tokens``. Turns
+    are kept verbatim from the newest back; if even the newest does not fit,
+    its answer is truncated. Older turns are reduced to their questions on one
+    "Earlier questions" line while room remains. Returns
+    ``(text, verbatim_turns, summarized_turns)``.
+    """
+    summary_text = ""
+    if summary:
+        summary_text = format_summary(truncate_to_tokens(summary, max_tokens // 2 - estimate_tokens(format_summary(" "))))
+    max_tokens -= estimate_tokens(summary_text)
+
+    kept = []
+    used = 0
+    for turn in reversed(turns):
+        text = format_turn(turn)
+        cost = estimate_tokens(text)
+        if used + cost > max_tokens:
+            if not kept:
+                room = max_tokens - estimate_tokens(format_turn({"question": turn["question"], "answer": ""}))
+                if room >= question_tokens:
+                    text = format_turn({"question": turn["question"], "answer": truncate_to_tokens(turn["answer"], room)})
+                    kept.append(text)
+                    used += estimate_tokens(text)
+            break
+        kept.append(text)
+        used += cost
+
+    questions = []
+    used += estimate_tokens("Earlier questions: \n\n")
+    for turn in reversed(turns[:len(turns) - len(kept)]):
+        question = truncate_to_tokens(" ".join(turn["question"].split()), question_tokens)
+        cost = estimate_tokens(question) + 1
+        if used + cost > max_tokens:
+            break
+        questions.append(question)
+        used += cost
+    earlier = f"Earlier questions: {'; '.join(reversed(questions))}\n\n" if questions else ""
+    return summary_text + earlier + "".join(reversed(kept)), len(kept), len(questions)
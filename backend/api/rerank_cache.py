@@ -0,0 +1,79 @@
+"""In-memory cache of cross-encoder scores.
+
+Scores are keyed by ``(scope, normalized query, sha256(chunk))`` where the
+scope is the requesting user, so a repeated or regenerated question, or the
+next page of a reranked search, skips ``CrossEncoder.predict`` for every
+pair it has already scored. A chunk's score depends only on its text and the
+query, so entries stay valid across incremental ingests; a user's entries are
+dropped when their index is rebuilt. Entries are kept in LRU order and the
+oldest are evicted once the cache exceeds ``max_entries``.
+"""
+
+import threading
+from collections import OrderedDict
+
+from api.embedding_cache import text_key
+
+
+def normalize_query(query):
+    # The reranker is uncased and ignores runs of whitespace.
+    return " ".join(query.lower().split())
+
+
+class RerankCache:
+    """Thread-safe LRU of rerank scores."""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _keys(self, scope, query, chunks):
+        query = normalize_query(query)
+        return [(scope, query, text_key(chunk)) for chunk in chunks]
+
+    def get_many(self, scope, query, chunks):
+        """Return ``{position: score}`` for the chunks whose score is cached."""
+        found = {}
+        with self._lock:
+            for position, key in enumerate(self._keys(scope, query, chunks)):
+                score = self._entries.get(key)
+                if score is not None:
+                    self._entries.move_to_end(key)
+                    found[position] = score
+            self.hits += len(found)
+            self.misses += len(chunks) - len(found)
+        return found
+
+    def put_many(self, scope, query, chunks, scores):
+        with self._lock:
+            for key, score in zip(self._keys(scope, query, chunks), scores):
+                self._entries[key] = float(score)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, scope):
+        """Drop every score cached for ``scope``."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == scope]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
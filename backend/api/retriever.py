@@ -1,58 +1,467 @@
-from sentence_transformers import SentenceTransformer, CrossEncoder
-import faiss
+import threading
+
 import numpy as np
-from rank_bm25 import BM25Okapi
+
+from api.bm25 import BM25Index
+from api.chunker import normalize_rows
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
 _model = None
+_query_model = None
 _reranker = None
+_embedding_cache = None
+_rerank_cache = None
+# Threaded workers may ask for a model concurrently; load each only once.
+_model_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Shared on-disk embedding cache, or None when disabled by settings."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        from django.conf import settings
+        from api.embedding_cache import EmbeddingCache
+
+        path = getattr(settings, "RAG_EMBEDDING_CACHE_PATH", "")
+        if not path:
+            return None
+        _embedding_cache = EmbeddingCache(
+            path, max_entries=getattr(settings, "RAG_EMBEDDING_CACHE_MAX_ENTRIES", 200000)
+        )
+    return _embedding_cache
+
+
+def get_rerank_cache():
+    """Process-wide rerank score cache, or None when disabled by settings."""
+    global _rerank_cache
+    if _rerank_cache is None:
+        from django.conf import settings
+        from api.rerank_cache import RerankCache
+
+        max_entries = getattr(settings, "RAG_RERANK_CACHE_MAX_ENTRIES", 50000)
+        if max_entries <= 0:
+            return None
+        _rerank_cache = RerankCache(max_entries=max_entries)
+    return _rerank_cache
+
+
+def _batching_settings():
+    """(max_batch_size, max_wait_ms) for micro-batching, or None when disabled."""
+    from django.conf import settings
+
+    wait_ms = getattr(settings, "RAG_INFERENCE_BATCH_WAIT_MS", 2.0)
+    if wait_ms <= 0:
+        return None
+    return getattr(settings, "RAG_INFERENCE_MAX_BATCH_SIZE", 64), wait_ms
+
+
+def inference_batching_stats():
+    """Micro-batching stats of the models loaded so far (without loading any)."""
+    models = {"embedding": _model, "rerank": _reranker}
+    if _query_model is not _model:
+        models["query_embedding"] = _query_model
+    return {name: model.batcher.stats() for name, model in models.items() if hasattr(model, "batcher")}
+
+
+def inference_backend():
+    """``torch``, ``onnx`` or ``onnx-int8`` (``RAG_INFERENCE_BACKEND``)."""
+    return str(_setting("RAG_INFERENCE_BACKEND", "torch")).lower()
+
+
+def _load_model(model_class, model_name, backend):
+    backend = backend or inference_backend()
+    if backend == "torch":
+        return model_class(model_name)
+    from api.onnx_backend import load_onnx_model
+    return load_onnx_model(
+        model_class, model_name, backend,
+        export_root=_setting("RAG_ONNX_MODEL_DIR", "onnx-models"),
+        quantization_config=_setting("RAG_ONNX_QUANTIZATION", "avx2"),
+    )
+
+
+def load_embedding_model(backend=None):
+    """Load the sentence encoder in this process (ignores ``RAG_INFERENCE_URL``)."""
+    from sentence_transformers import SentenceTransformer
+    return _load_model(SentenceTransformer, EMBEDDING_MODEL_NAME, backend)
+
+
+def load_reranker(backend=None):
+    """Load the cross-encoder in this process (ignores ``RAG_INFERENCE_URL``)."""
+    from sentence_transformers import CrossEncoder
+    return _load_model(CrossEncoder, RERANKER_MODEL_NAME, backend)
+
+
+def embedding_cache_model_name(backend=None):
+    # Quantized encoders produce slightly different vectors; keep them apart in the cache.
+    backend = backend or inference_backend()
+    return EMBEDDING_MODEL_NAME if backend == "torch" else f"{EMBEDDING_MODEL_NAME}@{backend}"
+
+
+def _remote_client(client_class, loader):
+    """Client for the shared inference server, or None when not configured."""
+    url = _setting("RAG_INFERENCE_URL", "")
+    if not url:
+        return None
+    fallback = loader if _setting("RAG_INFERENCE_FALLBACK_LOCAL", True) else None
+    return client_class(url, timeout=_setting("RAG_INFERENCE_TIMEOUT", 30), fallback=fallback)
 
 
 def get_embedding_model():
-    global _model
+    global _model, _query_model
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        with _model_lock:
+            if _model is None:
+                from api.batching import BatchedEmbeddingModel
+                from api.embedding_cache import CachedEmbeddingModel
+                from api.inference import RemoteEmbeddingModel
+
+                # The inference server batches requests itself.
+                model = _remote_client(RemoteEmbeddingModel, load_embedding_model)
+                batching = _batching_settings() if model is None else None
+                if model is None:
+                    model = load_embedding_model()
+                cache = get_embedding_cache()
+                query_model = None
+                if cache is not None:
+                    query_model = BatchedEmbeddingModel(model, *batching) if batching else model
+                    model = CachedEmbeddingModel(model, cache, embedding_cache_model_name())
+                model = BatchedEmbeddingModel(model, *batching) if batching else model
+                _query_model = query_model or model
+                _model = model
     return _model
 
 
+def get_query_embedding_model():
+    """Encoder for request-time queries.
+
+    It uses the same model and batching as ``get_embedding_model()`` but skips
+    the embedding cache. Questions are one-off texts, and writing each of them
+    to the shared SQLite file would put a write lock on the query path.
+    """
+    get_embedding_model()
+    return _query_model
+
+
 def get_reranker():
     global _reranker
     if _reranker is None:
-        _reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+        with _model_lock:
+            if _reranker is None:
+                from api.batching import BatchedReranker
+                from api.inference import RemoteReranker
+
+                reranker = _remote_client(RemoteReranker, load_reranker)
+                batching = _batching_settings() if reranker is None else None
+                if reranker is None:
+                    reranker = load_reranker()
+                _reranker = BatchedReranker(reranker, *batching) if batching else reranker
     return _reranker
 
-def build_index(docs):
-    if not docs:
-        return None, None
+def embed_query(query):
+    """Encode one request-time query as an L2-normalized 1-D float32 vector (uncached)."""
+    vector = np.asarray(get_query_embedding_model().encode([query]), dtype=np.float32).reshape(1, -1)
+    return normalize_rows(vector)[0]
+
+
+def embed_texts(texts):
+    """Encode texts into a 2-D float32 matrix of L2-normalized rows, one per text."""
     model = get_embedding_model()
-    embeddings = model.encode(docs)
+    embeddings = model.encode(texts)
     embeddings = np.array(embeddings).astype("float32")
     if len(embeddings.shape) == 1:
         embeddings = embeddings.reshape(1,-1)
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
+    return normalize_rows(embeddings)
+
+
+def build_index(docs):
+    if not docs:
+        return None, None
+    embeddings = embed_texts(docs)
+    return build_index_from_embeddings(embeddings), embeddings
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def choose_index_type(n_vectors):
+    """Index tier for a corpus of ``n_vectors`` chunks under ``RAG_ANN_INDEX_TYPE``.
+
+    ``auto`` keeps exact search (flat) below ``RAG_ANN_MIN_VECTORS``, uses HNSW
+    above it and IVF-PQ from ``RAG_ANN_IVFPQ_MIN_VECTORS`` on, where keeping
+    a graph over full vectors gets too expensive in memory.
+    """
+    index_type = str(_setting("RAG_ANN_INDEX_TYPE", "auto")).lower()
+    if index_type != "auto":
+        return index_type
+    if n_vectors >= _setting("RAG_ANN_IVFPQ_MIN_VECTORS", 1000000):
+        return "ivfpq"
+    if n_vectors >= _setting("RAG_ANN_MIN_VECTORS", 50000):
+        return "hnsw"
+    return "flat"
+
+
+def _pq_subquantizers(dim, preferred):
+    # PQ needs the sub-quantizer count to divide the dimension.
+    for m in range(min(preferred, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _ivf_nlist(n_vectors):
+    # ~4*sqrt(n) lists, but never fewer than 39 training points per list.
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _training_sample(embeddings, n_samples, seed=0):
+    if len(embeddings) <= n_samples:
+        return embeddings
+    rows = np.random.RandomState(seed).choice(len(embeddings), n_samples, replace=False)
+    rows.sort()
+    return np.ascontiguousarray(embeddings[rows], dtype=np.float32)
+
+
+def _index_vectors(embeddings):
+    # All tiers use inner product over unit vectors, so scores are cosine similarities.
+    return normalize_rows(np.asarray(embeddings, dtype=np.float32))
+
+
+def build_index_from_embeddings(embeddings, index_type=None):
+    """Build a FAISS index over precomputed chunk embeddings (no encoder call).
+
+    Row ``i`` of ``embeddings`` always gets id ``i``. ``index_type`` overrides
+    the automatic choice (``flat``, ``hnsw`` or ``ivfpq``). Vectors are
+    L2-normalized and indexed by inner product, so search scores are cosine
+    similarities.
+    """
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    import faiss
+
+    embeddings = _index_vectors(embeddings)
+    n_vectors, dim = embeddings.shape
+    index_type = index_type or choose_index_type(n_vectors)
+
+    if index_type == "ivfpq":
+        nlist = _ivf_nlist(n_vectors)
+        # 8-bit PQ codebooks have 256 centroids and faiss wants 39 training
+        # points per centroid; smaller corpora use HNSW instead.
+        if n_vectors >= 256 * 39:
+            quantizer = faiss.IndexFlatIP(dim)
+            index = faiss.IndexIVFPQ(
+                quantizer, dim, nlist, _pq_subquantizers(dim, _setting("RAG_ANN_PQ_M", 48)), 8,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+            index.train(_training_sample(embeddings, _setting("RAG_ANN_TRAIN_SAMPLE", 100000)))
+            index.add(embeddings)
+            return index
+        index_type = "hnsw"
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, _setting("RAG_ANN_HNSW_M", 32), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = _setting("RAG_ANN_HNSW_EF_CONSTRUCTION", 80)
+        index.add(embeddings)
+        return index
+
+    index = faiss.IndexFlatIP(dim)
     index.add(embeddings)
-    return index, embeddings
+    return index
+
+
+class TombstonedIndex:
+    """HNSW graph whose deleted rows are masked out instead of rebuilt.
+
+    HNSW graphs cannot drop nodes, so removing a file used to rebuild the
+    whole graph. Deleted rows now stay in the graph and are skipped during
+    search through an ``IDSelector``; ``live_rows[i]`` is the graph row of
+    chunk ``i`` and search results are mapped back to chunk positions.
+    ``index_after_remove`` rebuilds the graph once more than
+    ``RAG_ANN_HNSW_MAX_DELETED`` of it is dead.
+
+    Implements the part of the faiss index interface the app uses:
+    ``ntotal``, ``d``, ``hnsw``, ``add`` and ``search``.
+    """
+
+    def __init__(self, index, live_rows=None):
+        self.index = index
+        if live_rows is None:
+            live_rows = np.arange(index.ntotal, dtype=np.int64)
+        self._set_live_rows(live_rows)
+
+    def _set_live_rows(self, live_rows):
+        import faiss
+
+        self.live_rows = np.asarray(live_rows, dtype=np.int64)
+        deleted = np.setdiff1d(np.arange(self.index.ntotal, dtype=np.int64), self.live_rows)
+        # Keep the batch selector referenced; IDSelectorNot does not own it.
+        self._deleted_selector = faiss.IDSelectorBatch(deleted)
+        self._selector = faiss.IDSelectorNot(self._deleted_selector)
+
+    @property
+    def ntotal(self):
+        return len(self.live_rows)
+
+    @property
+    def d(self):
+        return self.index.d
+
+    @property
+    def hnsw(self):
+        return self.index.hnsw
+
+    @property
+    def deleted_fraction(self):
+        total = self.index.ntotal
+        return (total - len(self.live_rows)) / total if total else 0.0
+
+    def add(self, vectors):
+        start = self.index.ntotal
+        self.index.add(vectors)
+        new_rows = np.arange(start, self.index.ntotal, dtype=np.int64)
+        # Appended rows are live, so the deleted set (and selector) is unchanged.
+        self.live_rows = np.concatenate([self.live_rows, new_rows])
+
+    def remove(self, positions):
+        self._set_live_rows(np.delete(self.live_rows, np.asarray(positions, dtype=np.int64)))
+
+    def search(self, query, k):
+        import faiss
+
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = self.index.hnsw.efSearch
+        params.sel = self._selector
+        scores, rows = self.index.search(query, k, params=params)
+        positions = np.searchsorted(self.live_rows, rows)
+        return scores, np.where(rows >= 0, positions, -1)
+
+    def clone(self):
+        import faiss
+
+        return TombstonedIndex(faiss.clone_index(self.index), self.live_rows.copy())
+
+
+def clone_index(index):
+    """Independent copy of an index built by this module."""
+    if isinstance(index, TombstonedIndex):
+        return index.clone()
+    import faiss
+
+    return faiss.clone_index(index)
+
+
+def index_type_of(index):
+    if index is None:
+        return None
+    import faiss
+
+    if isinstance(index, TombstonedIndex) or isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def index_after_add(index, embeddings):
+    """Return an index covering ``embeddings`` after rows were appended to it.
+
+    ``index`` must already hold the leading rows. Appends stay incremental;
+    the index is rebuilt only when the corpus outgrows its tier (or, for
+    IVF, its number of inverted lists).
+    """
+    if index is None:
+        return build_index_from_embeddings(embeddings)
+    n_vectors = len(embeddings)
+    wanted = choose_index_type(n_vectors)
+    current = index_type_of(index)
+    if wanted != current or (current == "ivfpq" and _ivf_nlist(n_vectors) >= 2 * index.nlist):
+        return build_index_from_embeddings(embeddings, index_type=wanted)
+    index.add(_index_vectors(embeddings[index.ntotal:]))
+    return index
 
-def search(query, docs, index, embeddings, top_k=3):
+
+def index_after_remove(index, positions, embeddings):
+    """Return an index for ``embeddings`` (already without ``positions``).
+
+    Flat indexes compact in place, keeping row ``i`` at id ``i``. HNSW graphs
+    cannot drop nodes, so removed rows are tombstoned (see
+    ``TombstonedIndex``) and the graph is rebuilt from the stored vectors only
+    once more than ``RAG_ANN_HNSW_MAX_DELETED`` of it is dead. IVF indexes
+    are refilled from the stored vectors, keeping their trained quantizer and
+    codebooks.
+    """
+    if index is None:
+        return None
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    current = index_type_of(index)
+    if current == "flat":
+        index.remove_ids(np.asarray(positions, dtype=np.int64))
+        return index
+    if current == "ivfpq" and choose_index_type(len(embeddings)) == "ivfpq":
+        index.reset()
+        index.add(_index_vectors(embeddings))
+        return index
+    if current == "hnsw" and choose_index_type(len(embeddings)) == "hnsw":
+        if not isinstance(index, TombstonedIndex):
+            index = TombstonedIndex(index)
+        index.remove(positions)
+        if index.deleted_fraction <= _setting("RAG_ANN_HNSW_MAX_DELETED", 0.2):
+            return index
+    return build_index_from_embeddings(embeddings)
+
+
+def _apply_search_params(index):
+    """Set query-time knobs (HNSW efSearch, IVF nprobe) from settings."""
+    import faiss
+
+    if isinstance(index, (TombstonedIndex, faiss.IndexHNSW)):
+        index.hnsw.efSearch = _setting("RAG_ANN_HNSW_EF_SEARCH", 64)
+    elif isinstance(index, faiss.IndexIVF):
+        index.nprobe = _setting("RAG_ANN_IVF_NPROBE", 16)
+
+
+def search(query, docs, index, embeddings, top_k=3, return_scores=False, query_out=None):
+    """Dense top-k chunks for ``query`` as ``(chunks, indices)``.
+
+    With ``return_scores=True`` a third list holds the cosine similarity of
+    each hit (approximate for IVF-PQ). If ``query_out`` is a dict, the
+    normalized query embedding is stored under ``"vector"`` so callers can
+    reuse it without encoding the query again.
+    """
     if not docs or index is None or index.ntotal == 0:
-        return [], []
+        return ([], [], []) if return_scores else ([], [])
     try:
         top_k = int(top_k)
     except (TypeError, ValueError):
         top_k = 3
     top_k = max(1, top_k)
     top_k = min(top_k, index.ntotal)
-    model = get_embedding_model()
+    model = get_query_embedding_model()
     query_vec = model.encode([query])
-    query_vec = np.ascontiguousarray(
+    query_vec = normalize_rows(
         np.array(query_vec, dtype=np.float32).flatten()[: index.d].reshape(1, index.d)
     )
-    distances, indices = index.search(query_vec, top_k)
-    safe_indices = [i for i in indices[0].tolist() if i >= 0]
+    if query_out is not None:
+        query_out["vector"] = query_vec[0]
+    _apply_search_params(index)
+    scores, indices = index.search(query_vec, top_k)
+    hits = [(i, float(score)) for i, score in zip(indices[0].tolist(), scores[0].tolist()) if i >= 0]
+    safe_indices = [i for i, _ in hits]
     chunk_list = [docs[i] for i in safe_indices]
+    if return_scores:
+        return chunk_list, safe_indices, [score for _, score in hits]
     return chunk_list, safe_indices
 
-def rerank(query, chunks, top_k=3):
+def rerank(query, chunks, top_k=3, cache_scope=None):
+    """Score ``chunks`` against ``query`` with the cross-encoder, best first.
+
+    With a ``cache_scope`` (the user id) scores are looked up in and added to
+    the rerank cache, so only pairs not seen before reach the model.
+    """
     if not chunks:
         return []
     try:
@@ -60,9 +469,18 @@ def rerank(query, chunks, top_k=3):
     except (TypeError, ValueError):
         top_k = 3
     top_k = max(1, top_k)
-    reranker = get_reranker()
-    pairs = [[query, chunk] for chunk in chunks]
-    scores = reranker.predict(pairs)
+    cache = get_rerank_cache() if cache_scope is not None else None
+    cached = cache.get_many(cache_scope, query, chunks) if cache is not None else {}
+    missing = [i for i in range(len(chunks)) if i not in cached]
+    scores = np.empty(len(chunks), dtype=np.float32)
+    for i, score in cached.items():
+        scores[i] = score
+    if missing:
+        reranker = get_reranker()
+        predicted = np.asarray(reranker.predict([[query, chunks[i]] for i in missing]), dtype=np.float32)
+        scores[missing] = predicted.reshape(-1)
+        if cache is not None:
+            cache.put_many(cache_scope, query, [chunks[i] for i in missing], predicted.reshape(-1))
     ranked_indices = np.argsort(scores)[::-1][:top_k]
     return [
         {
@@ -117,28 +535,86 @@ def remove_overlapping_chunks(chunks, sources, overlap_threshold=0.6):
     return kept_chunks, kept_sources
 
 
+def bm25_tokenize(text):
+    return text.lower().split()
+
+
 def build_bm25_index(docs):
-    tokenized_corpus = [doc.lower().split() for doc in docs]
-    return BM25Okapi(tokenized_corpus), tokenized_corpus
+    return BM25Index.build([bm25_tokenize(doc) for doc in docs])
 
 
-def hybrid_search(query, docs, dense_index, bm25_index, tokenized_corpus, embeddings, top_k=10):
-    if not docs:
-        return [], []
+def fuse_hits(dense_hits, bm25_hits, top_k=10, method=None, dense_weight=None, rrf_k=60):
+    """Fuse dense and BM25 hits, keeping their raw scores.
+
+    ``dense_hits`` and ``bm25_hits`` are ``(position, score)`` pairs, best
+    first. ``method`` is ``rrf`` (reciprocal-rank fusion) or ``weighted``
+    (``dense_weight`` * cosine + the rest * BM25 score divided by the best
+    BM25 score); both default to settings. Returns up to ``top_k`` dicts with
+    ``index``, ``score`` (the fused score used for ordering), ``dense_score``
+    and ``bm25_score`` (None when the list did not contain the hit) and
+    ``weighted_score``, best first.
+    """
+    method = (method or _setting("RAG_FUSION_METHOD", "rrf")).lower()
+    if dense_weight is None:
+        dense_weight = _setting("RAG_FUSION_DENSE_WEIGHT", 0.5)
+    dense_weight = min(1.0, max(0.0, float(dense_weight)))
+
+    hits = {}
+    ranks = {}
+    for source, source_hits in (("dense", dense_hits), ("bm25", bm25_hits)):
+        for rank, (idx, score) in enumerate(source_hits):
+            hit = hits.setdefault(idx, {"index": idx, "dense_score": None, "bm25_score": None})
+            hit[f"{source}_score"] = float(score)
+            ranks.setdefault(idx, []).append(rank)
 
-    dense_chunks, dense_indices = search(query, docs, dense_index, embeddings, top_k=top_k)
+    best_bm25 = max((score for _, score in bm25_hits), default=0.0)
+    for idx, hit in hits.items():
+        dense = max(0.0, hit["dense_score"]) if hit["dense_score"] is not None else 0.0
+        lexical = hit["bm25_score"] / best_bm25 if hit["bm25_score"] is not None and best_bm25 > 0 else 0.0
+        hit["weighted_score"] = dense_weight * dense + (1 - dense_weight) * lexical
+        if method == "weighted":
+            hit["score"] = hit["weighted_score"]
+        else:
+            hit["score"] = sum(1 / (rrf_k + rank + 1) for rank in ranks[idx])
 
-    tokenized_query = query.lower().split()
-    bm25_scores = bm25_index.get_scores(tokenized_query)
-    bm25_indices = sorted(range(len(bm25_scores)), key=lambda i: bm25_scores[i], reverse=True)[:top_k]
+    return sorted(hits.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
+
+
+def fusion_confidence(hits):
+    """How clearly the top fused hit beats the rest, from 0 to 1.
+
+    The margin of the top hit's ``weighted_score`` over the best other hit,
+    so it is comparable across fusion methods; 0 when the methods disagree
+    on the winner.
+    """
+    if not hits:
+        return 0.0
+    runner_up = max((hit["weighted_score"] for hit in hits[1:]), default=0.0)
+    return max(0.0, hits[0]["weighted_score"] - runner_up)
 
-    K = 60
-    doc_scores = {}
-    for rank, idx in enumerate(dense_indices):
-        doc_scores[idx] = doc_scores.get(idx, 0) + 1 / (K + rank + 1)
-    for rank, idx in enumerate(bm25_indices):
-        doc_scores[idx] = doc_scores.get(idx, 0) + 1 / (K + rank + 1)
 
-    fused_indices = sorted(doc_scores.keys(), key=lambda i: doc_scores[i], reverse=True)[:top_k]
+def hybrid_search(
+    query, docs, dense_index, bm25_index, embeddings, top_k=10, return_hits=False, query_out=None,
+):
+    """Dense + BM25 search fused by ``fuse_hits``.
+
+    Returns ``(chunks, indices)``; with ``return_hits=True`` a third list
+    holds the ``fuse_hits`` dicts (raw and fused scores) for each result.
+    ``query_out`` is passed to ``search``.
+    """
+    if not docs:
+        return ([], [], []) if return_hits else ([], [])
+
+    _, dense_indices, dense_scores = search(
+        query, docs, dense_index, embeddings, top_k=top_k, return_scores=True, query_out=query_out,
+    )
+    bm25_indices, bm25_scores = (
+        bm25_index.top_k(bm25_tokenize(query), top_k) if bm25_index is not None else ([], [])
+    )
+
+    hits = fuse_hits(list(zip(dense_indices, dense_scores)), list(zip(bm25_indices, bm25_scores)), top_k=top_k)
+    fused_indices = [hit["index"] for hit in hits]
     fused_chunks = [docs[i] for i in fused_indices]
+    if return_hits:
+        return fused_chunks, fused_indices, hits
     return fused_chunks, fused_indices
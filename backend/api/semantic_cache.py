@@ -0,0 +1,186 @@
+"""Semantic answer cache for paraphrased questions.
+
+The exact-match cache in api/answer_cache.py only helps when a question is
+repeated word for word. This cache keeps, per user and index version, the
+normalized query embedding, the ids of the retrieved chunks and the answer of
+recent questions in a small flat inner-product FAISS index. A new question
+reuses a cached answer when its embedding is at least ``threshold`` cosine
+similar to a cached one *and* retrieval returned an overlapping set of chunks
+(Jaccard overlap of at least ``min_overlap``), so a paraphrase that happens to
+pull in different evidence still gets a fresh answer.
+
+Entries are further matched on a ``variant`` (endpoint, provider, model and
+history hash) and expire after ``ttl_seconds``. Entries live in buckets keyed
+by ``(user_id, index_version)``, so a user switching between collections (each
+with its own index version) keeps the answers of both. Each bucket holds at
+most ``max_entries_per_user`` entries and buckets are evicted in LRU order
+beyond ``max_users``; buckets of index versions that are no longer queried
+age out that way.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class _UserEntries:
+    """Cached questions of one user for one index version."""
+
+    def __init__(self, index_version):
+        self.index_version = index_version
+        self.vectors = []
+        self.entries = []  # dicts with variant, chunk_ids, value, seconds, expires_at
+        self.index = None
+
+    def rebuild(self):
+        import faiss
+
+        self.index = None
+        if self.vectors:
+            vectors = np.asarray(self.vectors, dtype=np.float32)
+            self.index = faiss.IndexFlatIP(vectors.shape[1])
+            self.index.add(vectors)
+
+
+def _overlap(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticAnswerCache:
+    """Thread-safe per-user cache of answers looked up by query similarity."""
+
+    def __init__(
+        self,
+        endpoints,
+        threshold=0.95,
+        min_overlap=0.5,
+        max_entries_per_user=256,
+        max_users=1000,
+        ttl_seconds=3600,
+        clock=time.monotonic,
+    ):
+        self.endpoints = frozenset(endpoints)
+        self.threshold = float(threshold)
+        self.min_overlap = float(min_overlap)
+        self.max_entries_per_user = max(1, int(max_entries_per_user))
+        self.max_users = max(1, int(max_users))
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._buckets = OrderedDict()  # (user_id, index_version) -> _UserEntries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def enabled_for(self, endpoint):
+        return endpoint in self.endpoints
+
+    def _bucket(self, user_id, index_version, create=False):
+        key = (user_id, index_version)
+        bucket = self._buckets.get(key)
+        if bucket is None and create:
+            bucket = self._buckets[key] = _UserEntries(index_version)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        if bucket is not None:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def lookup(self, user_id, index_version, variant, vector, chunk_ids):
+        """Return the cached value of the closest matching question, or None."""
+        chunk_ids = frozenset(int(i) for i in chunk_ids)
+        query = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+        now = self._clock()
+        with self._lock:
+            bucket = self._bucket(user_id, index_version)
+            if bucket is not None and bucket.index is not None:
+                scores, positions = bucket.index.search(query, min(16, len(bucket.entries)))
+                for score, position in zip(scores[0], positions[0]):
+                    if position < 0 or score < self.threshold:
+                        break
+                    entry = bucket.entries[position]
+                    if entry["expires_at"] <= now or entry["variant"] != variant:
+                        continue
+                    if _overlap(entry["chunk_ids"], chunk_ids) >= self.min_overlap:
+                        self.hits += 1
+                        self.saved_seconds += entry["seconds"]
+                        return entry["value"]
+            self.misses += 1
+            return None
+
+    def add(self, user_id, index_version, variant, vector, chunk_ids, value, generation_seconds=0.0):
+        now = self._clock()
+        with self._lock:
+            bucket = self._bucket(user_id, index_version, create=True)
+            bucket.vectors.append(np.asarray(vector, dtype=np.float32).reshape(-1))
+            bucket.entries.append({
+                "variant": variant,
+                "chunk_ids": frozenset(int(i) for i in chunk_ids),
+                "value": value,
+                "seconds": float(generation_seconds),
+                "expires_at": now + self.ttl_seconds,
+            })
+            live = [i for i, entry in enumerate(bucket.entries) if entry["expires_at"] > now]
+            live = live[-self.max_entries_per_user:]
+            if len(live) == len(bucket.entries) and bucket.index is not None:
+                bucket.index.add(bucket.vectors[-1].reshape(1, -1))
+                return
+            bucket.vectors = [bucket.vectors[i] for i in live]
+            bucket.entries = [bucket.entries[i] for i in live]
+            bucket.rebuild()
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in [key for key in self._buckets if key[0] == user_id]:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self.hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "endpoints": sorted(self.endpoints),
+                "users": len({user_id for user_id, _ in self._buckets}),
+                "buckets": len(self._buckets),
+                "entries": sum(len(bucket.entries) for bucket in self._buckets.values()),
+                "threshold": self.threshold,
+                "min_overlap": self.min_overlap,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "saved_provider_seconds": round(self.saved_seconds, 3),
+            }
+
+
+_semantic_cache = None
+
+
+def get_semantic_cache():
+    """Process-wide semantic answer cache, or None when no endpoint enables it."""
+    global _semantic_cache
+    if _semantic_cache is None:
+        from django.conf import settings
+
+        endpoints = getattr(settings, "RAG_SEMANTIC_CACHE_ENDPOINTS", [])
+        ttl_seconds = getattr(settings, "RAG_ANSWER_CACHE_TTL", 3600)
+        if not endpoints or ttl_seconds <= 0:
+            return None
+        _semantic_cache = SemanticAnswerCache(
+            endpoints,
+            threshold=getattr(settings, "RAG_SEMANTIC_CACHE_THRESHOLD", 0.95),
+            min_overlap=getattr(settings, "RAG_SEMANTIC_CACHE_MIN_OVERLAP", 0.5),
+            max_entries_per_user=getattr(settings, "RAG_SEMANTIC_CACHE_MAX_ENTRIES_PER_USER", 256),
+            max_users=getattr(settings, "RAG_SEMANTIC_CACHE_MAX_USERS", 1000),
+            ttl_seconds=ttl_seconds,
+        )
+    return _semantic_cache
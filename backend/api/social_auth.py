@@ -17,6 +17,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from api.auth_views import _set_refresh_cookie
+
 logger = logging.getLogger(__name__)
 
 
@@ -263,6 +265,5 @@ class SocialAuthView(APIView):
             },
         }, status=status.HTTP_200_OK)
         # Set refresh token in HttpOnly secure cookie.
-        from api.views import _set_refresh_cookie
         _set_refresh_cookie(response, str(refresh))
         return response
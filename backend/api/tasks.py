@@ -1,4 +1,6 @@
 import importlib
+import logging
+import threading
 
 from celery import shared_task
 from django.db import close_old_connections
@@ -7,20 +9,33 @@ from django.utils import timezone
 from api.models import Task
 
 
+logger = logging.getLogger(__name__)
+
+
 class TaskCancelled(Exception):
     pass
 
 
+def _job_path(job_fn):
+    return f"{job_fn.__module__}.{job_fn.__qualname__}"
+
+
+def _resolve_job(fn_path):
+    """Resolve a job function from its dotted path."""
+    module_path, fn_name = fn_path.rsplit(".", 1)
+    module = importlib.import_module(module_path)
+    return getattr(module, fn_name)
+
+
 def submit_task(task_id, job_fn, *args, **kwargs):
     """Thin wrapper that keeps the same interface views already call.
     Converts the callable to a dotted path so Celery can serialize it.
     Falls back to synchronous execution if the Celery broker is unavailable."""
-    fn_path = f"{job_fn.__module__}.{job_fn.__qualname__}"
+    fn_path = _job_path(job_fn)
     try:
         _run_task.delay(str(task_id), fn_path, args, kwargs)
     except Exception:
         # Broker unavailable (no Redis) — run synchronously in a thread
-        import threading
         threading.Thread(
             target=_run_task,
             args=(str(task_id), fn_path, args, kwargs),
@@ -28,6 +43,28 @@ def submit_task(task_id, job_fn, *args, **kwargs):
         ).start()
 
 
+def run_in_background(job_fn, *args):
+    """Run ``job_fn(*args)`` on a Celery worker without a Task row to track it.
+    Meant for small follow-up jobs the user never waits on; failures are only
+    logged. Falls back to a thread if the Celery broker is unavailable."""
+    fn_path = _job_path(job_fn)
+    try:
+        _run_background.delay(fn_path, args)
+    except Exception:
+        threading.Thread(target=_run_background, args=(fn_path, args), daemon=True).start()
+
+
+@shared_task(ignore_result=True)
+def _run_background(fn_path, args):
+    close_old_connections()
+    try:
+        _resolve_job(fn_path)(*args)
+    except Exception:
+        logger.exception("Background job %s failed", fn_path)
+    finally:
+        close_old_connections()
+
+
 @shared_task(ignore_result=True)
 def _run_task(task_id, fn_path, args, kwargs):
     close_old_connections()
@@ -62,10 +99,7 @@ def _run_task(task_id, fn_path, args, kwargs):
         if updates:
             task.save(update_fields=updates + ["updated_at"])
 
-    # Resolve the job function from its dotted path
-    module_path, fn_name = fn_path.rsplit(".", 1)
-    module = importlib.import_module(module_path)
-    job_fn = getattr(module, fn_name)
+    job_fn = _resolve_job(fn_path)
 
     try:
         result = job_fn(update=update, is_cancelled=is_cancelled, *args, **kwargs) or {}
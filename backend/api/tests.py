@@ -7,15 +7,17 @@ from django.utils.encoding import force_bytes
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from types import SimpleNamespace
 import os
 import shutil
+import tempfile
 import numpy as np
 import logging
 
 from api import views as api_views
 from api.models import APIUsageLog, Conversation, ChatMessage, Task, Collection, Document
+from api.index_registry import IndexRegistry, UserIndex
 
 
 _NO_THROTTLE = {
@@ -27,6 +29,26 @@ _NO_THROTTLE = {
     'EXCEPTION_HANDLER': 'api.exception_handler.custom_exception_handler',
 }
 
+_module_settings = None
+
+
+def setUpModule():
+    # Keep the shared embedding cache out of the source tree during tests.
+    global _module_settings
+    from api import retriever
+    cache_dir = tempfile.mkdtemp(prefix="rag-test-cache-")
+    _module_settings = override_settings(RAG_EMBEDDING_CACHE_PATH=os.path.join(cache_dir, "embeddings.sqlite3"))
+    _module_settings.enable()
+    retriever._embedding_cache = None
+
+
+def tearDownModule():
+    from api import retriever
+    cache_dir = os.path.dirname(settings.RAG_EMBEDDING_CACHE_PATH)
+    _module_settings.disable()
+    retriever._embedding_cache = None
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
 
 @override_settings(REST_FRAMEWORK=_NO_THROTTLE)
 class HealthEndpointTests(TestCase):
@@ -113,15 +135,6 @@ class EndpointSmokeTests(TestCase):
             chunks=["RAG combines retrieval with generation."],
         )
 
-        self.original_docs = list(api_views.docs)
-        self.original_chunk_sources = list(api_views.chunk_sources)
-        self.original_index = api_views.index
-
-    def tearDown(self):
-        api_views.docs = self.original_docs
-        api_views.chunk_sources = self.original_chunk_sources
-        api_views.index = self.original_index
-
     def test_chat_history_returns_conversations(self):
         self.api_client.force_authenticate(user=self.user)
         response = self.api_client.get("/api/chat/history/")
@@ -189,16 +202,18 @@ class EndpointSmokeTests(TestCase):
         self.assertEqual(response.status_code, 403)
 
     @patch("api.views.ensure_documents_loaded")
-    def test_admin_vectors_returns_stats_for_staff(self, _mock_loaded):
-        api_views.docs = [
-            "Chunk one for smoke testing",
-            "Chunk two for smoke testing",
-        ]
-        api_views.chunk_sources = [
-            "doc_a.txt",
-            "doc_b.txt",
-        ]
-        api_views.index = SimpleNamespace(ntotal=2, d=384)
+    def test_admin_vectors_returns_stats_for_staff(self, mock_loaded):
+        mock_loaded.return_value = UserIndex(
+            docs=[
+                "Chunk one for smoke testing",
+                "Chunk two for smoke testing",
+            ],
+            chunk_sources=[
+                "doc_a.txt",
+                "doc_b.txt",
+            ],
+            index=SimpleNamespace(ntotal=2, d=384),
+        )
 
         self.api_client.force_authenticate(user=self.staff_user)
         response = self.api_client.get("/api/admin/vectors/")
@@ -304,9 +319,9 @@ class AuthAndTaskEndpointSmokeTests(TestCase):
 
     @patch("api.views.ensure_documents_loaded")
     @patch("api.views.hybrid_search")
-    def test_search_returns_results(self, mock_search, _mock_loaded):
+    def test_search_returns_results(self, mock_search, mock_loaded):
         mock_search.return_value = (["retrieved chunk"], [0])
-        api_views.chunk_sources = ["doc_a.txt"]
+        mock_loaded.return_value = UserIndex(docs=["retrieved chunk"], chunk_sources=["doc_a.txt"])
 
         self.api_client.force_authenticate(user=self.user)
         response = self.api_client.post(
@@ -770,6 +785,41 @@ class SemanticChunkingTests(TestCase):
         self.assertIn("Machine learning", combined)
         self.assertIn("BERT", combined)
 
+    def test_return_embeddings_aligns_sentence_vectors_with_chunks(self):
+        from api.chunker import _split_sentences, semantic_chunk
+        text = "Alpha one. Beta two. Gamma three. Delta four."
+        chunks, sentence_embeddings = semantic_chunk(text, self.mock_model, return_embeddings=True)
+        self.assertEqual(len(chunks), len(sentence_embeddings))
+        for chunk, vectors in zip(chunks, sentence_embeddings):
+            self.assertEqual(len(vectors), len(_split_sentences(chunk)))
+
+    def _topic_model(self):
+        # Sentences about cats and dogs get orthogonal vectors.
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **kw: np.array(
+            [[1.0, 0.0] if "cat" in t else [0.0, 1.0] for t in texts], dtype=np.float32
+        )
+        return model
+
+    def test_boundaries_follow_topic_changes(self):
+        from api.chunker import semantic_chunk
+        text = "A cat sat. The cat slept. A dog ran. The dog barked. Another cat came."
+        chunks = semantic_chunk(text, self._topic_model())
+        self.assertEqual(chunks, ["A cat sat. The cat slept.", "A dog ran. The dog barked.", "Another cat came."])
+
+    def test_windowed_encoding_matches_single_pass(self):
+        from api.chunker import semantic_chunk
+        text = " ".join(["A cat sat.", "The cat slept.", "A dog ran.", "The dog barked."] * 5)
+        model = self._topic_model()
+        expected, expected_vectors = semantic_chunk(text, model, window_size=1000, return_embeddings=True)
+        model.encode.reset_mock()
+        chunks, vectors = semantic_chunk(text, model, window_size=3, return_embeddings=True)
+
+        self.assertEqual(chunks, expected)
+        self.assertEqual([len(v) for v in vectors], [len(v) for v in expected_vectors])
+        self.assertEqual(model.encode.call_count, 7)
+        self.assertTrue(all(len(call.args[0]) <= 3 for call in model.encode.call_args_list))
+
 
 class ContextCompressionTests(TestCase):
     """Tests for the compress_chunks function in compressor.py."""
@@ -811,6 +861,46 @@ class ContextCompressionTests(TestCase):
         result = compress_chunks("some query", [chunk], mock_model)
         self.assertGreaterEqual(len(result), 1)
 
+    def test_stored_sentence_embeddings_skip_sentence_encoding(self):
+        from api.compressor import compress_chunks
+        mock_model = MagicMock()
+        mock_model.encode.return_value = np.array([[1.0, 0.0]], dtype=np.float32)
+        chunk = "Relevant first. Unrelated second. Relevant third."
+        stored = np.array([[1.0, 0.0], [0.0, 1.0], [0.9, 0.1]], dtype=np.float16)
+
+        result = compress_chunks("query", [chunk], mock_model, sentence_embeddings=[stored])
+
+        self.assertEqual(result, ["Relevant first. Relevant third."])
+        mock_model.encode.assert_called_once_with(["query"], show_progress_bar=False)
+
+    def test_mismatched_stored_embeddings_fall_back_to_encoding(self):
+        from api.compressor import compress_chunks
+        mock_model = MagicMock()
+        mock_model.encode.side_effect = lambda texts, **kw: np.ones((len(texts), 2), dtype=np.float32)
+        chunk = "One. Two. Three."
+        stale = np.ones((2, 2), dtype=np.float16)
+
+        compress_chunks("query", [chunk], mock_model, sentence_embeddings=[stale])
+
+        mock_model.encode.assert_called_once_with(["query", "One.", "Two.", "Three."], show_progress_bar=False)
+
+    def test_query_and_all_chunk_sentences_are_encoded_in_one_call(self):
+        from api.compressor import compress_chunks
+        vectors = {
+            "query": [1.0, 0.0],
+            "Cats purr.": [1.0, 0.1], "Dogs bark.": [0.0, 1.0], "Cats nap.": [0.9, 0.0],
+            "Fish swim.": [0.0, 1.0], "Birds fly.": [0.1, 1.0], "Cows moo.": [0.0, 1.0],
+        }
+        mock_model = MagicMock()
+        mock_model.encode.side_effect = lambda texts, **kw: np.array([vectors[t] for t in texts], dtype=np.float32)
+        chunks = ["Cats purr. Dogs bark. Cats nap.", "Fish swim. Birds fly. Cows moo.", "Short one."]
+
+        result = compress_chunks("query", chunks, mock_model)
+
+        self.assertEqual(mock_model.encode.call_count, 1)
+        # Second chunk falls back to its best sentence; the short chunk is untouched.
+        self.assertEqual(result, ["Cats purr. Cats nap.", "Birds fly.", "Short one."])
+
 
 class JSONLogFormatterTests(TestCase):
     """Tests for the JSON log formatter."""
@@ -938,3 +1028,2000 @@ class OverlapRemovalTests(TestCase):
         sources = ["dl.txt", "rl.txt"]
         result_chunks, result_sources = remove_overlapping_chunks(chunks, sources)
         self.assertEqual(len(result_chunks), 2)
+
+
+class IndexRegistryTests(TestCase):
+    """Tests for the per-user LRU index registry in index_registry.py."""
+
+    def _index(self, n_chunks, fingerprint=None):
+        return UserIndex(docs=["chunk"] * n_chunks, chunk_sources=["a.txt"] * n_chunks, fingerprint=fingerprint)
+
+    def test_hits_and_misses_are_counted(self):
+        registry = IndexRegistry(max_entries=4, max_chunks=100)
+        self.assertIsNone(registry.get((1, None)))
+        registry.put((1, None), self._index(2))
+        self.assertIsNotNone(registry.get((1, None)))
+        stats = registry.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        registry = IndexRegistry(max_entries=2, max_chunks=100)
+        registry.put((1, None), self._index(1))
+        registry.put((2, None), self._index(1))
+        registry.get((1, None))
+        registry.put((3, None), self._index(1))
+        self.assertIsNotNone(registry.get((1, None)))
+        self.assertIsNone(registry.get((2, None)))
+        self.assertEqual(registry.stats()["evictions"], 1)
+
+    def test_chunk_budget_triggers_eviction(self):
+        registry = IndexRegistry(max_entries=10, max_chunks=5)
+        registry.put((1, None), self._index(3))
+        registry.put((2, None), self._index(3))
+        self.assertIsNone(registry.get((1, None)))
+        self.assertEqual(registry.stats()["total_chunks"], 3)
+
+    def test_stale_fingerprint_reloads(self):
+        registry = IndexRegistry(max_entries=4, max_chunks=100)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return self._index(1, fingerprint=f"v{len(loads)}")
+
+        registry.get_or_load((1, None), loader, fingerprint="v1")
+        registry.get_or_load((1, None), loader, fingerprint="v1")
+        registry.get_or_load((1, None), loader, fingerprint="changed")
+        self.assertEqual(len(loads), 2)
+
+    def test_invalidate_user_drops_all_collections(self):
+        registry = IndexRegistry(max_entries=4, max_chunks=100)
+        registry.put((1, None), self._index(1))
+        registry.put((1, 7), self._index(1))
+        registry.put((2, None), self._index(1))
+        registry.invalidate_user(1)
+        self.assertIsNone(registry.get((1, None)))
+        self.assertIsNone(registry.get((1, 7)))
+        self.assertIsNotNone(registry.get((2, None)))
+
+    def test_evicted_keys_release_their_build_locks(self):
+        registry = IndexRegistry(max_entries=2, max_chunks=100)
+        for user_id in range(1, 6):
+            registry.get_or_load((user_id, None), lambda: self._index(2))
+        with self.assertRaises(RuntimeError):
+            registry.get_or_load((9, None), lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+
+        self.assertEqual(set(registry._key_locks), {(4, None), (5, None)})
+        self.assertEqual(registry.stats()["total_chunks"], 4)
+        registry.put((5, None), self._index(7))
+        self.assertEqual(registry.stats()["total_chunks"], 9)
+
+
+def _fake_embed_texts(texts):
+    return np.ones((len(texts), 8), dtype=np.float32)
+
+
+def _reference_bm25_scores(corpus, query, k1=1.5, b=0.75, epsilon=0.25):
+    """Straightforward Okapi BM25 (as in rank_bm25.BM25Okapi) for parity checks."""
+    import math
+    from collections import Counter
+    frequencies = [Counter(doc) for doc in corpus]
+    avgdl = sum(len(doc) for doc in corpus) / len(corpus)
+    df = Counter(word for freq in frequencies for word in freq)
+    idf = {word: math.log(len(corpus) - n + 0.5) - math.log(n + 0.5) for word, n in df.items()}
+    average_idf = sum(idf.values()) / len(idf)
+    idf = {word: value if value >= 0 else epsilon * average_idf for word, value in idf.items()}
+    scores = np.zeros(len(corpus))
+    for word in query:
+        for i, freq in enumerate(frequencies):
+            tf = freq.get(word, 0)
+            scores[i] += idf.get(word, 0) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(corpus[i]) / avgdl))
+    return scores
+
+
+def _embedded_texts(mock_embed):
+    return [text for call in mock_embed.call_args_list for text in call.args[0]]
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class UserIndexLoadingTests(TestCase):
+    """Tests for per-user index loading through ensure_documents_loaded."""
+
+    def setUp(self):
+        self.original_doc_dir = api_views.DOC_DIR
+        self.temp_doc_dir = os.path.join(settings.BASE_DIR, "test_documents_tmp")
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+        api_views.DOC_DIR = self.temp_doc_dir
+        api_views.index_registry.clear()
+        self.user_a = User.objects.create_user(username="index_a", password="pass12345")
+        self.user_b = User.objects.create_user(username="index_b", password="pass12345")
+        for user, text in ((self.user_a, "alpha document"), (self.user_b, "beta document")):
+            user_dir = os.path.join(self.temp_doc_dir, str(user.id))
+            os.makedirs(user_dir, exist_ok=True)
+            with open(os.path.join(user_dir, f"{user.username}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+
+    def tearDown(self):
+        api_views.DOC_DIR = self.original_doc_dir
+        api_views.index_registry.clear()
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_alternating_users_reuse_warm_indexes(self, _model, mock_embed):
+        index_a = api_views.ensure_documents_loaded(self.user_a)
+        index_b = api_views.ensure_documents_loaded(self.user_b)
+        self.assertIs(api_views.ensure_documents_loaded(self.user_a), index_a)
+        self.assertIs(api_views.ensure_documents_loaded(self.user_b), index_b)
+        self.assertEqual(_embedded_texts(mock_embed), ["alpha document", "beta document"])
+        self.assertEqual(index_a.docs, ["alpha document"])
+        self.assertEqual(index_b.docs, ["beta document"])
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_collection_index_only_contains_collection_documents(self, _model, _embed):
+        user_dir = os.path.join(self.temp_doc_dir, str(self.user_a.id))
+        with open(os.path.join(user_dir, "other.txt"), "w", encoding="utf-8") as f:
+            f.write("outside collection")
+        collection = Collection.objects.create(user=self.user_a, name="Research")
+        Document.objects.create(user=self.user_a, filename="other.txt", collection=collection)
+
+        full_index = api_views.ensure_documents_loaded(self.user_a)
+        collection_index = api_views.ensure_documents_loaded(self.user_a, collection_id=collection.id)
+
+        self.assertEqual(len(full_index.docs), 2)
+        self.assertEqual(collection_index.chunk_sources, ["other.txt"])
+
+    def test_admin_caches_reports_registry_stats(self):
+        staff = User.objects.create_user(username="cache_staff", password="pass12345", is_staff=True)
+        api_client = APIClient()
+        api_client.force_authenticate(user=staff)
+        response = api_client.get("/api/admin/caches/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("evictions", response.json()["index_registry"])
+        self.assertIn("llm_clients", response.json())
+
+
+class IndexSnapshotTests(TestCase):
+    """Tests for on-disk index snapshots in index_store.py."""
+
+    def setUp(self):
+        self.base_dir = os.path.join(settings.BASE_DIR, "test_snapshots_tmp")
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _user_index(self):
+        from api.retriever import build_bm25_index, build_index_from_embeddings
+        docs = ["cats purr softly", "dogs bark loudly", "birds sing at dawn"]
+        embeddings = np.random.RandomState(0).rand(3, 8).astype(np.float32)
+        return UserIndex(
+            docs=docs,
+            chunk_sources=["a.txt", "b.txt", "b.txt"],
+            index=build_index_from_embeddings(embeddings),
+            embeddings=embeddings,
+            bm25_index=build_bm25_index(docs),
+        )
+
+    def test_round_trip_preserves_chunks_vectors_and_bm25(self):
+        from api.index_store import load_snapshot, save_snapshot
+        original = self._user_index()
+        snapshot_id = save_snapshot(self.base_dir, original)
+        loaded = load_snapshot(self.base_dir)
+
+        self.assertEqual(loaded.fingerprint, snapshot_id)
+        self.assertEqual(loaded.docs, original.docs)
+        self.assertEqual(loaded.chunk_sources, original.chunk_sources)
+        self.assertEqual(loaded.index.ntotal, 3)
+        np.testing.assert_allclose(loaded.embeddings, original.embeddings)
+        np.testing.assert_allclose(
+            loaded.bm25_index.get_scores(["dogs", "bark"]),
+            original.bm25_index.get_scores(["dogs", "bark"]),
+        )
+
+    def test_new_snapshot_replaces_pointer_and_prunes_old_versions(self):
+        from api.index_store import current_snapshot_id, save_snapshot
+        first = save_snapshot(self.base_dir, self._user_index())
+        second = save_snapshot(self.base_dir, self._user_index())
+        third = save_snapshot(self.base_dir, self._user_index())
+
+        self.assertEqual(current_snapshot_id(self.base_dir), third)
+        self.assertTrue(third.startswith("v3-"))
+        self.assertFalse(os.path.isdir(os.path.join(self.base_dir, first)))
+        self.assertTrue(os.path.isdir(os.path.join(self.base_dir, second)))
+
+    def test_round_trip_preserves_sentence_embeddings(self):
+        from api.index_store import load_snapshot, save_snapshot
+        original = self._user_index()
+        original.sentence_embeddings = [np.ones((2, 8), dtype=np.float16), None, np.zeros((1, 8), dtype=np.float16)]
+        save_snapshot(self.base_dir, original)
+        loaded = load_snapshot(self.base_dir)
+
+        self.assertEqual(loaded.sentence_embeddings[0].shape, (2, 8))
+        self.assertIsNone(loaded.sentence_embeddings[1])
+        self.assertEqual(loaded.sentence_embeddings[2].shape, (1, 8))
+        stored = loaded.sentence_embeddings_for(["birds sing at dawn", "unknown chunk"])
+        self.assertEqual(stored[0].shape, (1, 8))
+        self.assertIsNone(stored[1])
+
+    def test_missing_snapshot_loads_as_none(self):
+        from api.index_store import load_snapshot
+        self.assertIsNone(load_snapshot(self.base_dir))
+
+    def test_collection_subset_reuses_stored_vectors(self):
+        full = self._user_index()
+        subset = full.subset({"b.txt"})
+
+        self.assertEqual(subset.docs, ["dogs bark loudly", "birds sing at dawn"])
+        self.assertEqual(subset.index.ntotal, 2)
+        self.assertEqual(len(subset.bm25_index.get_scores(["dogs"])), 2)
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class SnapshotLoadingTests(TestCase):
+    """Tests that ensure_documents_loaded serves persisted snapshots."""
+
+    def setUp(self):
+        self.original_doc_dir = api_views.DOC_DIR
+        self.temp_doc_dir = os.path.join(settings.BASE_DIR, "test_documents_tmp")
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+        api_views.DOC_DIR = self.temp_doc_dir
+        api_views.index_registry.clear()
+        self.user = User.objects.create_user(username="snapshot_user", password="pass12345")
+        user_dir = os.path.join(self.temp_doc_dir, str(self.user.id))
+        os.makedirs(user_dir, exist_ok=True)
+        with open(os.path.join(user_dir, "notes.txt"), "w", encoding="utf-8") as f:
+            f.write("persisted snapshot text")
+
+    def tearDown(self):
+        api_views.DOC_DIR = self.original_doc_dir
+        api_views.index_registry.clear()
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_cold_worker_loads_snapshot_instead_of_rebuilding(self, _model, mock_embed):
+        api_views.load_documents(self.user)
+        self.assertEqual(mock_embed.call_count, 1)
+
+        # Simulate a freshly started worker with an empty registry.
+        api_views.index_registry.clear()
+        user_index = api_views.ensure_documents_loaded(self.user)
+
+        self.assertEqual(mock_embed.call_count, 1)
+        self.assertEqual(user_index.docs, ["persisted snapshot text"])
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_snapshot_published_elsewhere_refreshes_registry(self, _model, _embed):
+        from api.index_store import save_snapshot
+        first = api_views.ensure_documents_loaded(self.user)
+        # Another process (e.g. the ingest worker) publishes a newer snapshot.
+        save_snapshot(
+            api_views._user_index_dir(self.user),
+            UserIndex(docs=["updated"], chunk_sources=["notes.txt"]),
+        )
+        second = api_views.ensure_documents_loaded(self.user)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.docs, ["updated"])
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class IncrementalIngestionTests(TestCase):
+    """Tests that load_documents only processes new, changed or deleted files."""
+
+    def setUp(self):
+        self.original_doc_dir = api_views.DOC_DIR
+        self.temp_doc_dir = os.path.join(settings.BASE_DIR, "test_documents_tmp")
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+        api_views.DOC_DIR = self.temp_doc_dir
+        api_views.index_registry.clear()
+        self.user = User.objects.create_user(username="incremental_user", password="pass12345")
+        self.user_dir = os.path.join(self.temp_doc_dir, str(self.user.id))
+        os.makedirs(self.user_dir, exist_ok=True)
+        self._write("a.txt", "apples grow on trees")
+        self._write("b.txt", "bananas are yellow")
+
+    def tearDown(self):
+        api_views.DOC_DIR = self.original_doc_dir
+        api_views.index_registry.clear()
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+
+    def _write(self, filename, text):
+        with open(os.path.join(self.user_dir, filename), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_only_new_file_is_chunked(self, _model, mock_embed):
+        first = api_views.load_documents(self.user)
+        self._write("c.txt", "cherries are red")
+        second = api_views.load_documents(self.user)
+
+        self.assertEqual(mock_embed.call_args[0][0], ["cherries are red"])
+        self.assertEqual(second.index.ntotal, 3)
+        self.assertEqual(set(second.files), {"a.txt", "b.txt", "c.txt"})
+        # The previously published index is not mutated in place.
+        self.assertEqual(first.index.ntotal, 2)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_unchanged_tree_keeps_snapshot(self, _model, mock_embed):
+        first = api_views.load_documents(self.user)
+        second = api_views.load_documents(self.user)
+
+        self.assertEqual(mock_embed.call_count, 1)
+        self.assertEqual(first.fingerprint, second.fingerprint)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_deleted_file_vectors_and_bm25_stats_are_removed(self, _model, _embed):
+        from api.retriever import bm25_tokenize
+        self._write("c.txt", "cherries are red apples")
+        api_views.load_documents(self.user)
+        os.remove(os.path.join(self.user_dir, "b.txt"))
+        user_index = api_views.load_documents(self.user)
+
+        self.assertEqual(user_index.chunk_sources, ["a.txt", "c.txt"])
+        self.assertEqual(user_index.index.ntotal, 2)
+        self.assertEqual(user_index.embeddings.shape[0], 2)
+        query = bm25_tokenize("red apples")
+        np.testing.assert_allclose(
+            user_index.bm25_index.get_scores(query),
+            _reference_bm25_scores([bm25_tokenize(doc) for doc in user_index.docs], query),
+        )
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_modified_file_is_rechunked(self, _model, mock_embed):
+        api_views.load_documents(self.user)
+        self._write("a.txt", "apricots are orange and small")
+        user_index = api_views.load_documents(self.user)
+
+        self.assertEqual(mock_embed.call_args[0][0], ["apricots are orange and small"])
+        self.assertIn("apricots are orange and small", user_index.docs)
+        self.assertNotIn("apples grow on trees", user_index.docs)
+        self.assertEqual(user_index.index.ntotal, 2)
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_rebuild_reprocesses_every_file(self, _model, mock_embed):
+        api_views.load_documents(self.user)
+        api_views.load_documents(self.user, rebuild=True)
+
+        self.assertEqual(len(_embedded_texts(mock_embed)), 4)
+
+
+class EmbeddingCacheTests(TestCase):
+    """Tests for the content-addressed embedding cache."""
+
+    def setUp(self):
+        from api.embedding_cache import CachedEmbeddingModel, EmbeddingCache
+        self.cache_dir = os.path.join(settings.BASE_DIR, "test_embedding_cache_tmp")
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self.cache = EmbeddingCache(os.path.join(self.cache_dir, "embeddings.sqlite3"), max_entries=10)
+        self.inner = MagicMock()
+        self.inner.encode.side_effect = lambda texts, **kwargs: np.array(
+            [[float(len(text)), 1.0, 0.0] for text in texts], dtype=np.float32
+        )
+        self.model = CachedEmbeddingModel(self.inner, self.cache, "test-model")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_only_missing_texts_reach_the_encoder(self):
+        first = self.model.encode(["alpha", "beta"], show_progress_bar=False)
+        second = self.model.encode(["beta", "gamma", "alpha"], show_progress_bar=False)
+
+        self.assertEqual(self.inner.encode.call_count, 2)
+        self.assertEqual(self.inner.encode.call_args[0][0], ["gamma"])
+        np.testing.assert_allclose(second[0], first[1])
+        np.testing.assert_allclose(second[2], first[0])
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_single_string_returns_one_vector(self):
+        vector = self.model.encode("hello")
+        self.assertEqual(vector.shape, (3,))
+
+    def test_cache_is_shared_across_instances_on_disk(self):
+        from api.embedding_cache import EmbeddingCache, text_key
+        self.model.encode(["persisted"])
+        reopened = EmbeddingCache(self.cache.path)
+        self.assertEqual(len(reopened.get_many("test-model", [text_key("persisted")])), 1)
+
+    def test_models_do_not_share_entries(self):
+        from api.embedding_cache import text_key
+        self.model.encode(["shared text"])
+        self.assertEqual(self.cache.get_many("other-model", [text_key("shared text")]), {})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        from api.embedding_cache import text_key
+        self.model.encode([f"text {i}" for i in range(10)])
+        self.cache.get_many("test-model", [text_key("text 0")])
+        self.model.encode(["overflow"])
+
+        self.assertLessEqual(self.cache.stats()["entries"], 10)
+        self.assertIn(text_key("text 0"), self.cache.get_many("test-model", [text_key("text 0")]))
+        self.assertEqual(self.cache.get_many("test-model", [text_key("text 1")]), {})
+
+    def test_reads_defer_recency_updates(self):
+        import sqlite3
+        from api.embedding_cache import text_key
+        self.model.encode(["alpha"])
+        key = text_key("alpha")
+        read_last_used = lambda: sqlite3.connect(self.cache.path).execute(
+            "SELECT last_used FROM embeddings WHERE key = ?", (key,)
+        ).fetchone()[0]
+        stored = read_last_used()
+
+        self.cache.touch_interval = 3600
+        self.cache.get_many("test-model", [key])
+        self.assertEqual(read_last_used(), stored)
+        self.model.encode(["beta"])  # the next write flushes pending touches
+        self.assertGreater(read_last_used(), stored)
+
+    def test_inserts_count_rows_only_periodically(self):
+        statements = []
+        self.model.encode(["warm"])  # first write counts the table once
+        self.cache._connect().set_trace_callback(statements.append)
+        for i in range(5):
+            self.model.encode([f"text {i}"])
+        self.assertFalse([sql for sql in statements if "COUNT(*)" in sql])
+
+        self.model.encode([f"more {i}" for i in range(6)])  # estimate passes max_entries
+        self.assertTrue([sql for sql in statements if "COUNT(*)" in sql])
+        self.assertLessEqual(self.cache.stats()["entries"], 10)
+
+    def test_query_encoder_bypasses_the_cache(self):
+        import api.retriever as retriever
+        from api.embedding_cache import text_key
+        raw = MagicMock()
+        raw.encode.side_effect = self.inner.encode.side_effect
+        with override_settings(RAG_INFERENCE_URL="", RAG_INFERENCE_BATCH_WAIT_MS=0), \
+                patch.object(retriever, "_model", None), patch.object(retriever, "_query_model", None), \
+                patch.object(retriever, "_embedding_cache", self.cache), \
+                patch("api.retriever.load_embedding_model", return_value=raw):
+            vector = retriever.embed_query("what is rag?")
+            retriever.embed_texts(["a chunk"])
+
+        self.assertEqual(vector.shape, (3,))
+        self.assertEqual(self.cache.get_many("test-model", [text_key("what is rag?")]), {})
+        self.assertEqual(len(self.cache.get_many(retriever.embedding_cache_model_name(), [text_key("a chunk")])), 1)
+
+    def test_vector_changing_kwargs_bypass_cache(self):
+        self.model.encode(["alpha"])
+        self.model.encode(["alpha"], normalize_embeddings=True)
+        self.assertEqual(self.inner.encode.call_count, 2)
+
+
+class CompressionModeTests(TestCase):
+    """Tests for RAG_COMPRESSION_MODE handling and the compression benchmark."""
+
+    def _user_index(self):
+        chunk = "Cats purr. Dogs bark. Birds sing."
+        return UserIndex(
+            docs=[chunk],
+            chunk_sources=["pets.txt"],
+            sentence_embeddings=[np.array([[1, 0], [0, 1], [1, 0]], dtype=np.float16)],
+        )
+
+    @override_settings(RAG_COMPRESSION_MODE="off")
+    @patch("api.views.get_embedding_model")
+    def test_off_mode_returns_chunks_unchanged(self, mock_model):
+        user_index = self._user_index()
+        result = api_views._compress_context("cats", user_index.docs, user_index)
+        self.assertEqual(result, user_index.docs)
+        mock_model.assert_not_called()
+
+    @override_settings(RAG_COMPRESSION_MODE="precomputed")
+    @patch("api.views.get_embedding_model")
+    def test_precomputed_mode_needs_no_encoder_call(self, mock_model):
+        user_index = self._user_index()
+        query_vector = np.array([2.0, 0.0], dtype=np.float32)  # from hybrid_search(query_out=...)
+        result = api_views._compress_context("cats", user_index.docs, user_index, query_vector=query_vector)
+        self.assertEqual(result, ["Cats purr. Birds sing."])
+        mock_model.return_value.encode.assert_not_called()
+
+    @patch("api.management.commands.benchmark_compression.get_embedding_model")
+    @patch("api.management.commands.benchmark_compression.ensure_documents_loaded")
+    def test_benchmark_command_reports_both_modes(self, mock_loaded, mock_model):
+        from io import StringIO
+        from django.core.management import call_command
+        User.objects.create_user(username="bench_user", password="pass12345")
+        mock_loaded.return_value = self._user_index()
+        mock_model.return_value.encode.side_effect = lambda texts, **kw: np.ones((len(texts), 2), dtype=np.float32)
+        out = StringIO()
+        call_command("benchmark_compression", "--user", "bench_user", "--queries", "3", stdout=out)
+
+        self.assertIn("encode:", out.getvalue())
+        self.assertIn("precomputed:", out.getvalue())
+
+
+class IngestionPipelineTests(TestCase):
+    """Tests for cross-file batching in api/ingestion.py."""
+
+    def setUp(self):
+        self.model = MagicMock()
+        self.model.encode.side_effect = lambda texts, **kw: np.array(
+            [[1.0, 0.0] if "cat" in t else [0.0, 1.0] for t in texts], dtype=np.float32
+        )
+        self.embed = MagicMock(side_effect=_fake_embed_texts)
+
+    def _pipeline(self, user_index, **kwargs):
+        from api.ingestion import IngestionPipeline
+        return IngestionPipeline(user_index, self.model, self.embed, **kwargs)
+
+    def test_sentences_from_many_files_share_one_encoder_call(self):
+        user_index = UserIndex()
+        pipeline = self._pipeline(user_index)
+        for i in range(5):
+            pipeline.add(f"{i}.txt", {"sha256": str(i)}, "A cat sat. The cat slept. A dog ran.")
+        stats = pipeline.finish()
+
+        self.assertEqual(self.model.encode.call_count, 1)
+        self.assertEqual(len(self.model.encode.call_args[0][0]), 15)
+        self.assertEqual(self.embed.call_count, 1)
+        self.assertEqual(stats.chunks, 10)
+        self.assertEqual(user_index.index.ntotal, 10)
+        self.assertEqual(user_index.chunk_sources[:2], ["0.txt", "0.txt"])
+        self.assertEqual(len(user_index.sentence_embeddings[0]), 2)
+
+    def test_chunk_embedding_runs_in_bounded_batches(self):
+        user_index = UserIndex()
+        pipeline = self._pipeline(user_index, chunk_batch_size=2)
+        for i in range(5):
+            pipeline.add(f"{i}.txt", {}, f"Short document {i}.")
+        pipeline.finish()
+
+        self.assertEqual([len(call.args[0]) for call in self.embed.call_args_list], [2, 2, 1])
+        self.assertEqual(user_index.total_chunks, 5)
+
+    def test_large_file_is_encoded_in_windows(self):
+        user_index = UserIndex()
+        pipeline = self._pipeline(user_index, sentence_batch_size=4, max_pending_sentences=6)
+        pipeline.add("big.txt", {}, " ".join(["A cat sat.", "A dog ran."] * 5))
+        pipeline.finish()
+
+        self.assertTrue(all(len(call.args[0]) <= 4 for call in self.model.encode.call_args_list))
+        self.assertEqual(user_index.total_chunks, 10)
+
+    def test_large_file_chunks_are_embedded_in_bounded_batches(self):
+        user_index = UserIndex()
+        pipeline = self._pipeline(user_index, max_pending_sentences=4, chunk_batch_size=3, keep_sentence_embeddings=False)
+        pipeline.add("big.txt", {}, " ".join(["A cat sat.", "A dog ran."] * 4))
+        pipeline.finish()
+
+        self.assertEqual([len(call.args[0]) for call in self.embed.call_args_list], [3, 3, 2])
+        self.assertEqual(user_index.total_chunks, 8)
+        self.assertEqual(user_index.sentence_embeddings, [None] * 8)
+
+    def test_failed_files_are_left_out_of_the_manifest(self):
+        user_index = UserIndex()
+        self.embed.side_effect = [RuntimeError("encoder down"), _fake_embed_texts(["x"] * 2)]
+        pipeline = self._pipeline(user_index, max_pending_sentences=4, chunk_batch_size=3)
+        pipeline.add("big.txt", {"sha256": "big"}, " ".join(["A cat sat.", "A dog ran."] * 2 + ["A cat sat."]))
+        pipeline.add("empty.txt", {"sha256": "x"}, "   ")
+        pipeline.add("ok.txt", {"sha256": "ok"}, "A dog ran. A cat sat.")
+        stats = pipeline.finish().as_dict()
+
+        self.assertEqual(stats["failed_files"], ["big.txt", "empty.txt"])
+        self.assertEqual(set(user_index.files), {"ok.txt"})
+        self.assertEqual(set(user_index.chunk_sources), {"ok.txt"})
+        self.assertIn("chunks_per_sec", stats)
+        self.assertIn("peak_rss_mb", stats)
+
+
+class TextExtractionTests(TestCase):
+    """Tests for pooled text extraction in api/extraction.py."""
+
+    def setUp(self):
+        self.tmp_dir = os.path.join(settings.BASE_DIR, "test_extraction_tmp")
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _write_docx(self, filename, text):
+        from docx import Document as DocxDocument
+        doc = DocxDocument()
+        doc.add_paragraph(text)
+        path = os.path.join(self.tmp_dir, filename)
+        doc.save(path)
+        return path, filename
+
+    def _write_txt(self, filename, text):
+        path = os.path.join(self.tmp_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path, filename
+
+    def test_pool_yields_files_in_input_order(self):
+        from api.extraction import iter_extracted_texts
+        files = [
+            self._write_docx("a.docx", "first document"),
+            self._write_txt("b.txt", "second document"),
+            self._write_docx("c.docx", "third document"),
+        ]
+        results = list(iter_extracted_texts(files, max_workers=2))
+
+        self.assertEqual(results, [
+            ("a.docx", "first document"),
+            ("b.txt", "second document"),
+            ("c.docx", "third document"),
+        ])
+
+    def test_pool_runs_inside_daemonic_worker_processes(self):
+        # Celery's prefork children are daemonic; multiprocessing would refuse
+        # to start the pool there, so extraction must not fall back to serial.
+        import multiprocessing
+        from api.extraction import iter_extracted_texts
+        files = [self._write_docx("a.docx", "first document"), self._write_docx("b.docx", "second document")]
+        process = multiprocessing.current_process()
+        process.daemon = True
+        try:
+            with patch("api.extraction._iter_serial", side_effect=AssertionError("extracted serially")):
+                results = list(iter_extracted_texts(files, max_workers=2))
+        finally:
+            process.daemon = False
+
+        self.assertEqual(results, [("a.docx", "first document"), ("b.docx", "second document")])
+
+    def test_failed_pdf_page_range_fails_the_whole_file(self):
+        from concurrent.futures import Future
+        from api.extraction import _iter_extracted_texts
+        done, failed = Future(), Future()
+        done.set_result("page one")
+        failed.set_exception(ValueError("bad page"))
+        pool = MagicMock()
+
+        with patch("api.extraction._start_pool", return_value=pool), \
+                patch("api.extraction._submit_file", return_value=[done, failed]):
+            results = list(_iter_extracted_texts([("book.pdf", "book.pdf")], max_workers=2))
+
+        self.assertEqual(results, [("book.pdf", "")])
+
+    def test_large_pdf_is_split_into_page_ranges(self):
+        from pypdf import PdfWriter
+        from api.extraction import _extract_pdf_pages, _submit_file
+        writer = PdfWriter()
+        for _ in range(5):
+            writer.add_blank_page(width=72, height=72)
+        path = os.path.join(self.tmp_dir, "book.pdf")
+        with open(path, "wb") as f:
+            writer.write(f)
+        pool = MagicMock()
+
+        parts = _submit_file(pool, path, "book.pdf", pdf_pages_per_task=2)
+
+        self.assertEqual(len(parts), 3)
+        self.assertEqual(
+            [call.args for call in pool.submit.call_args_list],
+            [(_extract_pdf_pages, path, 0, 2), (_extract_pdf_pages, path, 2, 4), (_extract_pdf_pages, path, 4, 5)],
+        )
+
+    def test_cancellation_stops_iteration(self):
+        from api.extraction import iter_extracted_texts
+        files = [self._write_txt(f"{i}.txt", str(i)) for i in range(5)]
+        seen = []
+        for filename, _ in iter_extracted_texts(files, max_workers=1, is_cancelled=lambda: len(seen) >= 2):
+            seen.append(filename)
+
+        self.assertEqual(seen, ["0.txt", "1.txt"])
+
+    def test_unreadable_file_yields_empty_text(self):
+        from api.extraction import iter_extracted_texts
+        path = os.path.join(self.tmp_dir, "broken.docx")
+        with open(path, "wb") as f:
+            f.write(b"not a docx")
+        self.assertEqual(list(iter_extracted_texts([(path, "broken.docx")], max_workers=1)), [("broken.docx", "")])
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class ExtractedTextCacheTests(TestCase):
+    """Tests for the on-disk extracted-text cache used by ingestion and preview."""
+
+    def setUp(self):
+        from docx import Document as DocxDocument
+        self.original_doc_dir = api_views.DOC_DIR
+        self.temp_doc_dir = os.path.join(settings.BASE_DIR, "test_documents_tmp")
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+        api_views.DOC_DIR = self.temp_doc_dir
+        api_views.index_registry.clear()
+        self.user = User.objects.create_user(username="text_cache_user", password="pass12345")
+        self.user_dir = os.path.join(self.temp_doc_dir, str(self.user.id))
+        os.makedirs(self.user_dir, exist_ok=True)
+        doc = DocxDocument()
+        doc.add_paragraph("Quarterly report body.")
+        self.docx_path = os.path.join(self.user_dir, "report.docx")
+        doc.save(self.docx_path)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        from django.core.cache import cache
+        api_views.DOC_DIR = self.original_doc_dir
+        api_views.index_registry.clear()
+        shutil.rmtree(self.temp_doc_dir, ignore_errors=True)
+        # User ids are reused across tests; don't leave throttle history behind.
+        cache.clear()
+
+    def test_preview_parses_document_once(self):
+        from api import extraction
+        with patch("api.extraction.extract_text_from_file", wraps=extraction.extract_text_from_file) as mock_extract:
+            first = self.client.get("/api/documents/report.docx/")
+            second = self.client.get("/api/documents/report.docx/")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()["content"], "Quarterly report body.")
+        self.assertEqual(mock_extract.call_count, 1)
+
+    @override_settings(RAG_EXTRACTION_WORKERS=1)
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_rebuild_reuses_text_extracted_by_preview(self, _model, _embed):
+        self.client.get("/api/documents/report.docx/")
+        with patch("api.extraction.extract_text_from_file") as mock_extract:
+            user_index = api_views.load_documents(self.user, rebuild=True)
+
+        mock_extract.assert_not_called()
+        self.assertEqual(user_index.docs, ["Quarterly report body."])
+
+    @override_settings(RAG_EXTRACTION_WORKERS=1)
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_text_of_deleted_documents_is_pruned(self, _model, _embed):
+        api_views.load_documents(self.user)
+        cache_dir = os.path.join(self.user_dir, ".cache", "text")
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        os.remove(self.docx_path)
+        api_views.load_documents(self.user)
+
+        self.assertEqual(os.listdir(cache_dir), [])
+
+    @override_settings(RAG_EXTRACTION_WORKERS=1)
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_preview_of_indexed_document_skips_hashing(self, _model, _embed):
+        api_views.load_documents(self.user)
+        with patch("api.extraction.file_sha256") as mock_hash:
+            response = self.client.get("/api/documents/report.docx/")
+
+        self.assertEqual(response.json()["content"], "Quarterly report body.")
+        mock_hash.assert_not_called()
+
+    def test_prune_spares_fresh_temp_files(self):
+        from api.extraction import TextCache
+        cache_dir = os.path.join(self.user_dir, ".cache", "text")
+        os.makedirs(cache_dir)
+        for name in (".fresh.1234.tmp", ".stale.5678.tmp", "gone.v1.txt"):
+            open(os.path.join(cache_dir, name), "w").close()
+        os.utime(os.path.join(cache_dir, ".stale.5678.tmp"), (0, 0))
+
+        TextCache(cache_dir).prune([])
+
+        self.assertEqual(os.listdir(cache_dir), [".fresh.1234.tmp"])
+
+    def test_cache_entries_are_keyed_by_extractor_version(self):
+        from api.extraction import TextCache
+        cache = TextCache(os.path.join(self.user_dir, ".cache", "text"))
+        cache.put("abc", "old text")
+        with patch("api.extraction.EXTRACTOR_VERSION", 2):
+            self.assertIsNone(cache.get("abc"))
+
+
+class AnnIndexTierTests(TestCase):
+    """Tests for automatic HNSW / IVF-PQ index selection in retriever.py."""
+
+    def setUp(self):
+        self.embeddings = np.random.RandomState(0).standard_normal((10000, 16)).astype(np.float32)
+
+    @override_settings(RAG_ANN_INDEX_TYPE="auto", RAG_ANN_MIN_VECTORS=1000, RAG_ANN_IVFPQ_MIN_VECTORS=10000)
+    def test_auto_picks_tier_by_corpus_size(self):
+        from api.retriever import build_index_from_embeddings, index_type_of
+        self.assertEqual(index_type_of(build_index_from_embeddings(self.embeddings[:500])), "flat")
+        self.assertEqual(index_type_of(build_index_from_embeddings(self.embeddings[:1500])), "hnsw")
+        # Below the point count IVF-PQ training needs, it falls back to HNSW.
+        self.assertEqual(index_type_of(build_index_from_embeddings(self.embeddings[:5000], "ivfpq")), "hnsw")
+        self.assertEqual(index_type_of(build_index_from_embeddings(self.embeddings)), "ivfpq")
+
+    @override_settings(RAG_ANN_INDEX_TYPE="hnsw", RAG_ANN_HNSW_EF_SEARCH=64)
+    @patch("api.retriever.get_query_embedding_model")
+    def test_search_works_unchanged_on_hnsw(self, mock_model):
+        from api.retriever import build_index_from_embeddings, search
+        index = build_index_from_embeddings(self.embeddings[:3000])
+        docs = [f"chunk {i}" for i in range(3000)]
+        mock_model.return_value.encode.return_value = self.embeddings[42:43]
+
+        chunks, indices = search("query", docs, index, self.embeddings, top_k=3)
+
+        self.assertEqual(indices[0], 42)
+        self.assertEqual(chunks[0], "chunk 42")
+        self.assertEqual(index.hnsw.efSearch, 64)
+
+    @override_settings(RAG_ANN_INDEX_TYPE="hnsw")
+    def test_removing_files_from_hnsw_keeps_ids_aligned(self):
+        from api.retriever import build_index_from_embeddings
+        embeddings = self.embeddings[:300]
+        user_index = UserIndex(
+            docs=[f"chunk {i}" for i in range(300)],
+            chunk_sources=["a.txt"] * 100 + ["b.txt"] * 200,
+            index=build_index_from_embeddings(embeddings),
+            embeddings=embeddings,
+        )
+        user_index.remove_files({"a.txt"})
+
+        self.assertEqual(user_index.index.ntotal, 200)
+        _, indices = user_index.index.search(embeddings[150:151], 1)
+        self.assertEqual(user_index.docs[indices[0][0]], "chunk 150")
+
+    @override_settings(RAG_ANN_INDEX_TYPE="hnsw", RAG_ANN_HNSW_MAX_DELETED=0.5)
+    def test_hnsw_removals_tombstone_rows_until_compaction(self):
+        from api.index_store import load_snapshot, save_snapshot
+        from api.retriever import TombstonedIndex
+        user_index = UserIndex()
+        user_index.add_files([
+            (name, [f"chunk {i}" for i in range(start, end)], self.embeddings[start:end], {}, None)
+            for name, start, end in (("a.txt", 0, 100), ("b.txt", 100, 200), ("c.txt", 200, 400))
+        ])
+        graph = user_index.index
+
+        user_index.remove_files({"a.txt"})
+        self.assertIsInstance(user_index.index, TombstonedIndex)
+        self.assertIs(user_index.index.index, graph)
+        user_index.add_files([("d.txt", ["chunk 400"], self.embeddings[400:401], {}, None)])
+        self.assertEqual(user_index.index.ntotal, 301)
+        for row in (150, 399, 400):
+            _, positions = user_index.index.search(self.embeddings[row:row + 1], 1)
+            self.assertEqual(user_index.docs[positions[0][0]], f"chunk {row}")
+
+        base_dir = os.path.join(settings.BASE_DIR, "test_snapshots_tmp")
+        shutil.rmtree(base_dir, ignore_errors=True)
+        try:
+            save_snapshot(base_dir, user_index)
+            loaded = load_snapshot(base_dir)
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+        _, positions = loaded.index.search(self.embeddings[250:251], 1)
+        self.assertEqual(loaded.docs[positions[0][0]], "chunk 250")
+
+        # Past the deleted share the graph is rebuilt without tombstones.
+        user_index.remove_files({"b.txt", "c.txt"})
+        self.assertNotIsInstance(user_index.index, TombstonedIndex)
+        self.assertEqual(user_index.index.ntotal, 1)
+
+    @override_settings(RAG_ANN_INDEX_TYPE="ivfpq", RAG_ANN_PQ_M=4, RAG_ANN_IVF_NPROBE=32)
+    def test_ivfpq_survives_snapshot_round_trip(self):
+        from api.index_store import load_snapshot, save_snapshot
+        from api.retriever import build_index_from_embeddings, index_type_of
+        base_dir = os.path.join(settings.BASE_DIR, "test_snapshots_tmp")
+        shutil.rmtree(base_dir, ignore_errors=True)
+        try:
+            user_index = UserIndex(
+                docs=[f"chunk {i}" for i in range(len(self.embeddings))],
+                chunk_sources=["a.txt"] * len(self.embeddings),
+                index=build_index_from_embeddings(self.embeddings),
+                embeddings=self.embeddings,
+            )
+            save_snapshot(base_dir, user_index)
+            loaded = load_snapshot(base_dir)
+        finally:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+        self.assertEqual(index_type_of(loaded.index), "ivfpq")
+        self.assertEqual(loaded.index.ntotal, len(self.embeddings))
+
+    def test_benchmark_command_reports_recall(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command(
+            "benchmark_ann", "--synthetic", "10000", "--dim", "16", "--queries", "20",
+            "--ef-search", "16", "--nprobe", "8", stdout=out,
+        )
+        self.assertIn("hnsw", out.getvalue())
+        self.assertIn("ivfpq", out.getvalue())
+        self.assertIn("recall@k", out.getvalue())
+
+
+class BM25IndexTests(TestCase):
+    """Tests for the inverted-index BM25 engine in api/bm25.py."""
+
+    def setUp(self):
+        from api.retriever import bm25_tokenize
+        self.corpus = [bm25_tokenize(doc) for doc in (
+            "the cat sat on the mat",
+            "the dog chased the cat",
+            "a bird sang at dawn",
+            "the cat and the dog slept",
+            "stock prices fell sharply",
+        )]
+
+    def test_scores_match_reference_okapi(self):
+        from api.bm25 import BM25Index
+        index = BM25Index.build(self.corpus)
+        for query in (["cat"], ["the", "dog"], ["bird", "cat", "cat"], ["missing"]):
+            np.testing.assert_allclose(index.get_scores(query), _reference_bm25_scores(self.corpus, query))
+
+    def test_top_k_only_returns_matching_documents_in_score_order(self):
+        from api.bm25 import BM25Index
+        index = BM25Index.build(self.corpus)
+        positions, scores = index.top_k(["dog", "cat"], 2)
+        expected = _reference_bm25_scores(self.corpus, ["dog", "cat"])
+
+        self.assertEqual(positions, list(np.argsort(-expected, kind="stable")[:2]))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(index.top_k(["prices"], 10)[0], [4])
+        self.assertEqual(index.top_k(["unknown"], 10), ([], []))
+
+    def test_incremental_updates_match_fresh_build(self):
+        from api.bm25 import BM25Index
+        index = BM25Index.build(self.corpus[:2]).add_documents(self.corpus[2:])
+        index = index.remove_documents([1, 3])
+        remaining = [self.corpus[i] for i in (0, 2, 4)]
+
+        np.testing.assert_allclose(index.get_scores(["cat", "dawn"]), _reference_bm25_scores(remaining, ["cat", "dawn"]))
+        subset = BM25Index.build(self.corpus).subset([4, 0])
+        np.testing.assert_allclose(
+            subset.get_scores(["cat", "stock"]),
+            _reference_bm25_scores([self.corpus[4], self.corpus[0]], ["cat", "stock"]),
+        )
+
+    def test_appends_keep_a_logarithmic_number_of_segments(self):
+        from api.bm25 import BM25Index
+        corpus = self.corpus * 8
+        index = BM25Index.build(corpus[:1])
+        for i in range(1, len(corpus)):
+            index = index.add_documents(corpus[i:i + 1])
+
+        self.assertLessEqual(len(index.segments), 6)
+        for query in (["cat"], ["the", "dog"], ["prices", "dawn"]):
+            np.testing.assert_allclose(index.get_scores(query), _reference_bm25_scores(corpus, query))
+        np.testing.assert_allclose(
+            index.remove_documents([0, 7]).get_scores(["cat"]),
+            _reference_bm25_scores([doc for i, doc in enumerate(corpus) if i not in (0, 7)], ["cat"]),
+        )
+
+    def test_save_and_load_round_trip(self):
+        from api.bm25 import BM25Index
+        tmp_dir = os.path.join(settings.BASE_DIR, "test_bm25_tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            index = BM25Index.build(self.corpus[:3]).add_documents(self.corpus[3:])
+            index.save(tmp_dir)
+            loaded = BM25Index.load(tmp_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.assertEqual(loaded.top_k(["the", "cat"], 3), index.top_k(["the", "cat"], 3))
+
+
+class DenseScoreTests(TestCase):
+    """Tests for cosine-similarity dense search and the rerank skip threshold."""
+
+    def setUp(self):
+        self.embeddings = np.random.RandomState(1).standard_normal((50, 8)).astype(np.float32)
+        self.docs = [f"chunk {i}" for i in range(50)]
+
+    @patch("api.retriever.get_query_embedding_model")
+    def test_search_returns_cosine_scores(self, mock_model):
+        from api.retriever import build_index_from_embeddings, search
+        index = build_index_from_embeddings(self.embeddings)
+        mock_model.return_value.encode.return_value = self.embeddings[7:8] * 5
+
+        chunks, indices, scores = search("query", self.docs, index, self.embeddings, top_k=3, return_scores=True)
+
+        self.assertEqual(indices[0], 7)
+        self.assertAlmostEqual(scores[0], 1.0, places=5)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        unit = self.embeddings / np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        np.testing.assert_allclose(scores, unit[indices] @ unit[7], rtol=1e-5)
+
+    @patch("api.retriever.get_query_embedding_model")
+    def test_hybrid_search_keeps_raw_scores(self, mock_model):
+        from api.retriever import build_bm25_index, build_index_from_embeddings, hybrid_search
+        docs = list(self.docs)
+        docs[30] = "zebra crossing"
+        bm25_index = build_bm25_index(docs)
+        index = build_index_from_embeddings(self.embeddings)
+        mock_model.return_value.encode.return_value = self.embeddings[7:8]
+
+        query = {}
+        _, indices, hits = hybrid_search(
+            "zebra", docs, index, bm25_index, self.embeddings, top_k=2, return_hits=True, query_out=query,
+        )
+
+        self.assertIn(7, indices)
+        self.assertIn(30, indices)
+        self.assertAlmostEqual(hits[indices.index(7)]["dense_score"], 1.0, places=5)
+        self.assertIsNone(hits[indices.index(30)]["dense_score"])
+        self.assertGreater(hits[indices.index(30)]["bm25_score"], 0)
+        expected = self.embeddings[7] / np.linalg.norm(self.embeddings[7])
+        np.testing.assert_allclose(query["vector"], expected, rtol=1e-5, atol=1e-6)
+
+
+class HybridFusionTests(TestCase):
+    """Tests for score-aware fusion and confidence-gated reranking."""
+
+    def test_rrf_matches_reciprocal_rank_order(self):
+        from api.retriever import fuse_hits
+        hits = fuse_hits([(1, 0.9), (2, 0.8)], [(2, 7.0), (3, 5.0)], top_k=10, method="rrf")
+
+        self.assertEqual([hit["index"] for hit in hits], [2, 1, 3])
+        self.assertAlmostEqual(hits[0]["score"], 1 / 62 + 1 / 61)
+        self.assertEqual(hits[0]["dense_score"], 0.8)
+        self.assertEqual(hits[0]["bm25_score"], 7.0)
+
+    def test_weighted_fusion_uses_score_magnitudes(self):
+        from api.retriever import fuse_hits
+        dense = [(1, 0.95), (2, 0.30)]
+        bm25 = [(2, 4.0), (1, 3.0)]
+
+        hits = fuse_hits(dense, bm25, top_k=10, method="weighted", dense_weight=0.5)
+
+        self.assertEqual([hit["index"] for hit in hits], [1, 2])
+        self.assertAlmostEqual(hits[0]["score"], 0.5 * 0.95 + 0.5 * 0.75)
+        self.assertAlmostEqual(hits[1]["score"], 0.5 * 0.30 + 0.5 * 1.0)
+        self.assertEqual(len(fuse_hits(dense, bm25, top_k=1, method="weighted")), 1)
+
+    def test_confidence_is_top_margin_and_zero_when_methods_disagree(self):
+        from api.retriever import fuse_hits, fusion_confidence
+        clear = fuse_hits([(1, 0.9), (2, 0.2)], [(1, 8.0)], method="weighted", dense_weight=0.5)
+        self.assertAlmostEqual(fusion_confidence(clear), 0.95 - 0.1)
+
+        # RRF ranks 2 first (it is in both lists), but by score 1 wins.
+        disputed = fuse_hits([(1, 0.9), (2, 0.2)], [(3, 9.0), (2, 1.0)], method="rrf", dense_weight=0.5)
+        self.assertEqual(disputed[0]["index"], 2)
+        self.assertEqual(fusion_confidence(disputed), 0.0)
+        self.assertEqual(fusion_confidence([]), 0.0)
+
+    def _hits(self, confidence_gap):
+        from api.retriever import fuse_hits
+        return fuse_hits(
+            [(i, 0.5 - i * 0.01) for i in range(8)], [(0, 1.0), (1, 1.0 - confidence_gap * 2)],
+            method="weighted", dense_weight=0.5,
+        )
+
+    @override_settings(RAG_RERANK_SKIP_CONFIDENCE=0.3, RAG_RERANK_SHRINK_CONFIDENCE=0.1, RAG_RERANK_SHRINK_CANDIDATES=5)
+    @patch("api.views.rerank", return_value=[])
+    def test_rerank_is_skipped_shrunk_or_full_by_confidence(self, mock_rerank):
+        chunks = [f"c{i}" for i in range(8)]
+
+        skipped = api_views._rerank_by_confidence("q", chunks, self._hits(0.5), top_k=3)
+        mock_rerank.assert_not_called()
+        self.assertEqual([r["chunk"] for r in skipped], ["c0", "c1", "c2"])
+
+        api_views._rerank_by_confidence("q", chunks, self._hits(0.15), top_k=3)
+        mock_rerank.assert_called_once_with("q", chunks[:5], top_k=3, cache_scope=None)
+
+        mock_rerank.reset_mock()
+        api_views._rerank_by_confidence("q", chunks, self._hits(0.0), top_k=3)
+        mock_rerank.assert_called_once_with("q", chunks, top_k=3, cache_scope=None)
+
+    @override_settings(RAG_RERANK_SKIP_DENSE_SCORE=0.8)
+    @patch("api.views.rerank")
+    def test_decisive_dense_hit_skips_rerank(self, mock_rerank):
+        from api.retriever import fuse_hits
+        hits = fuse_hits([(0, 0.91), (2, 0.4), (3, 0.3)], [(1, 2.0)], method="rrf")
+
+        reranked = api_views._rerank_by_confidence("q", ["a", "b", "c", "d"], hits, top_k=3)
+
+        mock_rerank.assert_not_called()
+        self.assertEqual([r["chunk"] for r in reranked], ["a", "b", "c"])
+        self.assertEqual([r["index"] for r in reranked], [0, 1, 2])
+
+    @override_settings(RAG_RERANK_SKIP_DENSE_SCORE=0.0, RAG_RERANK_SKIP_CONFIDENCE=0.0, RAG_RERANK_SHRINK_CONFIDENCE=0.0)
+    @patch("api.views.rerank", return_value=[])
+    def test_disabled_thresholds_always_rerank_everything(self, mock_rerank):
+        from api.retriever import fuse_hits
+        hits = fuse_hits([(0, 0.99)], [(0, 3.0)], method="weighted")
+
+        api_views._rerank_by_confidence("q", ["a"], hits, top_k=3)
+
+        mock_rerank.assert_called_once_with("q", ["a"], top_k=3, cache_scope=None)
+
+
+class RerankCacheTests(TestCase):
+    """Tests for the cross-encoder score cache in api/rerank_cache.py."""
+
+    def setUp(self):
+        from api.rerank_cache import RerankCache
+        self.cache = RerankCache(max_entries=100)
+        patcher = patch("api.retriever.get_rerank_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("api.retriever.get_reranker")
+    def test_repeated_question_skips_the_cross_encoder(self, mock_reranker):
+        from api.retriever import rerank
+        mock_reranker.return_value.predict.side_effect = lambda pairs: np.arange(len(pairs), dtype=np.float32)
+
+        first = rerank("What is RAG?", ["a", "b", "c"], top_k=2, cache_scope=1)
+        second = rerank("  what is   rag? ", ["a", "b", "c"], top_k=2, cache_scope=1)
+
+        self.assertEqual(mock_reranker.return_value.predict.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual([r["chunk"] for r in first], ["c", "b"])
+        self.assertEqual(self.cache.stats()["hits"], 3)
+
+    @patch("api.retriever.get_reranker")
+    def test_only_unseen_chunks_are_scored(self, mock_reranker):
+        from api.retriever import rerank
+        mock_reranker.return_value.predict.side_effect = lambda pairs: np.array(
+            [len(chunk) for _, chunk in pairs], dtype=np.float32
+        )
+        rerank("q", ["aa", "b"], cache_scope=1)
+
+        reranked = rerank("q", ["b", "cccc", "aa"], top_k=3, cache_scope=1)
+
+        self.assertEqual(mock_reranker.return_value.predict.call_args[0][0], [["q", "cccc"]])
+        self.assertEqual([(r["chunk"], r["score"]) for r in reranked], [("cccc", 4.0), ("aa", 2.0), ("b", 1.0)])
+
+    @patch("api.retriever.get_reranker")
+    def test_scopes_are_isolated_and_uncached_calls_bypass(self, mock_reranker):
+        from api.retriever import rerank
+        mock_reranker.return_value.predict.side_effect = lambda pairs: np.zeros(len(pairs), dtype=np.float32)
+        rerank("q", ["a"], cache_scope=1)
+        rerank("q", ["a"], cache_scope=2)
+        rerank("q", ["a"])
+
+        self.assertEqual(mock_reranker.return_value.predict.call_count, 3)
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_lru_bound_and_user_invalidation(self):
+        from api.rerank_cache import RerankCache
+        cache = RerankCache(max_entries=2)
+        cache.put_many(1, "q", ["a", "b"], [1.0, 2.0])
+        cache.get_many(1, "q", ["a"])
+        cache.put_many(2, "q", ["c"], [3.0])
+
+        self.assertEqual(cache.get_many(1, "q", ["a", "b"]), {0: 1.0})
+        cache.invalidate_user(1)
+        self.assertEqual(cache.get_many(1, "q", ["a"]), {})
+        self.assertEqual(cache.get_many(2, "q", ["c"]), {0: 3.0})
+
+    @patch("api.views.embed_texts", side_effect=_fake_embed_texts)
+    @patch("api.views.get_embedding_model")
+    def test_rebuild_invalidates_the_users_scores(self, _mock_model, _mock_embed):
+        user = User.objects.create_user(username="rerank-cache-user", password="testpass123")
+        self.cache.put_many(user.id, "q", ["a"], [1.0])
+        self.cache.put_many(user.id + 1, "q", ["a"], [1.0])
+        tmp_dir = os.path.join(settings.BASE_DIR, "test_rerank_cache_docs")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            with patch("api.views.DOC_DIR", tmp_dir), patch("api.views.get_rerank_cache", return_value=self.cache):
+                api_views.load_documents(user)
+                self.assertEqual(self.cache.stats()["entries"], 2)
+                api_views.load_documents(user, rebuild=True)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.assertEqual(self.cache.get_many(user.id, "q", ["a"]), {})
+        self.assertEqual(self.cache.get_many(user.id + 1, "q", ["a"]), {0: 1.0})
+
+
+class MicroBatchingTests(TestCase):
+    """Tests for the micro-batching scheduler in api/batching.py."""
+
+    def _concurrently(self, fn, args):
+        import threading
+        results = [None] * len(args)
+        errors = []
+        barrier = threading.Barrier(len(args))
+
+        def call(i):
+            barrier.wait()
+            try:
+                results[i] = fn(args[i])
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(args))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_share_a_batch_and_get_their_own_results(self):
+        from api.batching import MicroBatcher
+        batches = []
+
+        def run_batch(items):
+            batches.append(list(items))
+            return np.array([item * 10 for item in items])
+
+        batcher = MicroBatcher(run_batch, max_batch_size=64, max_wait_ms=200)
+        results, errors = self._concurrently(batcher.submit, [[i, i + 100] for i in range(8)])
+
+        self.assertEqual(errors, [])
+        self.assertEqual([r.tolist() for r in results], [[i * 10, (i + 100) * 10] for i in range(8)])
+        self.assertLess(len(batches), 8)
+        self.assertEqual(batcher.stats()["calls"], 8)
+
+    def test_large_calls_bypass_the_queue(self):
+        from api.batching import MicroBatcher
+        batcher = MicroBatcher(lambda items: np.array(items), max_batch_size=4, max_wait_ms=200)
+
+        self.assertEqual(batcher.submit([1, 2, 3, 4, 5]).tolist(), [1, 2, 3, 4, 5])
+        self.assertIsNone(batcher._thread)
+
+    def test_batch_errors_reach_every_caller(self):
+        from api.batching import MicroBatcher
+
+        def run_batch(items):
+            raise RuntimeError("model failed")
+
+        batcher = MicroBatcher(run_batch, max_batch_size=64, max_wait_ms=50)
+        _, errors = self._concurrently(batcher.submit, [["a"], ["b"], ["c"]])
+
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(exc, RuntimeError) for exc in errors))
+
+    def test_batched_model_wrappers_keep_call_shapes(self):
+        from api.batching import BatchedEmbeddingModel, BatchedReranker
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), 4), dtype=np.float32)
+        reranker = MagicMock()
+        reranker.predict.side_effect = lambda pairs, **kwargs: np.arange(len(pairs), dtype=np.float32)
+        batched_model = BatchedEmbeddingModel(model, max_batch_size=8, max_wait_ms=1)
+        batched_reranker = BatchedReranker(reranker, max_batch_size=8, max_wait_ms=1)
+
+        self.assertEqual(batched_model.encode("query").shape, (4,))
+        self.assertEqual(batched_model.encode(["a", "b"], show_progress_bar=False).shape, (2, 4))
+        self.assertEqual(batched_reranker.predict([("q", "a"), ("q", "b")]).tolist(), [0.0, 1.0])
+
+        # Output-changing arguments go straight to the model.
+        batched_model.encode(["a"], normalize_embeddings=True)
+        model.encode.assert_called_with(["a"], normalize_embeddings=True)
+
+
+class InferenceServerTests(TestCase):
+    """Tests for the shared model server and its clients in api/inference.py."""
+
+    def setUp(self):
+        import threading
+        from api.inference import make_server
+        self.embedding_model = MagicMock()
+        self.embedding_model.encode.side_effect = lambda texts: np.array(
+            [[len(text), 1.0, 2.0] for text in texts], dtype=np.float32
+        )
+        self.reranker = MagicMock()
+        self.reranker.predict.side_effect = lambda pairs: np.array([len(c) for _, c in pairs], dtype=np.float32)
+        self.server = make_server("127.0.0.1", 0, self.embedding_model, self.reranker)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_remote_clients_match_local_call_shapes(self):
+        from api.inference import RemoteEmbeddingModel, RemoteReranker
+        model = RemoteEmbeddingModel(self.url)
+        reranker = RemoteReranker(self.url)
+
+        np.testing.assert_array_equal(model.encode(["ab", "abcd"]), [[2, 1, 2], [4, 1, 2]])
+        np.testing.assert_array_equal(model.encode("abc", show_progress_bar=False), [3, 1, 2])
+        np.testing.assert_array_equal(reranker.predict([("q", "a"), ("q", "abc")]), [1.0, 3.0])
+        self.assertEqual(reranker.predict([]).tolist(), [])
+
+    def test_unreachable_server_falls_back_or_raises(self):
+        from api.inference import InferenceServiceError, RemoteEmbeddingModel
+        url = self.url
+        self.server.shutdown()
+        self.server.server_close()
+        local = MagicMock()
+        local.encode.return_value = np.zeros((1, 3), dtype=np.float32)
+
+        model = RemoteEmbeddingModel(url, timeout=2, fallback=lambda: local)
+        self.assertEqual(model.encode(["a"]).shape, (1, 3))
+        self.assertEqual(model.encode(["b"]).shape, (1, 3))
+        local.encode.assert_called_with(["b"])
+        with self.assertRaises(InferenceServiceError):
+            RemoteEmbeddingModel(url, timeout=2).encode(["a"])
+
+    def test_configured_url_replaces_in_process_models(self):
+        import api.retriever as retriever
+        from api.inference import RemoteEmbeddingModel, RemoteReranker
+        with override_settings(RAG_INFERENCE_URL=self.url, RAG_EMBEDDING_CACHE_PATH=""), \
+                patch.object(retriever, "_model", None), patch.object(retriever, "_reranker", None), \
+                patch.object(retriever, "_embedding_cache", None), \
+                patch("api.retriever.load_embedding_model") as mock_load:
+            model = retriever.get_embedding_model()
+            reranker = retriever.get_reranker()
+            vectors = retriever.embed_texts(["abc"])
+
+        mock_load.assert_not_called()
+        self.assertIsInstance(model, RemoteEmbeddingModel)
+        self.assertIsInstance(reranker, RemoteReranker)
+        self.assertEqual(vectors.shape, (1, 3))
+
+
+class OnnxBackendTests(TestCase):
+    """Tests for the ONNX Runtime model backend in api/onnx_backend.py."""
+
+    def setUp(self):
+        self.export_root = os.path.join(settings.BASE_DIR, "test_onnx_tmp")
+        shutil.rmtree(self.export_root, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.export_root, ignore_errors=True)
+
+    def _fake_model_class(self):
+        def save_pretrained(path):
+            os.makedirs(os.path.join(path, "onnx"), exist_ok=True)
+            open(os.path.join(path, "onnx", "model.onnx"), "w").close()
+
+        model_class = MagicMock()
+        model_class.return_value.save_pretrained.side_effect = save_pretrained
+        return model_class
+
+    def _fake_quantize(self, model, config, path):
+        open(os.path.join(path, "onnx", f"model_qint8_{config}.onnx"), "w").close()
+
+    def test_int8_model_is_exported_once_and_loaded_from_disk(self):
+        from api.onnx_backend import load_onnx_model
+        model_class = self._fake_model_class()
+        with patch("sentence_transformers.export_dynamic_quantized_onnx_model", side_effect=self._fake_quantize) as quantize:
+            load_onnx_model(model_class, "org/model", "onnx-int8", self.export_root, "avx2")
+            load_onnx_model(model_class, "org/model", "onnx-int8", self.export_root, "avx2")
+
+        target = os.path.join(self.export_root, "org--model")
+        self.assertEqual(quantize.call_count, 1)
+        self.assertTrue(os.path.exists(os.path.join(target, "onnx", "model_qint8_avx2.onnx")))
+        model_class.assert_any_call("org/model", backend="onnx")
+        model_class.assert_called_with(
+            target, backend="onnx", model_kwargs={"file_name": "onnx/model_qint8_avx2.onnx"}
+        )
+        self.assertEqual([n for n in os.listdir(self.export_root) if n.endswith(".tmp")], [])
+
+    def test_quantized_variant_is_added_to_an_existing_export(self):
+        from api.onnx_backend import load_onnx_model
+        model_class = self._fake_model_class()
+        load_onnx_model(model_class, "org/model", "onnx", self.export_root)
+        with patch("sentence_transformers.export_dynamic_quantized_onnx_model", side_effect=self._fake_quantize):
+            load_onnx_model(model_class, "org/model", "onnx-int8", self.export_root, "avx512_vnni")
+
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.export_root, "org--model", "onnx"))),
+            ["model.onnx", "model_qint8_avx512_vnni.onnx"],
+        )
+
+    def test_unknown_backend_is_rejected(self):
+        from api.onnx_backend import load_onnx_model
+        with self.assertRaises(ValueError):
+            load_onnx_model(MagicMock(), "org/model", "tensorrt", self.export_root)
+
+    def test_backend_setting_selects_loader_and_cache_namespace(self):
+        from api.retriever import EMBEDDING_MODEL_NAME, embedding_cache_model_name, load_embedding_model
+        with override_settings(RAG_INFERENCE_BACKEND="torch"), \
+                patch("sentence_transformers.SentenceTransformer") as model_class:
+            load_embedding_model()
+        model_class.assert_called_once_with(EMBEDDING_MODEL_NAME)
+
+        with override_settings(RAG_INFERENCE_BACKEND="onnx-int8", RAG_ONNX_MODEL_DIR=self.export_root), \
+                patch("api.onnx_backend.load_onnx_model") as load_onnx:
+            load_embedding_model()
+            self.assertEqual(embedding_cache_model_name(), f"{EMBEDDING_MODEL_NAME}@onnx-int8")
+        self.assertEqual(load_onnx.call_args[0][2], "onnx-int8")
+        self.assertEqual(load_onnx.call_args[1]["export_root"], self.export_root)
+        self.assertEqual(embedding_cache_model_name("torch"), EMBEDDING_MODEL_NAME)
+
+
+class WarmupReadinessTests(TestCase):
+    """Tests for model warmup and the readiness endpoint."""
+
+    def setUp(self):
+        import api.warmup as warmup
+        self.warmup = warmup
+        saved_state, saved_thread = dict(warmup._state), warmup._thread
+        warmup._thread = None
+        warmup._state.update(
+            status="not_started", attempts=0, embedding_model=False, reranker=False, user_indexes=0, error=None,
+        )
+
+        def restore():
+            warmup._state.clear()
+            warmup._state.update(saved_state)
+            warmup._thread = saved_thread
+        self.addCleanup(restore)
+
+    @override_settings(RAG_WARMUP_ON_START=False)
+    def test_ready_without_warmup(self):
+        response = APIClient().get("/api/ready/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["warmup"]["enabled"])
+        self.assertIsNone(self.warmup.start_warmup())
+
+    @override_settings(RAG_WARMUP_ON_START=True)
+    @patch("api.retriever.get_reranker")
+    @patch("api.retriever.get_embedding_model")
+    def test_not_ready_until_warmup_has_run(self, mock_model, mock_reranker):
+        self.assertEqual(APIClient().get("/api/ready/").status_code, 503)
+
+        thread = self.warmup.start_warmup()
+        thread.join(timeout=10)
+        self.assertIs(self.warmup.start_warmup(), thread)
+
+        response = APIClient().get("/api/ready/")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertTrue(body["warmup"]["embedding_model"])
+        self.assertTrue(body["warmup"]["reranker"])
+        self.assertIn("entries", body["index_registry"])
+        mock_model.return_value.encode.assert_called_once()
+        mock_reranker.return_value.predict.assert_called_once()
+
+    @override_settings(RAG_WARMUP_ON_START=True, RAG_WARMUP_ATTEMPTS=3, RAG_WARMUP_RETRY_SECONDS=0)
+    @patch("api.retriever.get_reranker")
+    @patch("api.retriever.get_embedding_model")
+    def test_failed_warmup_is_retried(self, _mock_model, mock_reranker):
+        mock_reranker.side_effect = [OSError("model download failed"), mock_reranker.return_value]
+
+        self.warmup.warm_up()
+
+        body = APIClient().get("/api/ready/").json()
+        self.assertTrue(body["ready"])
+        self.assertEqual(body["warmup"]["status"], "done")
+        self.assertEqual(body["warmup"]["attempts"], 2)
+        self.assertIsNone(body["warmup"]["error"])
+
+    @override_settings(RAG_WARMUP_ON_START=True, RAG_WARMUP_ATTEMPTS=2, RAG_WARMUP_RETRY_SECONDS=0)
+    @patch("api.retriever.get_reranker", side_effect=OSError("model download failed"))
+    @patch("api.retriever.get_embedding_model")
+    def test_warmup_falls_back_to_lazy_loading_after_retries(self, _mock_model, mock_reranker):
+        self.warmup.warm_up()
+
+        response = APIClient().get("/api/ready/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["warmup"]["status"], "failed")
+        self.assertIn("model download failed", response.json()["warmup"]["error"])
+        self.assertEqual(mock_reranker.call_count, 2)
+
+    @override_settings(RAG_WARMUP_ON_START=True, RAG_WARMUP_USER_INDEXES=1)
+    @patch("api.views.load_published_index", return_value=True)
+    @patch("api.retriever.get_reranker")
+    @patch("api.retriever.get_embedding_model")
+    def test_warmup_preloads_recent_user_indexes(self, _mock_model, _mock_reranker, mock_loaded):
+        from datetime import timedelta
+        from django.utils import timezone
+        User.objects.create_user(username="old-user", password="testpass123", last_login=timezone.now() - timedelta(days=2))
+        recent = User.objects.create_user(username="recent-user", password="testpass123", last_login=timezone.now())
+
+        self.warmup.warm_up()
+
+        mock_loaded.assert_called_once_with(recent)
+        self.assertEqual(self.warmup.readiness()[1]["warmup"]["user_indexes"], 1)
+
+    @override_settings(RAG_WARMUP_ON_START=True, RAG_WARMUP_USER_INDEXES=1)
+    @patch("api.views.load_documents")
+    @patch("api.retriever.get_reranker")
+    @patch("api.retriever.get_embedding_model")
+    def test_warmup_does_not_ingest_users_without_a_snapshot(self, _mock_model, _mock_reranker, mock_load_documents):
+        from django.utils import timezone
+        User.objects.create_user(username="fresh-user", password="testpass123", last_login=timezone.now())
+
+        self.warmup.warm_up()
+
+        mock_load_documents.assert_not_called()
+        self.assertEqual(self.warmup.readiness()[1]["warmup"]["user_indexes"], 0)
+
+
+class ImportCostTests(TestCase):
+    def test_api_modules_do_not_import_heavy_libraries(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command("benchmark_imports", "--modules", "api.auth_views", "api.urls", "--top", "3", "--check", stdout=out)
+        self.assertIn("api.auth_views:", out.getvalue())
+        self.assertEqual(out.getvalue().count("heavy libraries loaded: none"), 2)
+
+    def test_parse_importtime_skips_setup_and_reads_depth(self):
+        from api.management.commands.benchmark_imports import _MARKER, parse_importtime
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       500 |        500 | django",
+            _MARKER,
+            "import time:       120 |        120 |   api.bm25",
+            "import time:        40 |        160 | api.retriever",
+        ])
+        self.assertEqual(parse_importtime(stderr), [("api.bm25", 120, 120, 1), ("api.retriever", 40, 160, 0)])
+
+    def test_auth_endpoints_are_served_from_auth_views(self):
+        from django.urls import resolve
+        from api import auth_views
+        self.assertIs(resolve("/api/sign-in/").func.view_class, auth_views.SignInView)
+        self.assertIs(resolve("/api/account/delete/").func.view_class, auth_views.DeleteAccountView)
+
+
+class LLMClientPoolTests(TestCase):
+    def setUp(self):
+        from api import generator
+        self.generator = generator
+        self._saved_pool = generator._client_pool
+        generator._client_pool = None
+
+    def tearDown(self):
+        self.generator._client_pool = self._saved_pool
+
+    def test_pool_reuses_clients_per_provider_endpoint_and_key(self):
+        from api.llm_clients import ClientPool
+        pool = ClientPool(max_clients=4)
+        factory = MagicMock(side_effect=lambda: object())
+
+        first = pool.get("openai-compatible", "https://a", "key-1", factory)
+        self.assertIs(pool.get("openai-compatible", "https://a", "key-1", factory), first)
+        self.assertIsNot(pool.get("openai-compatible", "https://a", "key-2", factory), first)
+        self.assertIsNot(pool.get("openai-compatible", "https://b", "key-1", factory), first)
+
+        self.assertEqual(factory.call_count, 3)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertNotIn("key-1", repr(list(pool._entries)))
+
+    def test_pool_is_bounded_and_drops_idle_clients(self):
+        from api.llm_clients import ClientPool
+        now = [0.0]
+        pool = ClientPool(max_clients=2, idle_seconds=60, clock=lambda: now[0])
+        factory = MagicMock(side_effect=lambda: object())
+
+        pool.get("anthropic", None, "k1", factory)
+        pool.get("anthropic", None, "k2", factory)
+        pool.get("anthropic", None, "k3", factory)
+        self.assertEqual(pool.stats()["clients"], 2)
+        self.assertEqual(pool.stats()["evictions"], 1)
+
+        now[0] = 30.0
+        pool.get("anthropic", None, "k3", factory)
+        now[0] = 75.0
+        # k2 was last used at 0s and has expired; k3 (used at 30s) is kept.
+        pool.get("anthropic", None, "k3", factory)
+        self.assertEqual(pool.stats()["clients"], 1)
+        self.assertEqual(factory.call_count, 3)
+
+    @patch("api.generator.requests.Session")
+    def test_anthropic_requests_share_one_session(self, mock_session_class):
+        session = mock_session_class.return_value
+        session.headers = {}
+        session.post.return_value = SimpleNamespace(
+            status_code=200,
+            json=lambda: {"content": [{"type": "text", "text": "Pooled answer."}]},
+        )
+
+        for _ in range(2):
+            self.assertEqual(
+                self.generator._generate_with_anthropic("prompt", "sk-ant-test", "claude-test"),
+                "Pooled answer.",
+            )
+
+        mock_session_class.assert_called_once()
+        self.assertEqual(session.post.call_count, 2)
+        self.assertEqual(session.headers["x-api-key"], "sk-ant-test")
+
+    @patch("openai.OpenAI")
+    def test_openai_compatible_clients_are_reused_per_key(self, mock_openai):
+        mock_openai.return_value.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Hi."))]
+        )
+
+        self.generator._generate_with_openai_compatible("p", "key-a", "m", "https://api.example/v1")
+        self.generator._generate_with_openai_compatible("p", "key-a", "m", "https://api.example/v1")
+        self.generator._generate_with_openai_compatible("p", "key-b", "m", "https://api.example/v1")
+
+        self.assertEqual(mock_openai.call_count, 2)
+        self.assertEqual(self.generator.get_client_pool().stats()["hits"], 1)
+
+    @override_settings(RAG_LLM_CLIENT_POOL_SIZE=0)
+    @patch("openai.OpenAI")
+    def test_disabled_pool_builds_a_client_per_call(self, mock_openai):
+        mock_openai.return_value.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Hi."))]
+        )
+
+        self.generator._generate_with_openai_compatible("p", "key-a", "m", "https://api.example/v1")
+        self.generator._generate_with_openai_compatible("p", "key-a", "m", "https://api.example/v1")
+
+        self.assertIsNone(self.generator.get_client_pool())
+        self.assertEqual(mock_openai.call_count, 2)
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class AnswerCacheTests(TestCase):
+    """Tests for the exact-match answer cache in api/answer_cache.py."""
+
+    def setUp(self):
+        from api.answer_cache import AnswerCache
+        from api.encryption import encrypt_value
+        from api.llm_catalog import PROVIDER_MODELS
+        from api.models import UserProfile
+        self.cache = AnswerCache(max_entries=10, ttl_seconds=60)
+        patcher = patch("api.views.get_answer_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username="answer_cache_user", password="pass12345")
+        UserProfile.objects.update_or_create(user=self.user, defaults={
+            "llm_provider": "openai",
+            "llm_model": PROVIDER_MODELS["openai"][0],
+            "llm_api_key": encrypt_value("sk-test"),
+        })
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.user)
+
+    def _index(self, fingerprint):
+        return UserIndex(docs=["chunk a"], chunk_sources=["a.txt"], index=SimpleNamespace(ntotal=1), fingerprint=fingerprint)
+
+    def test_entries_expire_and_are_dropped_per_user(self):
+        from api.answer_cache import AnswerCache, answer_cache_key
+        now = [0.0]
+        cache = AnswerCache(ttl_seconds=60, clock=lambda: now[0])
+        key = answer_cache_key("ask", 1, "v1", "  What is RAG? ", "openai", "m")
+        self.assertEqual(key, answer_cache_key("ask", 1, "v1", "what is rag?", "openai", "m"))
+        self.assertNotEqual(key, answer_cache_key("ask", 1, "v1", "what is rag?", "openai", "m", [{"question": "q", "answer": "a"}]))
+
+        cache.put(key, {"answer": "A"}, generation_seconds=1.5)
+        cache.put(answer_cache_key("ask", 2, "v1", "q", "openai", "m"), {"answer": "B"})
+        self.assertEqual(cache.get(key), {"answer": "A"})
+        cache.invalidate_user(2)
+        self.assertEqual(cache.stats()["entries"], 1)
+        now[0] = 61.0
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()["saved_provider_seconds"], 1.5)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+    @patch("api.views.generate_answer", return_value="Cached answer [1].")
+    @patch("api.views._compress_context", return_value=None)
+    @patch("api.views._rerank_by_confidence", return_value=[{"chunk": "chunk a", "index": 0}])
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0], []))
+    @patch("api.views.ensure_documents_loaded")
+    def test_repeated_ask_skips_retrieval_and_generation(self, mock_loaded, mock_search, _rerank, _compress, mock_generate):
+        mock_loaded.return_value = self._index("v1")
+
+        first = self.api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json")
+        second = self.api_client.post("/api/ask/", {"question": "what is  rag?"}, format="json")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.json()["cached"])
+        self.assertTrue(second.json()["cached"])
+        self.assertEqual(second.json()["answer"], "Cached answer [1].")
+        self.assertEqual(second.json()["sources"], ["a.txt"])
+        mock_search.assert_called_once()
+        mock_generate.assert_called_once()
+
+        # A new index version (after ingestion) no longer matches.
+        mock_loaded.return_value = self._index("v2")
+        third = self.api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json")
+        self.assertFalse(third.json()["cached"])
+        self.assertEqual(mock_generate.call_count, 2)
+
+    @patch("api.views.generate_answer", return_value="Cached answer [1].")
+    @patch("api.views._compress_context", return_value=None)
+    @patch("api.views._rerank_by_confidence", return_value=[{"chunk": "chunk a", "index": 0}])
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0], []))
+    @patch("api.views.ensure_documents_loaded")
+    def test_cached_ask_still_rejects_an_invalid_model(self, mock_loaded, _search, _rerank, _compress, _generate):
+        from api.models import UserProfile
+        mock_loaded.return_value = self._index("v1")
+        self.assertEqual(self.api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json").status_code, 200)
+        UserProfile.objects.filter(user=self.user).update(llm_model="retired-model")
+
+        response = self.api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("not valid", response.json()["error"])
+
+    @patch("api.views.generate_answer", return_value="Chat answer.")
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0]))
+    @patch("api.views.ensure_documents_loaded")
+    def test_chat_hit_is_saved_to_the_conversation(self, mock_loaded, mock_search, mock_generate):
+        mock_loaded.return_value = self._index("v1")
+
+        first = self.api_client.post("/api/chat/", {"question": "What is RAG?"}, format="json")
+        second = self.api_client.post("/api/chat/", {"question": "What is RAG?"}, format="json")
+        # Same question inside the first conversation: different history, so a miss.
+        follow_up = self.api_client.post(
+            "/api/chat/", {"question": "What is RAG?", "conversation_id": first.json()["conversation_id"]}, format="json"
+        )
+
+        self.assertTrue(second.json()["cached"])
+        self.assertFalse(follow_up.json()["cached"])
+        self.assertEqual(mock_generate.call_count, 2)
+        self.assertEqual(mock_search.call_count, 2)
+        cached_message = ChatMessage.objects.get(id=second.json()["id"])
+        self.assertEqual(cached_message.answer, "Chat answer.")
+        self.assertEqual(cached_message.chunks, ["chunk a"])
+
+    @patch("api.views.generate_answer", return_value="Answer.")
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0]))
+    @patch("api.views.ensure_documents_loaded")
+    def test_unversioned_index_is_not_cached(self, mock_loaded, _mock_search, mock_generate):
+        mock_loaded.return_value = self._index(None)
+
+        self.api_client.post("/api/chat/", {"question": "What is RAG?"}, format="json")
+        self.api_client.post("/api/chat/", {"question": "What is RAG?"}, format="json")
+
+        self.assertEqual(mock_generate.call_count, 2)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE)
+class SemanticAnswerCacheTests(TestCase):
+    """Tests for the paraphrase-level answer cache in api/semantic_cache.py."""
+
+    def setUp(self):
+        from api.semantic_cache import SemanticAnswerCache
+        self.cache = SemanticAnswerCache(["ask"], threshold=0.9, min_overlap=0.5, max_entries_per_user=2)
+
+    def _vector(self, *values):
+        vector = np.asarray(values, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def test_hit_needs_similar_query_overlapping_chunks_and_same_variant(self):
+        self.cache.add(1, "v1", ("ask", "openai", "m", ""), self._vector(1, 0, 0), [1, 2, 3], {"answer": "A"}, 2.0)
+
+        paraphrase = self._vector(1, 0.1, 0)
+        self.assertEqual(self.cache.lookup(1, "v1", ("ask", "openai", "m", ""), paraphrase, [1, 2, 4]), {"answer": "A"})
+        self.assertIsNone(self.cache.lookup(1, "v1", ("ask", "openai", "m", ""), paraphrase, [7, 8, 9]))
+        self.assertIsNone(self.cache.lookup(1, "v1", ("ask", "openai", "other", ""), paraphrase, [1, 2, 3]))
+        self.assertIsNone(self.cache.lookup(1, "v1", ("ask", "openai", "m", ""), self._vector(0, 1, 0), [1, 2, 3]))
+        self.assertIsNone(self.cache.lookup(2, "v1", ("ask", "openai", "m", ""), paraphrase, [1, 2, 3]))
+        self.assertEqual(self.cache.stats()["saved_provider_seconds"], 2.0)
+
+        # Other index versions (collections) have buckets of their own.
+        self.assertIsNone(self.cache.lookup(1, "v2", ("ask", "openai", "m", ""), paraphrase, [1, 2, 3]))
+        self.cache.add(1, "v2", ("ask", "openai", "m", ""), self._vector(0, 0, 1), [5], {"answer": "B"})
+        self.assertEqual(self.cache.lookup(1, "v1", ("ask", "openai", "m", ""), paraphrase, [1, 2, 4]), {"answer": "A"})
+        self.assertEqual(self.cache.stats()["buckets"], 2)
+        self.cache.invalidate_user(1)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_entries_per_user_are_bounded(self):
+        variant = ("ask", "openai", "m", "")
+        for position, vector in enumerate([self._vector(1, 0, 0), self._vector(0, 1, 0), self._vector(0, 0, 1)]):
+            self.cache.add(1, "v1", variant, vector, [position], {"answer": str(position)})
+
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertIsNone(self.cache.lookup(1, "v1", variant, self._vector(1, 0, 0), [0]))
+        self.assertEqual(self.cache.lookup(1, "v1", variant, self._vector(0, 0, 1), [2]), {"answer": "2"})
+
+    @patch("api.views.embed_query", side_effect=lambda query: np.ones(8, dtype=np.float32) / np.sqrt(8))
+    @patch("api.views.generate_answer", return_value="Semantic answer.")
+    @patch("api.views._compress_context", return_value=None)
+    @patch("api.views._rerank_by_confidence", return_value=[{"chunk": "chunk a", "index": 0}])
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0], []))
+    @patch("api.views.ensure_documents_loaded")
+    def test_paraphrase_skips_generation_only_on_enabled_endpoints(self, mock_loaded, _search, _rerank, _compress, mock_generate, _embed):
+        from api.encryption import encrypt_value
+        from api.llm_catalog import PROVIDER_MODELS
+        from api.models import UserProfile
+        user = User.objects.create_user(username="semantic_user", password="pass12345")
+        UserProfile.objects.update_or_create(user=user, defaults={
+            "llm_provider": "openai", "llm_model": PROVIDER_MODELS["openai"][0], "llm_api_key": encrypt_value("sk-test"),
+        })
+        mock_loaded.return_value = UserIndex(docs=["chunk a"], chunk_sources=["a.txt"], index=SimpleNamespace(ntotal=1), fingerprint="v1")
+        api_client = APIClient()
+        api_client.force_authenticate(user=user)
+
+        with patch("api.views.get_semantic_cache", return_value=self.cache), patch("api.views.get_answer_cache", return_value=None):
+            first = api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json")
+            paraphrase = api_client.post("/api/ask/", {"question": "Explain what RAG means"}, format="json")
+            _search.return_value = (["chunk a"], [0])
+            api_client.post("/api/chat/", {"question": "What is RAG?"}, format="json")
+            api_client.post("/api/chat/", {"question": "Explain what RAG means"}, format="json")
+
+        self.assertFalse(first.json()["cached"])
+        self.assertTrue(paraphrase.json()["cached"])
+        self.assertEqual(paraphrase.json()["answer"], "Semantic answer.")
+        # One generation for /api/ask/, two for /api/chat/, where the cache is off.
+        self.assertEqual(mock_generate.call_count, 3)
+
+
+    @patch("api.views.embed_query")
+    @patch("api.views.generate_answer", return_value="Semantic answer.")
+    @patch("api.views._compress_context", return_value=None)
+    @patch("api.views._rerank_by_confidence", return_value=[{"chunk": "chunk a", "index": 0}])
+    @patch("api.views.hybrid_search")
+    @patch("api.views.ensure_documents_loaded")
+    def test_probe_reuses_the_query_vector_from_retrieval(self, mock_loaded, mock_search, _rerank, _compress, _generate, mock_embed):
+        from api.encryption import encrypt_value
+        from api.llm_catalog import PROVIDER_MODELS
+        from api.models import UserProfile
+        user = User.objects.create_user(username="semantic_vector_user", password="pass12345")
+        UserProfile.objects.update_or_create(user=user, defaults={
+            "llm_provider": "openai", "llm_model": PROVIDER_MODELS["openai"][0], "llm_api_key": encrypt_value("sk-test"),
+        })
+        mock_loaded.return_value = UserIndex(docs=["chunk a"], chunk_sources=["a.txt"], index=SimpleNamespace(ntotal=1), fingerprint="v1")
+
+        def search(*args, query_out=None, **kwargs):
+            query_out["vector"] = self._vector(1, 0, 0)
+            return ["chunk a"], [0], []
+        mock_search.side_effect = search
+        api_client = APIClient()
+        api_client.force_authenticate(user=user)
+
+        with patch("api.views.get_semantic_cache", return_value=self.cache), patch("api.views.get_answer_cache", return_value=None):
+            api_client.post("/api/ask/", {"question": "What is RAG?"}, format="json")
+            second = api_client.post("/api/ask/", {"question": "Explain what RAG means"}, format="json")
+
+        self.assertTrue(second.json()["cached"])
+        mock_embed.assert_not_called()
+
+
+class PromptBudgetTests(TestCase):
+    """Tests for token-budgeted prompt assembly in generator._build_prompt."""
+
+    def _history(self, turns):
+        return [
+            {"question": f"Question number {i} about the quarterly report?", "answer": "A fairly long answer sentence. " * 20}
+            for i in range(turns)
+        ]
+
+    def test_without_budget_everything_is_included(self):
+        from api.generator import _build_prompt
+        prompt, stats = _build_prompt("What is RAG?", ["chunk one", "chunk two"], chat_history=self._history(2))
+
+        self.assertIn("[1] chunk one\n\n[2] chunk two", prompt)
+        self.assertIn("User: Question number 0", prompt)
+        self.assertEqual(stats["history_turns"], 2)
+        self.assertEqual(stats["context_chunks_dropped"], 0)
+
+    def test_long_conversations_stay_within_budget(self):
+        from api.generator import _build_prompt
+        from api.prompt_budget import estimate_tokens
+        chunks = ["Retrieved evidence sentence. " * 60 for _ in range(5)]
+
+        sizes = []
+        for turns in (10, 200):
+            prompt, stats = _build_prompt("What changed?", chunks, chat_history=self._history(turns), token_budget=1500)
+            self.assertLessEqual(stats["prompt_tokens"], 1500)
+            self.assertEqual(stats["prompt_tokens"], estimate_tokens(prompt))
+            self.assertIn("[1] Retrieved evidence", prompt)
+            self.assertIn(f"User: Question number {turns - 1} ", prompt)
+            self.assertIn("Earlier questions: ", prompt)
+            self.assertGreater(stats["history_turns_summarized"], 0)
+            sizes.append(stats["prompt_tokens"])
+        self.assertLess(abs(sizes[0] - sizes[1]), 100)
+
+    def test_context_budget_left_unused_goes_to_history(self):
+        from api.generator import _build_prompt
+        _, stats = _build_prompt("Q?", ["short chunk"], chat_history=self._history(6), token_budget=2000)
+
+        self.assertGreater(stats["history_tokens"], int(2000 * 0.25))
+        self.assertEqual(stats["context_chunks"], 1)
+
+    @override_settings(RAG_PROMPT_TOKEN_BUDGET=4000, RAG_PROMPT_MODEL_TOKEN_BUDGETS={"small-model": 800})
+    @patch("api.generator._generate_with_provider", return_value="Answer.")
+    def test_generate_answer_uses_model_budget_and_reports_tokens(self, mock_generate):
+        from api.generator import generate_answer
+        prompt_stats = {}
+        generate_answer("Q?", ["chunk " * 3000], "openai", "small-model", "sk-test", prompt_stats=prompt_stats)
+
+        self.assertEqual(prompt_stats["token_budget"], 800)
+        self.assertLessEqual(prompt_stats["prompt_tokens"], 800)
+        generate_answer("Q?", ["chunk"], "openai", "other-model", "sk-test", prompt_stats=prompt_stats)
+        self.assertEqual(prompt_stats["token_budget"], 4000)
+
+    def test_summary_counts_against_the_history_budget(self):
+        from api.generator import _build_prompt
+        summary = "The user asked about revenue, churn and hiring plans. " * 100
+        prompt, stats = _build_prompt("Q?", ["chunk"], chat_history=self._history(4), token_budget=1500, history_summary=summary)
+
+        self.assertLessEqual(stats["prompt_tokens"], 1500)
+        self.assertIn("Summary of earlier conversation: The user asked", prompt)
+        self.assertIn("User: Question number 3 ", prompt)
+
+
+@override_settings(REST_FRAMEWORK=_NO_THROTTLE, RAG_PROMPT_HISTORY_MAX_TURNS=2, RAG_CONVERSATION_SUMMARY_TOKENS=60)
+class ConversationSummaryTests(TestCase):
+    """Tests for the rolling history kept on Conversation (api/conversation_summary.py)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="summary_user", password="pass12345")
+        self.conversation = Conversation.objects.create(user=self.user, title="Summary")
+
+    def _add(self, count, start=0):
+        from api.conversation_summary import record_turn
+        for i in range(start, start + count):
+            message = ChatMessage.objects.create(
+                user=self.user, conversation=self.conversation, question=f"What about topic {i}?",
+                answer=f"Topic {i} is covered in section {i}. More detail follows here.",
+            )
+            record_turn(self.conversation, message)
+
+    @patch("api.conversation_summary.run_in_background")
+    def test_recent_turns_are_bounded_and_overflow_schedules_a_summary(self, mock_background):
+        from api.conversation_summary import update_summary
+        self._add(2)
+        mock_background.assert_not_called()
+        self._add(1, start=2)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual([t["question"] for t in self.conversation.recent_turns], ["What about topic 1?", "What about topic 2?"])
+        mock_background.assert_called_once_with(update_summary, self.conversation.id)
+
+    @patch("api.conversation_summary.run_in_background")
+    def test_turns_recorded_from_a_stale_copy_are_not_lost(self, _background):
+        from api.conversation_summary import record_turn
+        stale = Conversation.objects.get(id=self.conversation.id)
+        self._add(1)  # another request answers while this one waits on the LLM
+        message = ChatMessage.objects.create(user=self.user, conversation=self.conversation, question="Late?", answer="Yes.")
+
+        record_turn(stale, message)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual([t["question"] for t in self.conversation.recent_turns], ["What about topic 0?", "Late?"])
+        self.assertEqual(stale.recent_turns, self.conversation.recent_turns)
+
+    @patch("api.conversation_summary.run_in_background")
+    def test_update_folds_each_message_once_and_stays_bounded(self, _background):
+        from api.conversation_summary import update_summary
+        from api.prompt_budget import estimate_tokens
+        self._add(5)
+
+        update_summary(self.conversation.id)
+        self.conversation.refresh_from_db()
+        folded = list(self.conversation.messages.order_by("id"))[:3]
+        self.assertEqual(self.conversation.summarized_through, folded[-1].id)
+        self.assertIn("- What about topic 2? -> Topic 2 is covered in section 2.", self.conversation.summary)
+        self.assertNotIn("topic 3", self.conversation.summary)
+
+        summary = self.conversation.summary
+        update_summary(self.conversation.id)  # nothing new to fold
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, summary)
+
+        self._add(20, start=5)
+        update_summary(self.conversation.id)
+        self.conversation.refresh_from_db()
+        self.assertIn("topic 22?", self.conversation.summary)
+        self.assertLessEqual(estimate_tokens(self.conversation.summary), 60)
+
+    @patch("api.generator.summarize_conversation", return_value="Discussed topics 0 to 2.")
+    @patch("api.conversation_summary.run_in_background")
+    def test_update_uses_the_users_model_when_configured(self, _background, mock_summarize):
+        from api.conversation_summary import update_summary
+        from api.encryption import encrypt_value
+        from api.llm_catalog import PROVIDER_MODELS
+        from api.models import UserProfile
+        UserProfile.objects.update_or_create(user=self.user, defaults={
+            "llm_provider": "openai", "llm_model": PROVIDER_MODELS["openai"][0], "llm_api_key": encrypt_value("sk-test"),
+        })
+        self._add(5)
+
+        update_summary(self.conversation.id)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary, "Discussed topics 0 to 2.")
+        args, kwargs = mock_summarize.call_args
+        self.assertEqual(args[0], "")
+        self.assertEqual([turn["question"] for turn in args[1]], [f"What about topic {i}?" for i in range(3)])
+        self.assertEqual(args[4], "sk-test")
+        self.assertEqual(kwargs["max_tokens"], 60)
+
+    @patch("api.conversation_summary.run_in_background")
+    @patch("api.views.generate_answer", return_value="Answer.")
+    @patch("api.views.hybrid_search", return_value=(["chunk a"], [0]))
+    @patch("api.views.ensure_documents_loaded")
+    def test_chat_view_reads_history_from_the_conversation_row(self, mock_loaded, _search, mock_generate, _background):
+        from api.encryption import encrypt_value
+        from api.llm_catalog import PROVIDER_MODELS
+        from api.models import UserProfile
+        UserProfile.objects.update_or_create(user=self.user, defaults={
+            "llm_provider": "openai", "llm_model": PROVIDER_MODELS["openai"][0], "llm_api_key": encrypt_value("sk-test"),
+        })
+        mock_loaded.return_value = UserIndex(docs=["chunk a"], chunk_sources=["a.txt"], index=SimpleNamespace(ntotal=1))
+        turns = [{"question": "q1", "answer": "a1"}, {"question": "q2", "answer": "a2"}]
+        Conversation.objects.filter(id=self.conversation.id).update(summary="Talked about q0.", recent_turns=turns)
+        api_client = APIClient()
+        api_client.force_authenticate(user=self.user)
+
+        response = api_client.post("/api/chat/", {"question": "q3", "conversation_id": self.conversation.id}, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        kwargs = mock_generate.call_args.kwargs
+        self.assertEqual(kwargs["chat_history"], turns)
+        self.assertEqual(kwargs["history_summary"], "Talked about q0.")
+        self.conversation.refresh_from_db()
+        self.assertEqual([t["question"] for t in self.conversation.recent_turns], ["q2", "q3"])
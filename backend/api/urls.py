@@ -1,24 +1,25 @@
 from django.urls import path
-from . import views
+from . import auth_views, views
 from .social_auth import SocialAuthView
 
 app_name = "api"
 
 urlpatterns = [
     path("health/", views.HealthView.as_view(), name="health"),
+    path("ready/", views.ReadinessView.as_view(), name="ready"),
     path("auth/social/", SocialAuthView.as_view(), name="social-auth"),
     path("ask/", views.AskView.as_view(), name="ask"),
-    path('sign-up/', views.SignUpView.as_view(), name='sign-up'),
-    path('sign-in/', views.SignInView.as_view(), name='sign-in'),
-    path('token/refresh/', views.CookieTokenRefreshView.as_view(), name='token-refresh'),
-    path('logout/', views.LogOutView.as_view(), name='logout'),
+    path('sign-up/', auth_views.SignUpView.as_view(), name='sign-up'),
+    path('sign-in/', auth_views.SignInView.as_view(), name='sign-in'),
+    path('token/refresh/', auth_views.CookieTokenRefreshView.as_view(), name='token-refresh'),
+    path('logout/', auth_views.LogOutView.as_view(), name='logout'),
     path('upload/', views.DocumentUploadView.as_view(), name='upload'),
     path('documents/', views.ListDocumentsView.as_view(), name='documents'),
     path('documents/<str:filename>/', views.DeleteDocumentView.as_view(), name='delete-document'),
-    path('account/delete/', views.DeleteAccountView.as_view(), name='delete-account'),
-    path('account/', views.AccountView.as_view(), name='account'),
-    path('forgot-password/', views.ForgotPasswordView.as_view(), name='forgot-password'),
-    path('reset-password/', views.ResetPasswordView.as_view(), name='reset-password'),
+    path('account/delete/', auth_views.DeleteAccountView.as_view(), name='delete-account'),
+    path('account/', auth_views.AccountView.as_view(), name='account'),
+    path('forgot-password/', auth_views.ForgotPasswordView.as_view(), name='forgot-password'),
+    path('reset-password/', auth_views.ResetPasswordView.as_view(), name='reset-password'),
     path('search/', views.SearchView.as_view(), name='search'),
     path('upload-url/', views.UploadURLView.as_view(), name='upload-url'),
     path('chat/', views.ChatView.as_view(), name='chat'),
@@ -35,6 +36,7 @@ urlpatterns = [
     path('search/rerank/', views.SearchRerankView.as_view(), name='search-rerank'),
     path('admin/usage/', views.AdminUsageView.as_view(), name='admin-usage'),
     path('admin/vectors/', views.AdminVectorsView.as_view(), name='admin-vectors'),
+    path('admin/caches/', views.AdminCachesView.as_view(), name='admin-caches'),
     path('chat/<int:chat_id>/export/', views.ChatExportView.as_view(), name='chat-export'),
     path('settings/api-key/', views.APIKeyView.as_view()),
     path('settings/api-key/test/', views.APIKeyConnectionTestView.as_view(), name='settings-api-key-test'),
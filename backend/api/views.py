@@ -11,33 +11,35 @@ from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from api.retriever import build_index, search, rerank, get_embedding_model, remove_overlapping_chunks, build_bm25_index, hybrid_search
-from api.generator import generate_answer, generate_answer_stream, test_provider_connection, ProviderAPIError
-from api.chunker import semantic_chunk
+from api.retriever import embed_query, embed_texts, search, rerank, get_embedding_cache, get_embedding_model, get_rerank_cache, inference_batching_stats, remove_overlapping_chunks, hybrid_search, fusion_confidence
+from api.generator import generate_answer, generate_answer_stream, get_client_pool, test_provider_connection, ProviderAPIError
 from api.compressor import compress_chunks
 from api.throttles import ChatRateThrottle
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
-from api.serializers import SignUpSerializer
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.auth.tokens import default_token_generator
-from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
-from django.utils.encoding import force_bytes, force_str
 from django.utils import timezone
-from bs4 import BeautifulSoup
 from api.models import ChatMessage, ChatFeedback, Collection, Document, APIUsageLog, UserProfile, Conversation, Task
 from api.tasks import submit_task, TaskCancelled
 from api.llm_catalog import PROVIDER_MODELS
 from api.encryption import encrypt_value, decrypt_value
-import shutil
+from api.index_registry import UserIndex, registry as index_registry
+from api.extraction import TextCache, extract_text_cached, file_sha256, iter_extracted_texts
+from api.ingestion import IngestionPipeline
+from api.index_store import current_snapshot_id, ingest_lock, load_manifest, load_snapshot, save_snapshot
+from api.warmup import readiness
+from api.answer_cache import answer_cache_key, get_answer_cache, history_hash
+from api.semantic_cache import get_semantic_cache
+from api.conversation_summary import record_turn
+import hashlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 DOC_DIR = os.path.join(settings.BASE_DIR, "documents")
 SUPPORTED_EXTENSIONS = (".txt", ".md", ".pdf", ".docx")
 SUPPORTED_LLM_PROVIDERS = [choice[0] for choice in UserProfile.PROVIDER_CHOICES]
 
-_current_user_id = None
-
 def _user_doc_dir(user):
     return os.path.join(DOC_DIR, str(user.id))
 
@@ -45,32 +47,6 @@ def _user_doc_dir(user):
 def _user_doc_dir_from_id(user_id):
     return os.path.join(DOC_DIR, str(user_id))
 
-def extract_text_from_file(filepath, filename):
-    """Extract plain text from a file based on its extension. Returns a single string."""
-    ext = os.path.splitext(filename)[1].lower()
-    if ext in (".txt", ".md"):
-        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-            return f.read()
-    if ext == ".pdf":
-        from pypdf import PdfReader
-        reader = PdfReader(filepath)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
-    if ext == ".docx":
-        from docx import Document
-        doc = Document(filepath)
-        return "\n".join(p.text for p in doc.paragraphs)
-    return ""
-
-
-docs = []
-chunk_sources = []
-index = None
-embeddings = None
-bm25_index = None
-bm25_tokenized = []
-_documents_loaded = False
-
-
 def _is_private_or_local_host(hostname):
     try:
         address_info = socket.getaddrinfo(hostname, None)
@@ -259,6 +235,8 @@ def _clean_extracted_text(text):
 
 
 def _extract_readable_text_from_html(html_text):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_text, "html.parser")
 
     # Drop non-content blocks before extracting text.
@@ -299,6 +277,8 @@ def _extract_readable_text_from_html(html_text):
 
 
 def _extract_markdown_from_html(html_text):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_text, "html.parser")
 
     for tag in soup(["script", "style", "nav", "footer", "header", "aside", "noscript", "svg"]):
@@ -458,63 +438,319 @@ def _extract_markdown_from_html(html_text):
 
 
 
-def load_documents(user, progress_callback=None, is_cancelled=None):
-    global docs, chunk_sources, index, embeddings, bm25_index, bm25_tokenized, _documents_loaded
-    docs.clear()
-    chunk_sources.clear()
+def _user_index_dir(user):
+    return os.path.join(_user_doc_dir(user), ".index")
 
-    user_dir = _user_doc_dir(user)
-    os.makedirs(user_dir, exist_ok=True)
-    files = [
+
+def _list_user_files(user_dir):
+    return [
         filename for filename in sorted(os.listdir(user_dir))
         if filename.lower().endswith(SUPPORTED_EXTENSIONS)
     ]
-    total_files = max(1, len(files))
 
-    for idx, filename in enumerate(files, start=1):
+
+def _user_text_cache(user):
+    return TextCache(os.path.join(_user_doc_dir(user), ".cache", "text"))
+
+
+def _indexed_sha256(user, filename, filepath):
+    """Content hash of ``filename`` from the published manifest, if the file is unchanged since."""
+    info = load_manifest(_user_index_dir(user)).get(filename)
+    if not info:
+        return None
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    if info["size"] != stat.st_size or info["mtime_ns"] != stat.st_mtime_ns:
+        return None
+    return info["sha256"]
+
+
+def _index_base_for_update(user, rebuild=False):
+    """Starting point for an incremental update: the published index, copied."""
+    if rebuild:
+        return UserIndex()
+    base_dir = _user_index_dir(user)
+    snapshot_id = current_snapshot_id(base_dir)
+    if snapshot_id is None:
+        return UserIndex()
+    cached = index_registry.get((user.id, None), fingerprint=snapshot_id)
+    if cached is not None:
+        return cached.copy()
+    return load_snapshot(base_dir) or UserIndex()
+
+
+def load_documents(user, progress_callback=None, is_cancelled=None, rebuild=False):
+    """Bring the user's index in line with the files on disk, persist and register it.
+
+    Only new or changed files (by size/mtime, confirmed by content hash) are
+    extracted, chunked and embedded; chunks of deleted or changed files are
+    removed from the vector and BM25 indexes. Files that fail to extract or
+    embed stay out of the manifest and are retried on the next run. Pass
+    ``rebuild=True`` to reprocess everything. Returns the resulting ``UserIndex``.
+    """
+    user_dir = _user_doc_dir(user)
+    os.makedirs(user_dir, exist_ok=True)
+    with ingest_lock(_user_index_dir(user)):
+        if rebuild:
+            rerank_cache = get_rerank_cache()
+            if rerank_cache is not None:
+                rerank_cache.invalidate_user(user.id)
+        user_index = _index_base_for_update(user, rebuild=rebuild)
+        files = _list_user_files(user_dir)
+        known = user_index.files
+        unchanged = {}
+        pending = []
+        for filename in files:
+            filepath = os.path.join(user_dir, filename)
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            info = known.get(filename)
+            if info and info["size"] == stat.st_size and info["mtime_ns"] == stat.st_mtime_ns:
+                unchanged[filename] = info
+                continue
+            file_info = {"sha256": file_sha256(filepath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if info and info["sha256"] == file_info["sha256"]:
+                unchanged[filename] = file_info
+                continue
+            pending.append((filename, file_info))
+        removed = [filename for filename in known if filename not in unchanged]
+
+        if not pending and not removed and user_index.fingerprint is not None:
+            user_index.files.update(unchanged)
+            index_registry.put((user.id, None), user_index)
+            return user_index
+
+        user_index.remove_files(removed)
+        user_index.files.update(unchanged)
+        pipeline = IngestionPipeline(
+            user_index,
+            get_embedding_model(),
+            embed_texts,
+            sentence_batch_size=settings.RAG_INGEST_SENTENCE_BATCH_SIZE,
+            max_pending_sentences=settings.RAG_INGEST_MAX_PENDING_SENTENCES,
+            chunk_batch_size=settings.RAG_INGEST_CHUNK_BATCH_SIZE,
+            keep_sentence_embeddings=getattr(settings, "RAG_COMPRESSION_MODE", "precomputed") == "precomputed",
+        )
+        total_files = max(1, len(pending))
+        pending_info = dict(pending)
+        text_cache = _user_text_cache(user)
+        extracted = iter_extracted_texts(
+            [(os.path.join(user_dir, filename), filename, info["sha256"]) for filename, info in pending],
+            max_workers=settings.RAG_EXTRACTION_WORKERS,
+            pdf_pages_per_task=settings.RAG_EXTRACTION_PDF_PAGES_PER_TASK,
+            is_cancelled=is_cancelled,
+            text_cache=text_cache,
+        )
+        for idx, (filename, content) in enumerate(extracted, start=1):
+            if is_cancelled and is_cancelled():
+                raise TaskCancelled("Task was cancelled.")
+            pipeline.add(filename, pending_info[filename], content)
+            if progress_callback:
+                progress = 55 + int((idx / total_files) * 35)
+                progress_callback(min(progress, 90), f"Processed {idx}/{len(pending)} new or changed files.")
         if is_cancelled and is_cancelled():
             raise TaskCancelled("Task was cancelled.")
-        filepath = os.path.join(user_dir, filename)
-        try:
-            content = extract_text_from_file(filepath, filename)
-        except Exception:
-            continue
-        if not content or not content.strip():
-            continue
+        stats = pipeline.finish().as_dict()
+        if progress_callback:
+            progress_callback(95, "Saving vector index...")
+        logger.info(
+            "Index update for user %s: %d files added/changed, %d removed, %d chunks total; "
+            "%d new chunks in %.2fs (%.1f chunks/sec), peak RSS %s MiB",
+            user.id, len(pending), len(removed), user_index.total_chunks,
+            stats["chunks"], stats["seconds"], stats["chunks_per_sec"], stats["peak_rss_mb"],
+        )
+        if stats["failed_files"]:
+            logger.warning(
+                "Index update for user %s skipped %d files that failed to extract or embed; they will be retried: %s",
+                user.id, len(stats["failed_files"]), ", ".join(stats["failed_files"]),
+            )
+        user_index.ingest_stats = stats
+        text_cache.prune(info["sha256"] for info in user_index.files.values())
         try:
-            chunks = semantic_chunk(content, get_embedding_model())
+            save_snapshot(_user_index_dir(user), user_index)
         except Exception:
-            # Fallback to naive paragraph splitting if semantic chunking fails.
-            chunks = [p.strip() for p in content.split("\n\n") if p.strip()]
-        if not chunks:
-            chunks = [content.strip()]
-        for chunk in chunks:
-            docs.append(chunk)
-            chunk_sources.append(filename)
-        if progress_callback:
-            progress = 55 + int((idx / total_files) * 35)
-            progress_callback(min(progress, 90), f"Processed {idx}/{len(files)} files.")
+            logger.exception("Failed to persist index snapshot for user %s", user.id)
+        index_registry.put((user.id, None), user_index)
+        # Answers are keyed by index version and would no longer match; free them now.
+        for user_cache in (get_answer_cache(), get_semantic_cache()):
+            if user_cache is not None:
+                user_cache.invalidate_user(user.id)
+        return user_index
+
+
+def _load_full_index(user, force=False):
+    key = (user.id, None)
+    if force:
+        return load_documents(user)
+    base_dir = _user_index_dir(user)
+    snapshot_id = current_snapshot_id(base_dir)
+    if snapshot_id is None:
+        return index_registry.get_or_load(key, lambda: load_documents(user))
+    return index_registry.get_or_load(
+        key,
+        lambda: load_snapshot(base_dir) or load_documents(user),
+        fingerprint=snapshot_id,
+    )
 
-    if is_cancelled and is_cancelled():
-        raise TaskCancelled("Task was cancelled.")
-    if progress_callback:
-        progress_callback(95, "Building vector index...")
-    try:
-        index, embeddings = build_index(docs)
-    except Exception:
-        index, embeddings = None, None
+
+def load_published_index(user):
+    """Put the user's published snapshot in the registry; False if there is none.
+
+    Unlike ``ensure_documents_loaded`` this never falls back to
+    ``load_documents``, so it cannot start an ingest.
+    """
+    key = (user.id, None)
+    base_dir = _user_index_dir(user)
+    snapshot_id = current_snapshot_id(base_dir)
+    if snapshot_id is None:
+        return False
+    if index_registry.get(key, fingerprint=snapshot_id) is not None:
+        return True
+    user_index = load_snapshot(base_dir)
+    if user_index is None:
+        return False
+    index_registry.put(key, user_index)
+    return True
+
+
+def ensure_documents_loaded(user, force=False, collection_id=None):
+    """Return the warm ``UserIndex`` for this user/collection.
+
+    Lookup order is the per-worker registry, then the on-disk snapshot written
+    by the last ingestion, and only then a full rebuild. Registry entries are
+    keyed to the published snapshot, so an ingest finishing in another process
+    is picked up on the next request. Collection indexes are sliced out of the
+    full index without re-embedding.
+    """
+    full_index = _load_full_index(user, force=force)
+    if collection_id is None:
+        return full_index
+    filenames = sorted(
+        Document.objects.filter(user=user, collection_id=collection_id).values_list("filename", flat=True)
+    )
+    fingerprint = hashlib.sha256(repr((full_index.fingerprint, filenames)).encode("utf-8")).hexdigest()
+    return index_registry.get_or_load(
+        (user.id, collection_id),
+        lambda: full_index.subset(filenames, fingerprint=fingerprint),
+        fingerprint=fingerprint,
+    )
+
+
+def _compress_context(question, chunks, user_index, query_vector=None):
+    """Apply context compression according to ``RAG_COMPRESSION_MODE``.
+
+    ``precomputed`` scores sentences with the vectors stored at ingest time and
+    only encodes chunks that have none; ``encode`` always re-encodes; ``off``
+    passes chunks through unchanged. ``query_vector`` is the query embedding
+    from ``hybrid_search``; with it the question is not encoded again.
+    """
+    mode = getattr(settings, "RAG_COMPRESSION_MODE", "precomputed")
+    if mode == "off" or not chunks:
+        return chunks
+    sentence_embeddings = user_index.sentence_embeddings_for(chunks) if mode == "precomputed" else None
     try:
-        bm25_index, bm25_tokenized = build_bm25_index(docs)
+        return compress_chunks(
+            question, chunks, get_embedding_model(), sentence_embeddings=sentence_embeddings, query_vector=query_vector,
+        )
     except Exception:
-        bm25_index, bm25_tokenized = None, []
-    _documents_loaded = True
+        logger.exception("Context compression failed; using uncompressed chunks")
+        return chunks
 
 
-def ensure_documents_loaded(user, force=False):
-    global _current_user_id, bm25_index, bm25_tokenized
-    if force or not _documents_loaded or _current_user_id != user.id:
-        load_documents(user)
-        _current_user_id = user.id
+def _rerank_by_confidence(question, chunks, hits, top_k=3, cache_scope=None):
+    """Rerank fused ``chunks`` only as far as retrieval is ambiguous.
+
+    The cross-encoder is skipped when the best dense cosine score reaches
+    ``RAG_RERANK_SKIP_DENSE_SCORE`` or ``fusion_confidence`` reaches
+    ``RAG_RERANK_SKIP_CONFIDENCE``; above ``RAG_RERANK_SHRINK_CONFIDENCE`` only
+    the first ``RAG_RERANK_SHRINK_CANDIDATES`` chunks are reranked. Thresholds
+    of 0 are disabled. Returns entries shaped like ``rerank``'s.
+    """
+    confidence = fusion_confidence(hits)
+    best_dense = max((hit["dense_score"] for hit in hits if hit["dense_score"] is not None), default=None)
+    skip_dense = getattr(settings, "RAG_RERANK_SKIP_DENSE_SCORE", 0.0)
+    skip_confidence = getattr(settings, "RAG_RERANK_SKIP_CONFIDENCE", 0.0)
+    shrink_confidence = getattr(settings, "RAG_RERANK_SHRINK_CONFIDENCE", 0.0)
+
+    if (skip_dense > 0 and best_dense is not None and best_dense >= skip_dense) or (
+        skip_confidence > 0 and confidence >= skip_confidence
+    ):
+        return [
+            {"chunk": chunk, "score": hit["score"], "index": i}
+            for i, (chunk, hit) in enumerate(zip(chunks[:top_k], hits[:top_k]))
+        ]
+    if shrink_confidence > 0 and confidence >= shrink_confidence:
+        chunks = chunks[:max(top_k, getattr(settings, "RAG_RERANK_SHRINK_CANDIDATES", 5))]
+    return rerank(question, chunks, top_k=top_k, cache_scope=cache_scope)
+
+
+def _answer_cache_key(endpoint, user, user_index, question, profile, chat_history=None, history_summary=""):
+    """Answer-cache key for this request, or None when answers are not cached."""
+    if get_answer_cache() is None or user_index.fingerprint is None:
+        return None
+    return answer_cache_key(
+        endpoint, user.id, user_index.fingerprint, question,
+        profile.llm_provider, profile.llm_model, chat_history, history_summary,
+    )
+
+
+def _cached_answer(cache_key):
+    answer_cache = get_answer_cache()
+    if cache_key is None or answer_cache is None:
+        return None
+    return answer_cache.get(cache_key)
+
+
+def _semantic_cache_probe(
+    endpoint, user, user_index, profile, question, chunk_ids, chat_history=None, history_summary="", query_vector=None,
+):
+    """Look a question up in the semantic answer cache after retrieval.
+
+    ``query_vector`` is the embedding ``hybrid_search`` already computed; the
+    question is only encoded again when it is missing. Returns
+    ``(cached_value, entry)``; on a miss pass ``entry`` to ``_store_answer`` so
+    the generated answer is added. Both are None when the semantic cache is off
+    for ``endpoint``.
+    """
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None or not semantic_cache.enabled_for(endpoint) or user_index.fingerprint is None:
+        return None, None
+    entry = {
+        "user_id": user.id,
+        "index_version": user_index.fingerprint,
+        "variant": (endpoint, profile.llm_provider, profile.llm_model, history_hash(chat_history, history_summary)),
+        "vector": query_vector if query_vector is not None else embed_query(question),
+        "chunk_ids": list(chunk_ids),
+    }
+    return semantic_cache.lookup(**entry), entry
+
+
+def _store_answer(cache_key, value, generation_seconds, semantic_entry=None):
+    answer_cache = get_answer_cache()
+    if cache_key is not None and answer_cache is not None:
+        answer_cache.put(cache_key, value, generation_seconds)
+    semantic_cache = get_semantic_cache()
+    if semantic_entry is not None and semantic_cache is not None:
+        semantic_cache.add(**semantic_entry, value=value, generation_seconds=generation_seconds)
+
+
+def _resolve_collection_id(request, data):
+    """Validate an optional ``collection_id`` and return (collection_id, error_response)."""
+    collection_id = data.get("collection_id")
+    if collection_id in (None, ""):
+        return None, None
+    try:
+        collection = Collection.objects.get(id=collection_id, user=request.user)
+    except (Collection.DoesNotExist, ValueError, TypeError):
+        return None, Response(
+            {"error": "Collection not found."},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return collection.id, None
 
 
 def _is_youtube_url(url):
@@ -674,18 +910,19 @@ def _download_url_to_document(user_id, url, update=None, is_cancelled=None):
     return filename
 
 
-def _run_reindex_task(user_id, update=None, is_cancelled=None):
+def _run_reindex_task(user_id, update=None, is_cancelled=None, rebuild=False):
     if update:
         update(50, "Indexing documents...")
 
     user = User.objects.get(id=user_id)
-    load_documents(user, progress_callback=update, is_cancelled=is_cancelled)
+    user_index = load_documents(user, progress_callback=update, is_cancelled=is_cancelled, rebuild=rebuild)
 
     return {
         "message": "Documents ingested successfully.",
-        "total_chunks": len(docs),
-        "total_documents": len(set(chunk_sources)),
-        "documents": list(dict.fromkeys(chunk_sources)),
+        "total_chunks": user_index.total_chunks,
+        "total_documents": len(user_index.documents),
+        "documents": user_index.documents,
+        "ingest_stats": user_index.ingest_stats,
     }
 
 
@@ -710,93 +947,67 @@ def _run_url_ingest_task(user_id, url, update=None, is_cancelled=None):
     return result
 
 
-# ---------------------------------------------------------------------------
-# Refresh-token cookie helpers
-# ---------------------------------------------------------------------------
-_REFRESH_COOKIE_NAME = "refresh_token"
-_REFRESH_COOKIE_MAX_AGE = 60 * 60 * 24  # 1 day, matches SIMPLE_JWT REFRESH_TOKEN_LIFETIME
-
-
-def _set_refresh_cookie(response, refresh_token_str):
-    """Set the refresh token as an HttpOnly Secure cookie on the response."""
-    is_prod = not settings.DEBUG
-    response.set_cookie(
-        key=_REFRESH_COOKIE_NAME,
-        value=refresh_token_str,
-        max_age=_REFRESH_COOKIE_MAX_AGE,
-        httponly=True,
-        secure=is_prod,
-        samesite="None" if is_prod else "Lax",
-        path="/",
-    )
-
-
-def _clear_refresh_cookie(response):
-    """Delete the refresh token cookie."""
-    is_prod = not settings.DEBUG
-    response.delete_cookie(
-        key=_REFRESH_COOKIE_NAME,
-        path="/",
-        samesite="None" if is_prod else "Lax",
-    )
-
-
-class CookieTokenRefreshView(APIView):
-    """Custom token refresh that reads the refresh token from the HttpOnly cookie
-    instead of requiring it in the request body.
-    Falls back to the body 'refresh' field for backwards compatibility.
-    """
-    throttle_classes = []
-
-    def post(self, request):
-        refresh_token = request.COOKIES.get(_REFRESH_COOKIE_NAME) or request.data.get('refresh')
-        if not refresh_token:
-            return Response(
-                {'error': 'No refresh token provided.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            token = RefreshToken(refresh_token)
-            new_access = str(token.access_token)
-            return Response(
-                {'access': new_access},
-                status=status.HTTP_200_OK
-            )
-        except Exception:
-            response = Response(
-                {'error': 'Invalid or expired refresh token.'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-            _clear_refresh_cookie(response)
-            return response
-
-
 class HealthView(APIView):
     throttle_classes = []
     def get(self, request):
         return Response({"status":"ok", "message":"RAG API is running"}, status=status.HTTP_200_OK)
 
+""" READINESS VIEW """
+class ReadinessView(APIView):
+    """Whether this worker has warmed its models (and preloaded indexes)."""
+    throttle_classes = []
+    def get(self, request):
+        ready, details = readiness()
+        return Response(
+            details,
+            status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
 class AskView(APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [ChatRateThrottle]
     def post(self, request):
-        ensure_documents_loaded(request.user)
+        collection_id, error_response = _resolve_collection_id(request, request.data)
+        if error_response:
+            return error_response
+        user_index = ensure_documents_loaded(request.user, collection_id=collection_id)
         question = request.data.get("question")
         if not question or not question.strip():
             return Response(
                 {"error": "Please provide a non-empty 'question' in the request body."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if index is None or index.ntotal == 0:
+        if user_index.is_empty:
             return Response(
                 {"error": "No indexed documents found. Upload documents and run ingestion first."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        top_chunks, top_indices = hybrid_search(question, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=10)
-        sources = [chunk_sources[i] for i in top_indices]
+        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        # Validated before the cache lookups so that, as in ChatView, a stale
+        # provider/model pair is rejected even when a cached answer exists.
+        if profile.llm_model not in PROVIDER_MODELS.get(profile.llm_provider, []):
+            return Response(
+                {"error": "Selected model is not valid for the chosen provider. Update Settings."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        cache_key = _answer_cache_key("ask", request.user, user_index, question, profile)
+        cached = _cached_answer(cache_key)
+        if cached is not None:
+            return Response({**cached, "cached": True}, status=status.HTTP_200_OK)
+        query = {}
+        top_chunks, top_indices, hits = hybrid_search(
+            question, user_index.docs, user_index.index, user_index.bm25_index,
+            user_index.embeddings, top_k=10, return_hits=True, query_out=query,
+        )
+        sources = [user_index.chunk_sources[i] for i in top_indices]
+        cached, semantic_entry = _semantic_cache_probe(
+            "ask", request.user, user_index, profile, question, top_indices, query_vector=query.get("vector"),
+        )
+        if cached is not None:
+            return Response({**cached, "cached": True}, status=status.HTTP_200_OK)
 
         # Rerank to top-3 for higher precision.
-        reranked = rerank(question, top_chunks, top_k=3)
+        reranked = _rerank_by_confidence(question, top_chunks, hits, top_k=3, cache_scope=request.user.id)
         reranked_chunks = [r["chunk"] for r in reranked]
         reranked_sources = [sources[r["index"]] for r in reranked] if reranked else sources[:3]
 
@@ -804,28 +1015,22 @@ class AskView(APIView):
         reranked_chunks, reranked_sources = remove_overlapping_chunks(reranked_chunks, reranked_sources)
 
         # Compress chunks to keep only query-relevant sentences.
-        try:
-            compressed = compress_chunks(question, reranked_chunks, get_embedding_model())
-        except Exception:
-            compressed = reranked_chunks
+        compressed = _compress_context(question, reranked_chunks, user_index, query_vector=query.get("vector"))
 
         final_chunks = compressed if compressed else reranked_chunks
         final_sources = reranked_sources
         try:
-            profile, _ = UserProfile.objects.get_or_create(user=request.user)
-            allowed_models = PROVIDER_MODELS.get(profile.llm_provider, [])
-            if profile.llm_model not in allowed_models:
-                return Response(
-                    {"error": "Selected model is not valid for the chosen provider. Update Settings."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            prompt_stats = {}
+            started = time.perf_counter()
             answer = generate_answer(
                 question,
                 final_chunks,
                 provider=profile.llm_provider,
                 model=profile.llm_model,
                 api_key=decrypt_value(profile.llm_api_key),
+                prompt_stats=prompt_stats,
             )
+            generation_seconds = time.perf_counter() - started
         except ValueError as e:
             return Response(
                 {"error": str(e)},
@@ -841,81 +1046,12 @@ class AskView(APIView):
                 {"error": "The answer service is temporarily unavailable. Please try again later."},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
-        return Response({"answer":answer, "sources":list(dict.fromkeys(final_sources))}, status=status.HTTP_200_OK)
-
-""" SIGN-UP VIEW """
-class SignUpView(APIView):
-    def post(self, request):
-        serializer = SignUpSerializer(data=request.data)
-        if serializer.is_valid():
-            user = serializer.save()
-            refresh = RefreshToken.for_user(user)
-            response = Response({
-                'message': 'Signed Up Successfully.',
-                'tokens': {
-                    'access': str(refresh.access_token)
-                }
-            }, status=status.HTTP_201_CREATED)
-            _set_refresh_cookie(response, str(refresh))
-            return response
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-""" SIGN-IN VIEW """
-class SignInView(APIView):
-    def post(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        if not username or not password:
-            return Response(
-                {'error':'Please provide both username and password.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        user = authenticate(username=username, password=password)
-        if user is None:
-            return Response(
-                {'error':'Invalid credentials.'},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-        refresh = RefreshToken.for_user(user)
-        response = Response(
-            {'message':'Signed In Successfully.',
-                'tokens': {
-                    'access': str(refresh.access_token)
-                }
-            },
+        result = {"answer": answer, "sources": list(dict.fromkeys(final_sources))}
+        _store_answer(cache_key, result, generation_seconds, semantic_entry)
+        return Response(
+            {**result, "cached": False, "prompt_tokens": prompt_stats.get("prompt_tokens")},
             status=status.HTTP_200_OK
         )
-        _set_refresh_cookie(response, str(refresh))
-        return response
-
-""" LOG-OUT VIEW """
-class LogOutView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        # Read refresh token from HttpOnly cookie first, fall back to body.
-        refresh_token = request.COOKIES.get('refresh_token') or request.data.get('refresh')
-        if not refresh_token:
-            return Response(
-                {'error':'Please provide the refresh token'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            token = RefreshToken(refresh_token)
-            token.blacklist()
-            response = Response(
-                {'message': 'Logged out successfully.'},
-                status=status.HTTP_200_OK
-            )
-            _clear_refresh_cookie(response)
-            return response
-        except Exception:
-            response = Response(
-                {'error': 'Invalid or expired token.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-            _clear_refresh_cookie(response)
-            return response
 
 """ DOCUMENT UPLOAD VIEW """
 class DocumentUploadView(APIView):
@@ -1006,7 +1142,10 @@ class DeleteDocumentView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         try:
-            content = extract_text_from_file(filepath, safe_name)
+            content = extract_text_cached(
+                filepath, safe_name, _user_text_cache(request.user),
+                sha256=_indexed_sha256(request.user, safe_name, filepath),
+            )
         except Exception:
             return Response(
                 {'error': 'Failed to read document content.'},
@@ -1034,118 +1173,10 @@ class DeleteDocumentView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         os.remove(filepath)
-        ensure_documents_loaded(request.user, force=True)
+        # Incremental: only the deleted file's vectors are dropped.
+        load_documents(request.user)
         return Response(
-            {'message': f'"{safe_name}" deleted and index rebuilt.'},
-            status=status.HTTP_200_OK
-        )
-
-""" DELETE ACCOUNT VIEW"""
-class DeleteAccountView(APIView):
-    permission_classes = [IsAuthenticated]
-    
-    def delete(self, request):
-        password = request.data.get('password')
-        if not password:
-            return Response(
-                {'error': 'Please provide your password to confirm account deletion.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        user = authenticate(username=request.user.username, password=password)
-        if user is None:
-            return Response(
-                {'error': 'Incorrect Password!'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        # RTBF: Delete user's document directory and all files.
-        user_dir = _user_doc_dir(user)
-        if os.path.isdir(user_dir):
-            shutil.rmtree(user_dir, ignore_errors=True)
-        # Reset in-memory index if currently loaded for this user.
-        global _current_user_id, _documents_loaded, bm25_index, bm25_tokenized
-        if _current_user_id == user.id:
-            docs.clear()
-            chunk_sources.clear()
-            bm25_index = None
-            bm25_tokenized = []
-            _current_user_id = None
-            _documents_loaded = False
-        user.delete()
-        response = Response(
-            {'message': 'Account deleted successfully.'},
-            status=status.HTTP_200_OK
-        )
-        _clear_refresh_cookie(response)
-        return response
-
-""" ACCOUNT VIEW """
-class AccountView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        return Response({
-            'username': request.user.username,
-            'email': request.user.email,
-        }, status=status.HTTP_200_OK)
-
-""" FORGOT PASSWORD VIEW """
-class ForgotPasswordView(APIView):
-    def post(self, request):
-        email = request.data.get('email')
-        if not email:
-            return Response(
-                {'error': 'Please provide your email.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            return Response(
-                {'message': 'If an account with this email exits, a reset link has been sent.'},
-                status=status.HTTP_200_OK
-            )
-        # Reset token artifacts should be delivered out-of-band (e.g., email),
-        # not returned in API responses.
-        default_token_generator.make_token(user)
-        urlsafe_base64_encode(force_bytes(user.pk))
-        return Response({
-            'message': 'If an account with this email exits, a reset link has been sent.',
-            }, status=status.HTTP_200_OK
-        )
-
-""" RESET PASSWORD VIEW """
-class ResetPasswordView(APIView):
-    def post(self, request):
-        uid = request.data.get('uid')
-        token = request.data.get('token')
-        new_password = request.data.get('new_password')
-        if not uid or not token or not new_password:
-            return Response(
-                {'error': 'uid, token, and new_password are required.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if len(new_password) < 8:
-            return Response(
-                {'error': 'Password must be at least 8 characters.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            user_id = force_str(urlsafe_base64_decode(uid))
-            user = User.objects.get(pk=user_id)
-        except (User.DoesNotExist, ValueError):
-            return Response(
-                {'error': 'Invalid reset link.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if not default_token_generator.check_token(user, token):
-            return Response(
-                {'error': 'Invalid or expired token.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        user.set_password(new_password)
-        user.save()
-        return Response(
-            {'message': 'Password reset successfully'},
+            {'message': f'"{safe_name}" deleted and index updated.'},
             status=status.HTTP_200_OK
         )
 
@@ -1154,7 +1185,10 @@ class SearchView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        ensure_documents_loaded(request.user)
+        collection_id, error_response = _resolve_collection_id(request, request.data)
+        if error_response:
+            return error_response
+        user_index = ensure_documents_loaded(request.user, collection_id=collection_id)
         query = request.data.get('query')
         if not query:
             return Response(
@@ -1169,8 +1203,11 @@ class SearchView(APIView):
                 {'error': 'top_k must be an integer.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        top_chunks, top_indices = hybrid_search(query, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=top_k)
-        sources = [chunk_sources[i] for i in top_indices]
+        top_chunks, top_indices = hybrid_search(
+            query, user_index.docs, user_index.index, user_index.bm25_index,
+            user_index.embeddings, top_k=top_k,
+        )
+        sources = [user_index.chunk_sources[i] for i in top_indices]
         results = []
         for i, chunk in enumerate(top_chunks):
             results.append({
@@ -1220,7 +1257,10 @@ class ChatView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        ensure_documents_loaded(request.user)
+        collection_id, error_response = _resolve_collection_id(request, request.data)
+        if error_response:
+            return error_response
+        user_index = ensure_documents_loaded(request.user, collection_id=collection_id)
         question = request.data.get('question')
         conversation_id = request.data.get('conversation_id')
 
@@ -1229,7 +1269,7 @@ class ChatView(APIView):
                 {'error': 'Please provide a non-empty question.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if index is None or index.ntotal == 0:
+        if user_index.is_empty:
             return Response(
                 {'error': 'No indexed documents found. Upload documents and run ingestion first.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -1249,32 +1289,52 @@ class ChatView(APIView):
                 title=question[:50],
             )
 
-        past_messages = ChatMessage.objects.filter(
-            conversation=conversation
-        ).order_by('created_at')
-        chat_history = [
-            {'question': m.question, 'answer': m.answer} 
-            for m in past_messages
-        ]
+        chat_history = conversation.recent_turns
+        history_summary = conversation.summary
 
-        top_chunks, top_indices = hybrid_search(question, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=3)
-        sources = list(dict.fromkeys([chunk_sources[i] for i in top_indices]))
+        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        cache_key = _answer_cache_key("chat", request.user, user_index, question, profile, chat_history, history_summary)
+        cached = _cached_answer(cache_key)
+        semantic_entry = None
+        prompt_stats = {}
+        if cached is None:
+            query = {}
+            top_chunks, top_indices = hybrid_search(
+                question, user_index.docs, user_index.index, user_index.bm25_index,
+                user_index.embeddings, top_k=3, query_out=query,
+            )
+            sources = list(dict.fromkeys([user_index.chunk_sources[i] for i in top_indices]))
+            cached, semantic_entry = _semantic_cache_probe(
+                "chat", request.user, user_index, profile, question, top_indices, chat_history, history_summary,
+                query_vector=query.get("vector"),
+            )
+        if cached is not None:
+            top_chunks, sources, answer = cached["chunks"], cached["sources"], cached["answer"]
         try:
-            profile, _ = UserProfile.objects.get_or_create(user=request.user)
             allowed_models = PROVIDER_MODELS.get(profile.llm_provider, [])
             if profile.llm_model not in allowed_models:
                 return Response(
                     {'error': 'Selected model is not valid for the chosen provider. Update Settings.'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            answer = generate_answer(
-                question,
-                top_chunks,
-                provider=profile.llm_provider,
-                model=profile.llm_model,
-                api_key=decrypt_value(profile.llm_api_key),
-                chat_history=chat_history,
-            )
+            if cached is None:
+                started = time.perf_counter()
+                answer = generate_answer(
+                    question,
+                    top_chunks,
+                    provider=profile.llm_provider,
+                    model=profile.llm_model,
+                    api_key=decrypt_value(profile.llm_api_key),
+                    chat_history=chat_history,
+                    history_summary=history_summary,
+                    prompt_stats=prompt_stats,
+                )
+                _store_answer(
+                    cache_key,
+                    {'answer': answer, 'sources': sources, 'chunks': top_chunks},
+                    time.perf_counter() - started,
+                    semantic_entry,
+                )
         except ValueError as e:
             return Response(
                 {'error': str(e)},
@@ -1298,6 +1358,7 @@ class ChatView(APIView):
             sources=sources,
             chunks=top_chunks,
         )
+        record_turn(conversation, chat)
         return Response({
             'id': chat.id,
             'conversation_id': conversation.id,
@@ -1305,6 +1366,8 @@ class ChatView(APIView):
             'answer': chat.answer,
             'sources': chat.sources,
             'created_at': chat.created_at,
+            'cached': cached is not None,
+            'prompt_tokens': prompt_stats.get('prompt_tokens'),
         }, status=status.HTTP_200_OK)
 
 """ CHAT STREAM VIEW """
@@ -1315,7 +1378,10 @@ class ChatStreamView(APIView):
     throttle_classes = [ChatRateThrottle]
 
     def post(self, request):
-        ensure_documents_loaded(request.user)
+        collection_id, error_response = _resolve_collection_id(request, request.data)
+        if error_response:
+            return error_response
+        user_index = ensure_documents_loaded(request.user, collection_id=collection_id)
         question = request.data.get('question')
         conversation_id = request.data.get('conversation_id')
 
@@ -1324,7 +1390,7 @@ class ChatStreamView(APIView):
                 {'error': 'Please provide a non-empty question.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if index is None or index.ntotal == 0:
+        if user_index.is_empty:
             return Response(
                 {'error': 'No indexed documents found. Upload documents and run ingestion first.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -1344,27 +1410,23 @@ class ChatStreamView(APIView):
                 title=question[:50],
             )
 
-        past_messages = ChatMessage.objects.filter(
-            conversation=conversation
-        ).order_by('created_at')
-        chat_history = [
-            {'question': m.question, 'answer': m.answer}
-            for m in past_messages
-        ]
+        chat_history = conversation.recent_turns
+        history_summary = conversation.summary
 
-        top_chunks, top_indices = hybrid_search(question, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=10)
-        sources = [chunk_sources[i] for i in top_indices]
+        query = {}
+        top_chunks, top_indices, hits = hybrid_search(
+            question, user_index.docs, user_index.index, user_index.bm25_index,
+            user_index.embeddings, top_k=10, return_hits=True, query_out=query,
+        )
+        sources = [user_index.chunk_sources[i] for i in top_indices]
 
-        reranked = rerank(question, top_chunks, top_k=3)
+        reranked = _rerank_by_confidence(question, top_chunks, hits, top_k=3, cache_scope=request.user.id)
         reranked_chunks = [r["chunk"] for r in reranked]
         reranked_sources = [sources[r["index"]] for r in reranked] if reranked else sources[:3]
 
         reranked_chunks, reranked_sources = remove_overlapping_chunks(reranked_chunks, reranked_sources)
 
-        try:
-            compressed = compress_chunks(question, reranked_chunks, get_embedding_model())
-        except Exception:
-            compressed = reranked_chunks
+        compressed = _compress_context(question, reranked_chunks, user_index, query_vector=query.get("vector"))
 
         final_chunks = compressed if compressed else reranked_chunks
         final_sources = reranked_sources
@@ -1389,6 +1451,7 @@ class ChatStreamView(APIView):
 
         def event_stream():
             full_answer = ""
+            prompt_stats = {}
             try:
                 stream_iter = generate_answer_stream(
                     question,
@@ -1397,6 +1460,8 @@ class ChatStreamView(APIView):
                     model=model,
                     api_key=api_key,
                     chat_history=chat_history,
+                    history_summary=history_summary,
+                    prompt_stats=prompt_stats,
                 )
                 for token in stream_iter:
                     full_answer += token
@@ -1420,9 +1485,10 @@ class ChatStreamView(APIView):
                     sources=final_sources,
                     chunks=final_chunks,
                 )
-                yield f"data: {_json.dumps({'done': True, 'id': chat.id, 'conversation_id': conversation.id, 'answer': full_answer, 'sources': final_sources})}\n\n"
+                record_turn(conversation, chat)
+                yield f"data: {_json.dumps({'done': True, 'id': chat.id, 'conversation_id': conversation.id, 'answer': full_answer, 'sources': final_sources, 'prompt_tokens': prompt_stats.get('prompt_tokens')})}\n\n"
             except Exception:
-                yield f"data: {_json.dumps({'done': True, 'answer': full_answer, 'sources': final_sources})}\n\n"
+                yield f"data: {_json.dumps({'done': True, 'answer': full_answer, 'sources': final_sources, 'prompt_tokens': prompt_stats.get('prompt_tokens')})}\n\n"
 
         return StreamingHttpResponse(event_stream(), content_type='text/event-stream')
 
@@ -1510,7 +1576,7 @@ class IngestView(APIView):
             progress=5,
             message="Queued ingestion task.",
         )
-        submit_task(task.id, _run_reindex_task, request.user.id)
+        submit_task(task.id, _run_reindex_task, request.user.id, rebuild=bool(request.data.get("rebuild")))
         return Response(
             {
                 "task_id": str(task.id),
@@ -1525,15 +1591,16 @@ class StatusView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        ensure_documents_loaded(request.user)
-        vector_db_ok = index is not None and index.ntotal > 0
+        user_index = ensure_documents_loaded(request.user)
+        index = user_index.index
+        vector_db_ok = not user_index.is_empty
         return Response({
             'status': 'ok' if vector_db_ok else 'degraded',
             'server': 'running',
             'vector_database': {
                 'connected': index is not None,
                 'total_chunks': index.ntotal if index is not None else 0,
-                'total_documents': len(set(chunk_sources)),
+                'total_documents': len(user_index.documents),
                 'embedding_dimension': index.d if index is not None else 0,
             },
             'supported_formats': list(SUPPORTED_EXTENSIONS),
@@ -1697,7 +1764,10 @@ class SearchRerankView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        ensure_documents_loaded(request.user)
+        collection_id, error_response = _resolve_collection_id(request, request.data)
+        if error_response:
+            return error_response
+        user_index = ensure_documents_loaded(request.user, collection_id=collection_id)
         query = request.data.get('query')
         if not query or not query.strip():
             return Response(
@@ -1714,14 +1784,17 @@ class SearchRerankView(APIView):
                 {'error': 'initial_k and final_k must be integers.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        top_chunks, top_indices = hybrid_search(query, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=initial_k)
-        reranked = rerank(query, top_chunks, top_k=final_k)
+        top_chunks, top_indices = hybrid_search(
+            query, user_index.docs, user_index.index, user_index.bm25_index,
+            user_index.embeddings, top_k=initial_k,
+        )
+        reranked = rerank(query, top_chunks, top_k=final_k, cache_scope=request.user.id)
         results = []
         for item in reranked:
             source_idx = item['index']
             results.append({
                 'chunk': item['chunk'],
-                'source': chunk_sources[top_indices[source_idx]],
+                'source': user_index.chunk_sources[top_indices[source_idx]],
                 'relevance_score': round(item['score'], 4)
             })
         return Response({
@@ -1735,7 +1808,7 @@ class SearchSuggestView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        ensure_documents_loaded(request.user)
+        user_index = ensure_documents_loaded(request.user)
         query = request.query_params.get('q', '').lower().strip()
         if not query:
             return Response(
@@ -1743,11 +1816,11 @@ class SearchSuggestView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         suggestions = set()
-        for source in chunk_sources:
+        for source in user_index.chunk_sources:
             name = os.path.splitext(source)[0].replace('-', ' ').replace('_', ' ')
             if query in name.lower():
                 suggestions.add(name)
-        for chunk in docs:
+        for chunk in user_index.docs:
             words = chunk.split()[:10]
             line = ' '.join(words)
             if query in line.lower():
@@ -1797,16 +1870,17 @@ class AdminVectorsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        ensure_documents_loaded(request.user)
+        user_index = ensure_documents_loaded(request.user)
         if not request.user.is_staff:
             return Response(
                 {'error': 'Admin access required.'},
                 status=status.HTTP_403_FORBIDDEN
             )
+        index = user_index.index
         doc_stats = {}
-        for i, source in enumerate(chunk_sources):
+        for i, source in enumerate(user_index.chunk_sources):
             if source not in doc_stats:
-                doc_stats[source] = {'chunks': 0, 'sample': docs[i][:100]}
+                doc_stats[source] = {'chunks': 0, 'sample': user_index.docs[i][:100]}
             doc_stats[source]['chunks'] += 1
         return Response({
             'total_vectors': index.ntotal if index else 0,
@@ -1816,6 +1890,31 @@ class AdminVectorsView(APIView):
         }, status=status.HTTP_200_OK
         )
 
+""" ADMIN CACHES VIEW """
+class AdminCachesView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Admin access required.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        embedding_cache = get_embedding_cache()
+        rerank_cache = get_rerank_cache()
+        client_pool = get_client_pool()
+        answer_cache = get_answer_cache()
+        semantic_cache = get_semantic_cache()
+        return Response({
+            'index_registry': index_registry.stats(),
+            'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+            'rerank_cache': rerank_cache.stats() if rerank_cache is not None else None,
+            'inference_batching': inference_batching_stats(),
+            'llm_clients': client_pool.stats() if client_pool is not None else None,
+            'answer_cache': answer_cache.stats() if answer_cache is not None else None,
+            'semantic_answer_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        }, status=status.HTTP_200_OK)
+
 """ CHAT EXPORT VIEW """
 class ChatExportView(APIView):
     permission_classes = [IsAuthenticated]
@@ -2030,7 +2129,8 @@ class GenerateEvaluationDataView(APIView):
         try:
             from api.models import EvaluationDataset, UserProfile
             from api.generator import generate_answer
-            ensure_documents_loaded(request.user)
+            user_index = ensure_documents_loaded(request.user)
+            docs = user_index.docs
             if not docs:
                 raise EvaluationError("No documents found. Please upload documents first.")
 
@@ -2070,7 +2170,7 @@ class RunEvaluationView(APIView):
             if not items.exists():
                 raise EvaluationError("No evaluation dataset found for this user. Generate one first.")
                 
-            ensure_documents_loaded(request.user)
+            user_index = ensure_documents_loaded(request.user)
             profile = UserProfile.objects.get(user=request.user)
 
             try:
@@ -2083,7 +2183,7 @@ class RunEvaluationView(APIView):
             results = []
             for item in items:
                 try:
-                    top_chunks, top_indices = hybrid_search(item.question, docs, index, bm25_index, bm25_tokenized, embeddings, top_k=3)
+                    top_chunks, top_indices = hybrid_search(item.question, user_index.docs, user_index.index, user_index.bm25_index, user_index.embeddings, top_k=3)
                     actual_answer = generate_answer(item.question, top_chunks, provider=profile.llm_provider, model=profile.llm_model, api_key=profile.llm_api_key)
                     test_case = LLMTestCase(input=item.question, actual_output=actual_answer, retrieval_context=top_chunks, expected_output=item.expected_answer)
                     
@@ -0,0 +1,137 @@
+"""Model warmup at process start and readiness reporting.
+
+Models load on first use, so without warmup the first request a fresh worker
+serves pays the full load time. With ``RAG_WARMUP_ON_START`` enabled, the
+gunicorn ``post_worker_init`` hook (backend/gunicorn.conf.py) and Celery's
+``worker_process_init`` signal (config/celery.py) call ``start_warmup()``,
+which loads both models in a background thread, runs a dummy batch through
+each and optionally loads the published index snapshots of recently active
+users. The readiness endpoint reports the result so load balancers can skip
+workers that are not warm yet.
+
+A failed warmup is retried ``RAG_WARMUP_ATTEMPTS`` times with exponential
+backoff. If every attempt fails, the worker reports ready anyway and loads
+its models lazily on first use, as it would without warmup. Otherwise one bad
+start would keep it out of rotation for the rest of its life.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {
+    "status": "not_started",  # not_started | running | retrying | done | failed
+    "attempts": 0,
+    "embedding_model": False,
+    "reranker": False,
+    "user_indexes": 0,
+    "seconds": None,
+    "error": None,
+}
+_thread = None
+
+
+def warmup_enabled():
+    return getattr(settings, "RAG_WARMUP_ON_START", False)
+
+
+def _update(**changes):
+    with _lock:
+        _state.update(changes)
+
+
+def warm_up():
+    """Load the models, run one dummy batch through each and preload indexes."""
+    from api.retriever import get_embedding_model, get_reranker
+
+    started = time.perf_counter()
+    attempts = max(1, getattr(settings, "RAG_WARMUP_ATTEMPTS", 3))
+    retry_seconds = getattr(settings, "RAG_WARMUP_RETRY_SECONDS", 5.0)
+    for attempt in range(1, attempts + 1):
+        _update(status="running", attempts=attempt)
+        try:
+            get_embedding_model().encode(["warmup query"])
+            _update(embedding_model=True)
+            get_reranker().predict([["warmup query", "warmup passage"]])
+            _update(reranker=True, error=None)
+            break
+        except Exception as exc:
+            logger.exception("Model warmup failed (attempt %d of %d)", attempt, attempts)
+            if attempt == attempts:
+                # Readiness falls back to lazy loading from here on.
+                _update(status="failed", error=str(exc), seconds=round(time.perf_counter() - started, 3))
+                return
+            _update(status="retrying", error=str(exc))
+            time.sleep(retry_seconds * 2 ** (attempt - 1))
+    _update(user_indexes=_warm_user_indexes(getattr(settings, "RAG_WARMUP_USER_INDEXES", 0)))
+    seconds = round(time.perf_counter() - started, 3)
+    _update(status="done", seconds=seconds)
+    logger.info("Warmup finished in %.2fs", seconds)
+
+
+def _warm_user_indexes(limit):
+    """Load the published snapshots of the ``limit`` most recently active users.
+
+    Users without a snapshot are skipped rather than ingested; their index is
+    built by the first request that needs it.
+    """
+    if limit <= 0:
+        return 0
+    from django.contrib.auth.models import User
+    from django.db import close_old_connections
+
+    from api.views import load_published_index
+
+    loaded = 0
+    try:
+        users = list(User.objects.filter(last_login__isnull=False).order_by("-last_login")[:limit])
+        for user in users:
+            try:
+                if load_published_index(user):
+                    loaded += 1
+            except Exception:
+                logger.warning("Preloading the index of user %s failed", user.id, exc_info=True)
+    finally:
+        close_old_connections()
+    return loaded
+
+
+def start_warmup():
+    """Run ``warm_up`` in a daemon thread (once per process) when enabled."""
+    global _thread
+    if not warmup_enabled():
+        return None
+    with _lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+    _thread.start()
+    return _thread
+
+
+def readiness():
+    """``(ready, details)`` for the readiness endpoint.
+
+    Without warmup a worker is always reported ready (models load lazily);
+    with it, only once warmup has finished or has given up after its retries.
+    """
+    from api.index_registry import registry
+
+    with _lock:
+        state = dict(_state)
+    state["enabled"] = warmup_enabled()
+    ready = not state["enabled"] or state["status"] in ("done", "failed")
+    registry_stats = registry.stats()
+    return ready, {
+        "ready": ready,
+        "warmup": state,
+        "index_registry": {
+            "entries": registry_stats["entries"],
+            "total_chunks": registry_stats["total_chunks"],
+        },
+    }
@@ -1,8 +1,16 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def _warm_up_models(**kwargs):
+    # Each prefork child loads its own models; warm them before tasks arrive.
+    from api.warmup import start_warmup
+    start_warmup()
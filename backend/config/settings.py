@@ -261,6 +261,117 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Retrieval
+# Per-worker LRU of user/collection indexes (see api/index_registry.py).
+RAG_INDEX_REGISTRY_MAX_ENTRIES = int(os.getenv("RAG_INDEX_REGISTRY_MAX_ENTRIES", "16"))
+RAG_INDEX_REGISTRY_MAX_CHUNKS = int(os.getenv("RAG_INDEX_REGISTRY_MAX_CHUNKS", "250000"))
+# Content-addressed embedding cache shared by chunking, indexing and
+# compression (see api/embedding_cache.py). Set the path to "" to disable.
+RAG_EMBEDDING_CACHE_PATH = os.getenv(
+    "RAG_EMBEDDING_CACHE_PATH", str(BASE_DIR / "documents" / ".cache" / "embeddings.sqlite3")
+)
+RAG_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Context compression: "precomputed" (sentence vectors stored at ingest),
+# "encode" (re-encode sentences per request) or "off".
+RAG_COMPRESSION_MODE = os.getenv("RAG_COMPRESSION_MODE", "precomputed").strip().lower()
+# Batched ingestion (see api/ingestion.py): sentences per encoder batch,
+# sentences pooled across files before chunking, chunks per embed/index batch.
+RAG_INGEST_SENTENCE_BATCH_SIZE = int(os.getenv("RAG_INGEST_SENTENCE_BATCH_SIZE", "256"))
+RAG_INGEST_MAX_PENDING_SENTENCES = int(os.getenv("RAG_INGEST_MAX_PENDING_SENTENCES", "8192"))
+RAG_INGEST_CHUNK_BATCH_SIZE = int(os.getenv("RAG_INGEST_CHUNK_BATCH_SIZE", "512"))
+# Text extraction process pool (see api/extraction.py). Workers default to
+# the CPU count (max 8); set to 1 to extract serially in the ingest process.
+# Inside Celery prefork children the pool is started through billiard.
+RAG_EXTRACTION_WORKERS = int(os.getenv("RAG_EXTRACTION_WORKERS", "0")) or None
+RAG_EXTRACTION_PDF_PAGES_PER_TASK = int(os.getenv("RAG_EXTRACTION_PDF_PAGES_PER_TASK", "50"))
+# Dense index tiers (see api/retriever.py). "auto" uses exact search below
+# RAG_ANN_MIN_VECTORS chunks, HNSW above it and IVF-PQ from
+# RAG_ANN_IVFPQ_MIN_VECTORS; or force "flat", "hnsw" or "ivfpq".
+RAG_ANN_INDEX_TYPE = os.getenv("RAG_ANN_INDEX_TYPE", "auto").strip().lower()
+RAG_ANN_MIN_VECTORS = int(os.getenv("RAG_ANN_MIN_VECTORS", "50000"))
+RAG_ANN_IVFPQ_MIN_VECTORS = int(os.getenv("RAG_ANN_IVFPQ_MIN_VECTORS", "1000000"))
+RAG_ANN_HNSW_M = int(os.getenv("RAG_ANN_HNSW_M", "32"))
+RAG_ANN_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_ANN_HNSW_EF_CONSTRUCTION", "80"))
+RAG_ANN_HNSW_EF_SEARCH = int(os.getenv("RAG_ANN_HNSW_EF_SEARCH", "64"))
+# Share of tombstoned (deleted) rows an HNSW graph may carry before it is rebuilt.
+RAG_ANN_HNSW_MAX_DELETED = float(os.getenv("RAG_ANN_HNSW_MAX_DELETED", "0.2"))
+RAG_ANN_IVF_NPROBE = int(os.getenv("RAG_ANN_IVF_NPROBE", "16"))
+RAG_ANN_PQ_M = int(os.getenv("RAG_ANN_PQ_M", "48"))
+RAG_ANN_TRAIN_SAMPLE = int(os.getenv("RAG_ANN_TRAIN_SAMPLE", "100000"))
+# Hybrid fusion: "rrf" (reciprocal rank) or "weighted" (dense cosine and
+# max-normalized BM25, weighted by RAG_FUSION_DENSE_WEIGHT).
+RAG_FUSION_METHOD = os.getenv("RAG_FUSION_METHOD", "rrf").strip().lower()
+RAG_FUSION_DENSE_WEIGHT = float(os.getenv("RAG_FUSION_DENSE_WEIGHT", "0.5"))
+# Ask/chat rerank gating (0 disables each): skip the cross-encoder when the
+# best dense cosine score or the fusion confidence margin reaches the skip
+# threshold; rerank only the first RAG_RERANK_SHRINK_CANDIDATES chunks above
+# the shrink threshold.
+RAG_RERANK_SKIP_DENSE_SCORE = float(os.getenv("RAG_RERANK_SKIP_DENSE_SCORE", "0"))
+RAG_RERANK_SKIP_CONFIDENCE = float(os.getenv("RAG_RERANK_SKIP_CONFIDENCE", "0"))
+RAG_RERANK_SHRINK_CONFIDENCE = float(os.getenv("RAG_RERANK_SHRINK_CONFIDENCE", "0"))
+RAG_RERANK_SHRINK_CANDIDATES = int(os.getenv("RAG_RERANK_SHRINK_CANDIDATES", "5"))
+# In-memory LRU of cross-encoder scores per (user, query, chunk); 0 disables.
+RAG_RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RAG_RERANK_CACHE_MAX_ENTRIES", "50000"))
+# Micro-batching of concurrent encode/rerank calls (see api/batching.py): wait
+# up to this many ms to fill a batch (0 disables) of at most N items.
+RAG_INFERENCE_BATCH_WAIT_MS = float(os.getenv("RAG_INFERENCE_BATCH_WAIT_MS", "2"))
+RAG_INFERENCE_MAX_BATCH_SIZE = int(os.getenv("RAG_INFERENCE_MAX_BATCH_SIZE", "64"))
+# Shared model server (python manage.py serve_models), e.g.
+# http://127.0.0.1:8765. Empty loads the models in every process. With the
+# fallback on, a worker loads its own models while the server is unreachable.
+RAG_INFERENCE_URL = os.getenv("RAG_INFERENCE_URL", "").strip()
+RAG_INFERENCE_TIMEOUT = float(os.getenv("RAG_INFERENCE_TIMEOUT", "30"))
+RAG_INFERENCE_FALLBACK_LOCAL = os.getenv("RAG_INFERENCE_FALLBACK_LOCAL", "true").strip().lower() == "true"
+# Model runtime (see api/onnx_backend.py): "torch", "onnx" or "onnx-int8".
+# ONNX backends need `pip install "sentence-transformers[onnx]"`; models are
+# exported to RAG_ONNX_MODEL_DIR on first use. RAG_ONNX_QUANTIZATION is the
+# int8 target: avx2, avx512, avx512_vnni or arm64.
+RAG_INFERENCE_BACKEND = os.getenv("RAG_INFERENCE_BACKEND", "torch").strip().lower()
+RAG_ONNX_MODEL_DIR = os.getenv("RAG_ONNX_MODEL_DIR", str(BASE_DIR / "documents" / ".cache" / "onnx"))
+RAG_ONNX_QUANTIZATION = os.getenv("RAG_ONNX_QUANTIZATION", "avx2").strip().lower()
+# Load models (and the index snapshots of the N most recently active users)
+# when a gunicorn or Celery worker starts; /api/ready/ reports 503 until done.
+# Failures are retried N times, waiting RETRY_SECONDS and doubling each time;
+# after the last one the worker reports ready and loads models lazily.
+RAG_WARMUP_ON_START = os.getenv("RAG_WARMUP_ON_START", "false").strip().lower() == "true"
+RAG_WARMUP_USER_INDEXES = int(os.getenv("RAG_WARMUP_USER_INDEXES", "0"))
+RAG_WARMUP_ATTEMPTS = int(os.getenv("RAG_WARMUP_ATTEMPTS", "3"))
+RAG_WARMUP_RETRY_SECONDS = float(os.getenv("RAG_WARMUP_RETRY_SECONDS", "5"))
+# Pooled LLM provider clients (see api/llm_clients.py), one per provider,
+# endpoint and API key, so keep-alive connections survive between requests.
+# 0 creates a new client per call; idle clients are dropped after N seconds.
+RAG_LLM_CLIENT_POOL_SIZE = int(os.getenv("RAG_LLM_CLIENT_POOL_SIZE", "32"))
+RAG_LLM_CLIENT_IDLE_SECONDS = float(os.getenv("RAG_LLM_CLIENT_IDLE_SECONDS", "300"))
+# Exact-match answer cache for /api/ask/ and /api/chat/ (see api/answer_cache.py),
+# keyed by user, index version, question, model and history. 0 disables.
+RAG_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "10000"))
+RAG_ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "3600"))
+# Semantic answer cache (see api/semantic_cache.py) for the listed endpoints
+# ("ask", "chat"; empty disables): reuse an answer when a new question's
+# embedding is this cosine-similar to a cached one and the retrieved chunks
+# overlap by at least RAG_SEMANTIC_CACHE_MIN_OVERLAP (Jaccard). Shares the TTL above.
+# Entries are bucketed per user and index version (collection); the limits
+# below apply per bucket and to the number of buckets.
+RAG_SEMANTIC_CACHE_ENDPOINTS = [value.lower() for value in _csv_env("RAG_SEMANTIC_CACHE_ENDPOINTS", "")]
+RAG_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+RAG_SEMANTIC_CACHE_MIN_OVERLAP = float(os.getenv("RAG_SEMANTIC_CACHE_MIN_OVERLAP", "0.5"))
+RAG_SEMANTIC_CACHE_MAX_ENTRIES_PER_USER = int(os.getenv("RAG_SEMANTIC_CACHE_MAX_ENTRIES_PER_USER", "256"))
+RAG_SEMANTIC_CACHE_MAX_USERS = int(os.getenv("RAG_SEMANTIC_CACHE_MAX_USERS", "1000"))
+# Prompt token budget (estimated locally, see api/prompt_budget.py), with
+# per-model overrides as "model=tokens,model=tokens". Conversation history may
+# take up to RAG_PROMPT_HISTORY_SHARE of it: a rolling summary of at most
+# RAG_CONVERSATION_SUMMARY_TOKENS tokens plus the last
+# RAG_PROMPT_HISTORY_MAX_TURNS turns verbatim, both stored on the Conversation.
+RAG_PROMPT_TOKEN_BUDGET = int(os.getenv("RAG_PROMPT_TOKEN_BUDGET", "6000"))
+RAG_PROMPT_MODEL_TOKEN_BUDGETS = {
+    model.strip(): int(tokens)
+    for model, _, tokens in (item.rpartition("=") for item in _csv_env("RAG_PROMPT_MODEL_TOKEN_BUDGETS"))
+    if model.strip()
+}
+RAG_PROMPT_HISTORY_SHARE = float(os.getenv("RAG_PROMPT_HISTORY_SHARE", "0.25"))
+RAG_PROMPT_HISTORY_MAX_TURNS = int(os.getenv("RAG_PROMPT_HISTORY_MAX_TURNS", "6"))
+RAG_CONVERSATION_SUMMARY_TOKENS = int(os.getenv("RAG_CONVERSATION_SUMMARY_TOKENS", "300"))
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -0,0 +1,9 @@
+"""Gunicorn settings picked up automatically from the backend directory."""
+
+
+def post_worker_init(worker):
+    # The Django app is loaded at this point. Warmup runs in a background
+    # thread so a slow model load cannot trip the worker timeout; /api/ready/
+    # reports 503 until it finishes.
+    from api.warmup import start_warmup
+    start_warmup()